@@ -0,0 +1,257 @@
+"""
+Controle de admissão das escritas (uploads e remoções)
+
+Com um secondary atrasado ou uma eleição em andamento, cada commit com
+w='majority' pode esperar até o wtimeout segurando um worker, o arquivo em
+buffer e uma conexão; sem limite, as escritas ocupam todos os workers e
+até as leituras baratas param. Aqui as escritas passam por uma porta:
+
+- no máximo `limit` escritas simultâneas; as excedentes esperam numa fila
+  limitada (ADMISSION_QUEUE_SIZE) por até ADMISSION_QUEUE_TIMEOUT segundos;
+- fila cheia: 429 na hora; prazo estourado, sem PRIMARY ou sem maioria
+  para confirmar a escrita: 503. As duas respostas trazem `Retry-After`;
+- o `limit` se ajusta sozinho (AIMD): cai pela metade quando a latência
+  do commit majority (média móvel) passa de ADMISSION_TARGET_MS ou o lag da
+  maioria passa de ADMISSION_MAX_LAG_SECONDS, e sobe de um em um enquanto
+  as confirmações estão rápidas, até ADMISSION_MAX_CONCURRENCY.
+
+O lag e o PRIMARY vêm do snapshot do topology.TopologyMonitor, sem
+comandos extras. As leituras não passam por aqui.
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get('ADMISSION_MAX_CONCURRENCY', 16))
+ADMISSION_MIN_CONCURRENCY = int(os.environ.get('ADMISSION_MIN_CONCURRENCY', 1))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', 32))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 2))
+ADMISSION_TARGET_MS = float(os.environ.get('ADMISSION_TARGET_MS', 500))
+ADMISSION_MAX_LAG_SECONDS = float(os.environ.get('ADMISSION_MAX_LAG_SECONDS', 10))
+
+# Peso da última medida na média móvel da latência do commit
+LATENCY_SMOOTHING = 0.2
+# Intervalo mínimo entre duas reduções do limite (uma rajada lenta conta uma vez)
+DECREASE_INTERVAL = 1.0
+# Retry-After quando não há PRIMARY (eleição) ou maioria para confirmar
+UNAVAILABLE_RETRY_AFTER = 5
+
+# Estados de membros que não guardam dados (não confirmam escritas)
+_NON_DATA_STATES = ('ARBITER',)
+
+
+class Overloaded(Exception):
+    """Escrita recusada pelo controle de admissão (status 429 ou 503)"""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def majority_lag(snapshot):
+    """Lag (segundos) do secondary mais atrasado entre os necessários para a maioria.
+
+    Retorna None quando a topologia ainda não é conhecida e math.inf quando
+    não há secondaries suficientes para confirmar uma escrita majority.
+    """
+    members = [m for m in snapshot.get('members', []) if m.get('state') not in _NON_DATA_STATES]
+    if not members:
+        return None
+    needed = len(members) // 2  # secondaries além do PRIMARY
+    if not needed:
+        return 0.0
+    lags = sorted(m.get('lagSeconds', 0.0) for m in members
+                  if m.get('state') == 'SECONDARY' and m.get('health') != 'Unhealthy')
+    if len(lags) < needed:
+        return math.inf
+    return lags[needed - 1]
+
+
+class _Waiter:
+    """Escrita na fila; `wake` é chamado (com o lock) quando a vaga é concedida"""
+
+    def __init__(self, wake):
+        self.granted = False
+        self.wake = wake
+
+
+class AdmissionController:
+    """Limite adaptativo de escritas simultâneas com fila de prazo limitado"""
+
+    def __init__(self, topology=None, max_limit=ADMISSION_MAX_CONCURRENCY, min_limit=ADMISSION_MIN_CONCURRENCY,
+                 queue_size=ADMISSION_QUEUE_SIZE, queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+                 target_seconds=ADMISSION_TARGET_MS / 1000, max_lag_seconds=ADMISSION_MAX_LAG_SECONDS,
+                 clock=time.monotonic):
+        self.topology = topology
+        self.max_limit = max_limit
+        self.min_limit = max(1, min_limit)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.target_seconds = target_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.clock = clock
+        self.limit = float(max_limit)
+        self.latency = 0.0
+        self.rejected = {429: 0, 503: 0}
+        self._active = 0
+        self._waiters = deque()
+        self._last_decrease = -math.inf
+        self._lock = threading.Lock()
+
+    # ---------- limite adaptativo ----------
+
+    def _decrease(self):
+        # Chamado com o lock adquirido
+        now = self.clock()
+        if now - self._last_decrease >= DECREASE_INTERVAL:
+            self.limit = max(self.min_limit, self.limit / 2)
+            self._last_decrease = now
+
+    def observe(self, seconds):
+        """Registra a duração de um commit majority e ajusta o limite"""
+        with self._lock:
+            self.latency = seconds if not self.latency else (
+                LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * self.latency)
+            if self.latency > self.target_seconds:
+                self._decrease()
+            elif self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1)
+                self._grant()
+
+    def _check_topology(self):
+        # Chamado com o lock adquirido; recusa na hora quando a escrita não tem como ser confirmada
+        if self.topology is None:
+            return
+        snapshot = self.topology.snapshot()
+        lag = majority_lag(snapshot)
+        if lag is None:
+            return  # Topologia ainda desconhecida (cliente não conectou): deixa passar
+        if not snapshot.get('primary'):
+            self._reject('Replica set sem PRIMARY (eleição em andamento)', 503, UNAVAILABLE_RETRY_AFTER)
+        if lag == math.inf:
+            self._reject('Secondaries insuficientes para confirmar a escrita', 503, UNAVAILABLE_RETRY_AFTER)
+        if lag > self.max_lag_seconds:
+            self._decrease()
+
+    def _reject(self, message, status, retry_after):
+        self.rejected[status] += 1
+        raise Overloaded(message, status, retry_after)
+
+    def retry_after(self):
+        """Segundos sugeridos ao cliente: tempo para a fila atual escoar, pelo menos 1"""
+        per_write = max(self.latency, self.target_seconds)
+        return max(1, math.ceil(per_write * (len(self._waiters) + 1) / max(1, int(self.limit))))
+
+    # ---------- vagas ----------
+
+    def _grant(self):
+        # Chamado com o lock adquirido: passa as vagas livres para a fila, em ordem
+        while self._waiters and self._active < int(self.limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self._active += 1
+            waiter.wake()
+
+    def _enter(self, wake, replicated):
+        """Ocupa uma vaga (retorna None) ou entra na fila (retorna o _Waiter)"""
+        with self._lock:
+            if replicated:
+                self._check_topology()
+            if self._active < int(self.limit) and not self._waiters:
+                self._active += 1
+                return None
+            if len(self._waiters) >= self.queue_size:
+                self._reject('Muitas escritas em andamento', 429, self.retry_after())
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _give_up(self, waiter):
+        """Tira da fila uma espera que estourou o prazo; False se a vaga chegou nesse meio-tempo"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters.remove(waiter)
+            self._reject('Tempo de espera por uma vaga de escrita esgotado', 503, self.retry_after())
+
+    def _abandon(self, waiter):
+        """Espera interrompida (tarefa cancelada): sai da fila ou devolve a vaga que já chegou"""
+        with self._lock:
+            if waiter.granted:
+                self._active -= 1
+                self._grant()
+            else:
+                self._waiters.remove(waiter)
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+            self._grant()
+
+    def acquire(self, replicated=True):
+        """`replicated=False`: escrita que não espera o replica set (spool), sem checar a topologia"""
+        event = threading.Event()
+        waiter = self._enter(event.set, replicated)
+        if waiter is not None and not event.wait(self.queue_timeout):
+            self._give_up(waiter)
+
+    async def acquire_async(self, replicated=True):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enter(wake, replicated)
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._give_up(waiter)
+        except BaseException:
+            # Cliente desconectou (CancelledError): ninguém chamaria release() por esta espera
+            self._abandon(waiter)
+            raise
+
+    @contextmanager
+    def slot(self, replicated=True):
+        """Vaga de escrita (levanta Overloaded se recusada)"""
+        self.acquire(replicated)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slot_async(self, replicated=True):
+        await self.acquire_async(replicated)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def timed(self):
+        """Mede um commit majority e alimenta o limite adaptativo"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': int(self.limit),
+                'active': self._active,
+                'queued': len(self._waiters),
+                'latency_ms': round(self.latency * 1000, 2),
+                'rejected': dict(self.rejected)
+            }
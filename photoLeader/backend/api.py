@@ -5,27 +5,75 @@ Conecta o frontend HTML/JS com o MongoDB Replica Set
 Endpoints:
 - GET /api/photos - Lista todas as fotos
 - GET /api/photos/<id> - Busca uma foto específica
+- GET /api/photos/batch?ids=<id1>,<id2> - Metadados de várias fotos numa consulta
+- GET /api/photos/<id>/neighbors?n=<n> - A foto e as n anteriores/seguintes da listagem
+- GET /api/photos/<id>/file - Arquivo da foto (?w=<largura> devolve a miniatura)
 - POST /api/photos - Upload de metadados de foto
+- POST /api/photos/batch - Upload de vários arquivos numa requisição
 - DELETE /api/photos/<id> - Remove uma foto
 - GET /api/photos/user/<username> - Fotos de um usuário
+- GET /api/photos/user/<username>/export.zip?offset=<n> - ZIP com as fotos e um manifest
 - GET /api/photos/tag/<tag> - Fotos por tag
 - GET /api/stats - Estatísticas do sistema
+- GET /api/cache/stats - Estatísticas do cache de metadados
+- GET /api/metrics - Métricas no formato do Prometheus
 - GET /api/health - Status da API e MongoDB
 """
 
-from flask import Flask, jsonify, request, send_from_directory, send_file, Response
+from flask import Flask, g, jsonify, request, send_file, Response
+from werkzeug.utils import secure_filename
+from werkzeug.wsgi import wrap_file
 from flask_cors import CORS
+from contextlib import contextmanager
+from functools import wraps
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, OperationFailure
 from bson import ObjectId
+from bson.errors import InvalidId
 from datetime import datetime
 import gridfs
-import io
 import os
-import traceback
+import time
 
-app = Flask(__name__)
-CORS(app)  # Permite requisições do frontend
+from pagination import InvalidCursor, InvalidIds, InvalidPageSize, parse_ids, parse_neighbor_count, parse_page_size
+from dedup import BLOBS_COLLECTION, store_deduplicated
+from blob_store import (BLOB_STORE, STORE_FIELDS, FileSystemStore, GridFSReader, GridFSStore, StoredFile,
+                        iter_file_range, locate, location)
+from photo_commit import BlobGone, commit_photos, remove_photo
+from leases import LEASES_COLLECTION, Lease
+from orphan_sweeper import ORPHAN_SWEEP_INTERVAL, SWEEPER_LEASE, OrphanSweeper
+from indexes import PHOTOS_COLLECTION, ensure_indexes as ensure_registered_indexes
+from metadata_cache import (ChangeStreamInvalidator, MetadataCache, invalidate_photo,
+                            listing_key, photo_key)
+from stats_counters import STATS_COLLECTION, read_stats
+from batch_upload import BATCH_MAX_FILES, store_files
+from search_index import GramSample, InvalidSearch, document_grams, matches, search_projection, search_query
+from topology import TopologyMonitor
+from read_routing import LOCAL_THRESHOLD_MS, ReadRouter
+from causal import (CAUSAL_COOKIE, CAUSAL_HEADER, cookie_options, encode_token, request_token,
+                    start_causal_session)
+from file_response import grid_content_type, plan_file_response
+from serialization import FULL_DOCUMENT, InvalidFields, json_response, parse_fields, serialize_photo
+from upload_stream import MAX_UPLOAD_BYTES, UploadTooLarge
+from metrics import (REGISTRY, CommandMetrics, PoolMetrics, admission_collector, cache_collector, gridfs_bytes,
+                     observe_request, spool_collector, tag_index_collector)
+from logs import configure_logging, get_logger, log_request
+from static_assets import STATIC_X_SENDFILE, AssetStore
+from thumbnails import InvalidWidth, Thumbnailer, parse_width, pick_format, pick_width
+from admission import AdmissionController, Overloaded
+from ingest_spool import INGEST_MODE, SPOOL_FULL_RETRY_AFTER, IngestSpool, SpoolFull, pending_files
+from tag_index import InvalidLimit, TagIndex, TagIndexRefresher, parse_limit
+from zip_export import InvalidOffset, export_user, parse_offset
+
+configure_logging()
+log = get_logger('api')
+
+app = Flask(__name__, static_folder=None)
+app.config['USE_X_SENDFILE'] = STATIC_X_SENDFILE
+CORS(app, expose_headers=[CAUSAL_HEADER])  # Permite requisições do frontend
+
+# Arquivos do frontend (frontend/dist quando gerado por `static_assets.py build`)
+static_store = AssetStore()
 
 # Configuração do MongoDB
 REPLICA_URI = os.environ.get(
@@ -34,106 +82,427 @@ REPLICA_URI = os.environ.get(
 )
 
 DB_NAME = 'uploadDB'
-COLLECTION = 'files'
+COLLECTION = PHOTOS_COLLECTION
 
 # Cliente MongoDB
 try:
-    from pymongo.read_preferences import ReadPreference
     from pymongo.write_concern import WriteConcern
     
+    # Snapshot da topologia alimentado pelos heartbeats do próprio driver
+    topology_monitor = TopologyMonitor()
+    # Latência dos comandos e estatísticas do pool para /api/metrics
+    pool_metrics = PoolMetrics()
+    REGISTRY.collector(pool_metrics.collect)
+    # Limite adaptativo das escritas (lag/PRIMARY vêm do topology_monitor)
+    admission = AdmissionController(topology_monitor)
+    REGISTRY.collector(admission_collector(lambda: admission))
+    
+    # connect=False: nenhuma conexão/thread é aberta antes do primeiro uso, então
+    # o cliente é seguro para servidores que fazem fork dos workers
     client = MongoClient(
         REPLICA_URI, 
         serverSelectionTimeoutMS=5000,
-        readPreference='primary',  # Força leitura do PRIMARY
+        readPreference='primary',  # Padrão PRIMARY; leituras das rotas seguem o read_router
+        localThresholdMS=LOCAL_THRESHOLD_MS,
+        event_listeners=[topology_monitor, CommandMetrics(), pool_metrics],
+        connect=False,
     )
     db = client[DB_NAME].with_options(
         write_concern=WriteConcern(w='majority', wtimeout=5000)
     )
     collection = db[COLLECTION]
+    blobs = db[BLOBS_COLLECTION]
+    stats = db[STATS_COLLECTION]
+    # Read preference de cada classe de endpoint (READ_ROUTING)
+    read_router = ReadRouter()
+    # Frequência dos trigramas (ordem do `$all` da busca), amostrada com a read preference da busca
+    gram_sample = GramSample(read_router.collection(collection, 'search'))
+    # Cache dos metadados (invalidado pelo change stream iniciado no startup)
+    metadata_cache = MetadataCache()
+    REGISTRY.collector(cache_collector(lambda: metadata_cache))
+    cache_invalidator = None
+    # Autocomplete e facetas de tags (construído no startup, mantido pelo upload/delete)
+    tag_index = TagIndex()
+    REGISTRY.collector(tag_index_collector(lambda: tag_index))
+    tag_index_refresher = None
+    orphan_sweeper = None
     # GridFS será inicializado apenas quando necessário (lazy loading)
     fs = None
-    print("✅ Conectado ao MongoDB Replica Set")
-    print("✅ GridFS será inicializado on-demand")
+    fs_bucket = None
+    fs_read_bucket = None
+    thumbs_bucket = None
+    log.info("✅ Conectado ao MongoDB Replica Set")
+    log.info("✅ GridFS será inicializado on-demand")
 except Exception as e:
-    print(f"❌ Erro ao conectar ao MongoDB: {e}")
+    log.error(f"❌ Erro ao conectar ao MongoDB: {e}")
 
 
 # Helper para obter GridFS (lazy initialization)
 def get_gridfs():
     global fs
     if fs is None:
-        # Criar índices GridFS manualmente para garantir que são criados no PRIMARY
-        try:
-            db.fs.chunks.create_index([("files_id", 1), ("n", 1)], unique=True)
-            db.fs.files.create_index([("filename", 1), ("uploadDate", 1)])
-            print("✅ Índices GridFS criados/verificados no PRIMARY")
-        except Exception as e:
-            print(f"⚠️ Aviso ao criar índices GridFS: {e}")
-        
+        # Os índices do GridFS vêm do registro (indexes.py), criados no startup
         fs = gridfs.GridFS(db)
     return fs
 
 
-# Helper para converter ObjectId em string
-def serialize_doc(doc):
-    """Converte ObjectId para string para JSON"""
-    if doc:
-        if '_id' in doc:
-            doc['_id'] = str(doc['_id'])
-        if 'gridfs_id' in doc and isinstance(doc['gridfs_id'], ObjectId):
-            doc['gridfs_id'] = str(doc['gridfs_id'])
-    return doc
+# Helper para obter o GridFSBucket (API de streaming do GridFS)
+def get_gridfs_bucket():
+    global fs_bucket
+    if fs_bucket is None:
+        fs_bucket = gridfs.GridFSBucket(db)
+    return fs_bucket
+
+
+def get_read_bucket():
+    """GridFSBucket de leitura, com a read preference da classe 'file'"""
+    global fs_read_bucket
+    if fs_read_bucket is None:
+        fs_read_bucket = gridfs.GridFSBucket(db, read_preference=read_router.preference('file'))
+    return fs_read_bucket
+
+
+def open_grid_file(file_id, causal=False):
+    """GridOut do arquivo, lido pela política da classe 'file'.
+    
+    O GridFS não aceita max_time_ms, então uma leitura causal num secondary
+    atrasado esperaria o token sem limite: com token, os bytes vêm direto do
+    PRIMARY. Sem token, um arquivo que ainda não chegou ao membro escolhido é
+    relido no PRIMARY.
+    """
+    if causal or read_router.reads_primary('file'):
+        return get_gridfs_bucket().open_download_stream(file_id)
+    try:
+        return get_read_bucket().open_download_stream(file_id)
+    except gridfs.errors.NoFile:
+        return get_gridfs_bucket().open_download_stream(file_id)
+
+
+def get_thumbs_bucket():
+    """GridFSBucket `thumbs`, com as miniaturas das fotos guardadas no GridFS"""
+    global thumbs_bucket
+    if thumbs_bucket is None:
+        thumbs_bucket = gridfs.GridFSBucket(db, bucket_name='thumbs')
+    return thumbs_bucket
+
+
+# Onde ficam os bytes das fotos: uploads novos vão para BLOB_STORE; leituras e
+# remoções seguem o campo do documento (gridfs_id ou storage_path)
+blob_stores = {'gridfs': GridFSStore(get_gridfs_bucket, get_thumbs_bucket), 'fs': FileSystemStore()}
+blob_store = blob_stores[BLOB_STORE]
+
+# Fila das miniaturas (ProcessPoolExecutor); também gera sob demanda no ?w=
+thumbnailer = Thumbnailer(blob_stores, blobs,
+                          sources={'gridfs': GridFSReader(REPLICA_URI, DB_NAME), 'fs': blob_stores['fs']})
+
+
+def ensure_indexes():
+    """Cria (se ainda não existirem) os índices do registro (indexes.py): fotos, blobs, estatísticas e GridFS"""
+    try:
+        failed = ensure_registered_indexes(db)
+        if not failed:
+            log.info("✅ Índices da aplicação criados/verificados")
+    except Exception as e:
+        log.warning(f"⚠️ Aviso ao criar índices: {e}")
+
+
+def start_cache_invalidator():
+    """Inicia a thread do change stream que invalida o cache de metadados"""
+    global cache_invalidator
+    if cache_invalidator is None:
+        cache_invalidator = ChangeStreamInvalidator(collection, metadata_cache)
+        cache_invalidator.start()
+        log.info("✅ Invalidação do cache via change stream iniciada")
+    return cache_invalidator
+
+
+def start_orphan_sweeper():
+    """Inicia a thread que remove arquivos órfãos do GridFS (ORPHAN_SWEEP_INTERVAL=0 desliga)"""
+    global orphan_sweeper
+    if orphan_sweeper is None and ORPHAN_SWEEP_INTERVAL > 0:
+        # Um worker só varre (lease renovado a cada passada; vence em 3 intervalos sem renovação)
+        lease = Lease(db[LEASES_COLLECTION], SWEEPER_LEASE, ttl_seconds=3 * ORPHAN_SWEEP_INTERVAL)
+        orphan_sweeper = OrphanSweeper(db, collection, blobs, fs_store=blob_stores['fs'],
+                                       protected=spool_pending_files, lease=lease)
+        orphan_sweeper.start()
+        log.info("✅ Limpeza de órfãos do GridFS iniciada")
+    return orphan_sweeper
+
+
+def start_tag_index():
+    """Inicia a thread que constrói (e reconstrói a cada TAG_INDEX_REFRESH s) o índice de tags"""
+    global tag_index_refresher
+    if tag_index_refresher is None:
+        source = collection.with_options(read_preference=read_router.preference('listing'))
+        tag_index_refresher = TagIndexRefresher(
+            tag_index, lambda: source.find({}, {'_id': 0, 'user': 1, 'tags': 1}, batch_size=10000))
+        tag_index_refresher.start()
+        log.info("✅ Construção do índice de tags iniciada")
+    return tag_index_refresher
+
+
+def start_thumbnailer():
+    """Inicia a thread que gera as miniaturas dos uploads (precisa do Pillow)"""
+    if thumbnailer.enabled and not thumbnailer.is_alive():
+        thumbnailer.start()
+        log.info("✅ Geração de miniaturas iniciada")
+    return thumbnailer
+
+
+@contextmanager
+def causal_read():
+    """Sessão causal do token da requisição (None sem token válido), encerrada ao sair"""
+    session = start_causal_session(client, request_token(request.headers, request.cookies))
+    try:
+        yield session
+    finally:
+        if session is not None:
+            session.end_session()
+
+
+def with_causal_token(response, token):
+    """Devolve o token de read-your-writes no cabeçalho e no cookie"""
+    response.headers[CAUSAL_HEADER] = token
+    response.set_cookie(CAUSAL_COOKIE, token, **cookie_options())
+    return response
+
+
+def load_listing(key, query, limit, cursor, projection, skip=0, session=None):
+    """Busca uma página serializada da listagem; a primeira página passa pelo cache.
+    
+    Com sessão causal (quem acabou de escrever) o cache é ignorado e a
+    leitura espera o secondary alcançar o token. A página que vai para o
+    cache é lida no PRIMARY, para não guardar a de antes da invalidação.
+    """
+    def load(primary=False):
+        photos, next_cursor = read_router.fetch_page(collection, 'listing', query, limit, cursor,
+                                                     projection, skip=skip, session=session, primary=primary)
+        return [serialize_photo(p) for p in photos], next_cursor
+    
+    if cursor or skip or session is not None:
+        return load()
+    fields = tuple(sorted(projection)) if projection else None
+    return metadata_cache.get_or_load(key + (limit, fields), lambda: load(primary=True))
+
+
+def parse_photo_form(form):
+    """Extrai (user, description, tags) do formulário de upload"""
+    user = form.get('user', 'usuario_padrao')
+    description = form.get('description', '')
+    tags = form.get('tags', '').split(',') if form.get('tags') else []
+    return user, description, tags
+
+
+def build_photo_doc(filename, user, description, tags, stored):
+    """Monta o documento de metadados de uma foto já gravada (GridFS ou disco)"""
+    photo_doc = {
+        **location(stored['store'], stored['file_id']),
+        'filename': filename,
+        'user': user,
+        'description': description,
+        'tags': tags,
+        'upload_date': datetime.utcnow(),
+        'size_kb': stored['length'] / 1024,
+        'content_type': stored['content_type'],
+        'sha256': stored['sha256'],
+        'status': 'uploaded'
+    }
+    photo_doc['search_grams'] = document_grams(photo_doc)
+    return photo_doc
+
+
+def uploaded_photo_summary(photo_doc, stored):
+    """Dados devolvidos ao cliente após o upload (photo_doc já com _id)"""
+    store, file_id = locate(photo_doc)
+    return {
+        '_id': str(photo_doc['_id']),
+        STORE_FIELDS[store]: str(file_id),
+        'filename': photo_doc['filename'],
+        'user': photo_doc['user'],
+        'description': photo_doc['description'],
+        'tags': photo_doc['tags'],
+        'size_kb': round(photo_doc['size_kb'], 2),
+        'deduplicated': stored['deduplicated']
+    }
+
+
+def delete_blobs(locations):
+    """Remove arquivos (backend, id) que ninguém referencia (falhas ficam para o orphan_sweeper)"""
+    for store, file_id in locations:
+        try:
+            blob_stores[store].delete(file_id)
+        except Exception as e:
+            log.warning(f"Erro ao remover arquivo ({store}): {e}")
+
+
+def commit_uploads(entries, restore):
+    """Commit transacional das fotos; devolve o token causal.
+    
+    Se um blob reaproveitado sumiu antes do commit, `restore(stored)` regrava
+    o conteúdo daquela entrada e o commit é repetido uma vez.
+    """
+    for attempt in range(2):
+        try:
+            with client.start_session(causal_consistency=True) as session:
+                with admission.timed():
+                    surplus = commit_photos(session, collection, blobs, entries, stats)
+                delete_blobs(surplus)
+                return encode_token(session)
+        except BlobGone as e:
+            if attempt:
+                raise
+            entries = [(doc, restore(stored) if stored['sha256'] in e.sha256s else stored)
+                       for doc, stored in entries]
+
+
+def missing_spooled_files(entries):
+    """Entradas do spool cujo arquivo não existe mais (uma consulta por backend)"""
+    existing = {}
+    for store in {stored['store'] for _, stored in entries}:
+        file_ids = [stored['file_id'] for _, stored in entries if stored['store'] == store]
+        existing[store] = blob_stores[store].existing(file_ids)
+    return [(doc, stored) for doc, stored in entries if stored['file_id'] not in existing[stored['store']]]
+
+
+def commit_spooled(entries):
+    """Commit de um lote drenado do spool de ingestão; idempotente pelo _id gerado no upload"""
+    ids = [doc['_id'] for doc, _ in entries]
+    committed = {doc['_id'] for doc in collection.find({'_id': {'$in': ids}}, {'_id': 1})}
+    entries = [(doc, stored) for doc, stored in entries if doc['_id'] not in committed]
+    # Foto sem bytes não é gravada: o arquivo sumiu do backend depois do 202 (o sweeper não o
+    # remove enquanto está no spool, mas o disco pode ter sido limpo por fora)
+    missing = missing_spooled_files(entries)
+    for doc, stored in missing:
+        log.error(f"Upload {doc['_id']} descartado do spool: arquivo {stored['file_id']} ({stored['store']}) não existe")
+    gone = {doc['_id'] for doc, _ in missing}
+    entries = [(doc, stored) for doc, stored in entries if doc['_id'] not in gone]
+    if not entries:
+        return
+    # Os bytes foram gravados sem consultar os blobs: o conteúdo repetido sobra e é removido aqui.
+    # Os contadores entram na mesma transação: um replay depois de uma queda não os perde nem repete
+    with client.start_session() as session:
+        delete_blobs(commit_photos(session, collection, blobs, entries, stats))
+    for doc, _ in entries:
+        invalidate_photo(metadata_cache, doc['_id'])
+    for doc, _ in entries:
+        tag_index.apply(doc)
+    # Miniaturas só do conteúdo novo (a foto ficou com o próprio arquivo)
+    enqueue_thumbnails([doc for doc, stored in entries if locate(doc) == (stored['store'], stored['file_id'])])
+
+
+# Spool de ingestão (INGEST_MODE=spool): o upload responde 202 e os metadados são gravados em segundo plano
+ingest_spool = IngestSpool(commit_spooled) if INGEST_MODE == 'spool' else None
+if ingest_spool is not None:
+    REGISTRY.collector(spool_collector(lambda: ingest_spool))
+
+
+def spool_pending_files():
+    """Arquivos citados pelo spool de ingestão ainda não drenado (o orphan_sweeper não os remove)"""
+    return pending_files(ingest_spool.directory) if ingest_spool is not None else set()
+
+
+def start_ingest_spool():
+    """Inicia a thread que drena o spool de ingestão (só com INGEST_MODE=spool)"""
+    if ingest_spool is not None and not ingest_spool.is_alive():
+        ingest_spool.start()
+        log.info(f"✅ Spool de ingestão iniciado em {ingest_spool.directory}")
+    return ingest_spool
+
+
+def spool_photo(photo_doc, stored):
+    """Dá o _id à foto e acrescenta os metadados ao spool (levanta SpoolFull)"""
+    photo_doc['_id'] = ObjectId()
+    try:
+        ingest_spool.append([(photo_doc, stored)])
+    except SpoolFull:
+        delete_blobs([(stored['store'], stored['file_id'])])
+        raise
+
+
+def enqueue_thumbnails(photo_docs):
+    """Enfileira as miniaturas das fotos recém-gravadas (já com a localização do blob)"""
+    for photo_doc in photo_docs:
+        thumbnailer.submit(photo_doc['sha256'], *locate(photo_doc))
+
+
+def iter_grid_out(grid_out, start, end):
+    """Gera os bytes [start, end) do arquivo, um chunk do GridFS por vez"""
+    remaining = end - start
+    try:
+        grid_out.seek(start)
+        while remaining > 0:
+            data = grid_out.readchunk()
+            if not data:
+                break
+            if len(data) > remaining:
+                data = data[:remaining]
+            remaining -= len(data)
+            yield data
+    finally:
+        gridfs_bytes.inc(end - start - remaining, 'out')
+        grid_out.close()
+
+
+# ============= MÉTRICAS =============
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        seconds = time.perf_counter() - started
+        # Template da rota (não o path) para manter a cardinalidade baixa
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(route, request.method, response.status_code, seconds)
+        log_request(route, request.method, response.status_code, seconds)
+    return response
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Métricas no formato texto do Prometheus"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 
 # ============= ROTAS DA API =============
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Verifica status da API e conexão com MongoDB"""
-    try:
-        # Ping no MongoDB
-        client.admin.command('ping')
-        
-        # Status do Replica Set
-        status = client.admin.command('replSetGetStatus')
-        primary = None
-        secondaries = []
-        
-        for member in status['members']:
-            if member['stateStr'] == 'PRIMARY':
-                primary = member['name']
-            elif member['stateStr'] == 'SECONDARY':
-                secondaries.append(member['name'])
-        
-        return jsonify({
-            'status': 'healthy',
-            'database': DB_NAME,
-            'replica_set': status['set'],
-            'primary': primary,
-            'secondaries': secondaries,
-            'members_count': len(status['members'])
-        }), 200
-    except Exception as e:
+    """Verifica status da API e do MongoDB (a partir do snapshot da topologia)"""
+    snapshot = topology_monitor.snapshot()
+    
+    if not snapshot['primary']:
         return jsonify({
             'status': 'unhealthy',
-            'error': str(e)
+            'error': snapshot['status_error'] or 'Nenhum PRIMARY conhecido',
+            'members_count': len(snapshot['members'])
         }), 500
+    
+    return jsonify({
+        'status': 'healthy',
+        'database': DB_NAME,
+        'replica_set': snapshot['replica_set'],
+        'primary': snapshot['primary'],
+        'secondaries': snapshot['secondaries'],
+        'members_count': len(snapshot['members'])
+    }), 200
 
 
 @app.route('/api/photos', methods=['GET'])
 def get_photos():
     """Lista todas as fotos (últimas 50)"""
     try:
-        print("📸 Recebendo requisição GET /api/photos")
-        
         # Parâmetros de query
-        limit = int(request.args.get('limit', 50))
+        limit = parse_page_size(request.args.get('limit'))
         skip = int(request.args.get('skip', 0))
+        cursor = request.args.get('cursor')
         tag = request.args.get('tag')
         user = request.args.get('user')
         
-        print(f"   Params: limit={limit}, skip={skip}, tag={tag}, user={user}")
-        
         # Construir query
         query = {}
         if tag:
@@ -141,37 +510,26 @@ def get_photos():
         if user:
             query['user'] = user
         
-        print(f"   Query: {query}")
-        
-        # Usar collection com leitura de secondary para listar fotos
-        read_collection = collection.with_options(read_preference=ReadPreference.SECONDARY_PREFERRED)
-        
-        print("   Executando find()...")
-        # Buscar documentos
-        photos = list(read_collection.find(query)
-                     .sort('upload_date', -1)
-                     .skip(skip)
-                     .limit(limit))
-        
-        print(f"   ✅ Encontradas {len(photos)} fotos")
+        # Leitura com a política da classe 'listing' (secondaryPreferred por padrão);
+        # paginação por cursor, skip mantido por compatibilidade
+        projection = parse_fields(request.args.get('fields'))
+        with causal_read() as session:
+            photos, next_cursor = load_listing(listing_key('photos', tag, user), query, limit, cursor,
+                                               projection, skip=skip, session=session)
         
-        # Serializar e adicionar URL da foto
-        photos = [serialize_doc(p) for p in photos]
-        
-        # Adicionar URL para visualização da foto
-        for photo in photos:
-            if 'gridfs_id' in photo:
-                photo['photo_url'] = f"/api/photos/{photo['_id']}/file"
-        
-        print(f"   ✅ Retornando {len(photos)} fotos serializadas")
-        return jsonify({
+        return json_response({
             'success': True,
             'count': len(photos),
-            'photos': photos
-        }), 200
+            'photos': photos,
+            'next_cursor': next_cursor
+        })
+    except (InvalidCursor, InvalidPageSize, InvalidFields) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
-        print(f"❌ Erro ao listar fotos: {str(e)}")
-        print(f"   Traceback: {traceback.format_exc()}")
+        log.exception("❌ Erro ao listar fotos")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -182,7 +540,20 @@ def get_photos():
 def get_photo(photo_id):
     """Busca uma foto específica por ID"""
     try:
-        photo = collection.find_one({'_id': ObjectId(photo_id)})
+        projection = parse_fields(request.args.get('fields'), default=None)
+        
+        with causal_read() as session:
+            def load(primary=False):
+                photo = read_router.find_one(collection, 'detail', {'_id': ObjectId(photo_id)},
+                                             projection, session=session, primary=primary)
+                return serialize_photo(photo) if photo else None
+            
+            # Só o documento completo (sem fields=) e sem token causal passa pelo cache,
+            # preenchido com a leitura do PRIMARY
+            if projection is FULL_DOCUMENT and session is None:
+                photo = metadata_cache.get_or_load(photo_key(photo_id), lambda: load(primary=True))
+            else:
+                photo = load()
         
         if not photo:
             return jsonify({
@@ -190,21 +561,133 @@ def get_photo(photo_id):
                 'error': 'Foto não encontrada'
             }), 404
         
+        return json_response({
+            'success': True,
+            'photo': photo
+        })
+    except Exception as e:
         return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@app.route('/api/photos/batch', methods=['GET'])
+def get_photos_batch():
+    """Metadados de várias fotos (`ids` separados por vírgula) numa única consulta $in"""
+    try:
+        ids = parse_ids(request.args.get('ids'))
+        projection = parse_fields(request.args.get('fields'))
+        
+        with causal_read() as session:
+            docs = read_router.find_ids(collection, 'detail', ids, projection, session=session)
+        
+        # Mesma ordem dos IDs pedidos; os inexistentes vão em `missing`
+        by_id = {doc['_id']: doc for doc in docs}
+        photos = [serialize_photo(by_id[photo_id]) for photo_id in ids if photo_id in by_id]
+        return json_response({
             'success': True,
-            'photo': serialize_doc(photo)
-        }, 200)
+            'count': len(photos),
+            'photos': photos,
+            'missing': [str(photo_id) for photo_id in ids if photo_id not in by_id]
+        })
+    except (InvalidIds, InvalidFields) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
+        log.exception("Erro ao buscar fotos em lote")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/photos/<photo_id>/neighbors', methods=['GET'])
+def get_photo_neighbors(photo_id):
+    """A foto e as `n` anteriores/seguintes na ordenação da listagem (filtros `tag`/`user` opcionais).
+    
+    `previous` e `next` vêm da mais próxima para a mais distante.
+    """
+    try:
+        count = parse_neighbor_count(request.args.get('n'))
+        projection = parse_fields(request.args.get('fields'))
+        query = {}
+        if request.args.get('tag'):
+            query['tags'] = request.args['tag']
+        if request.args.get('user'):
+            query['user'] = request.args['user']
+        
+        with causal_read() as session:
+            photo = read_router.find_one(collection, 'detail', {'_id': ObjectId(photo_id)}, projection,
+                                         session=session)
+            if not photo:
+                return jsonify({
+                    'success': False,
+                    'error': 'Foto não encontrada'
+                }), 404
+            previous, following = read_router.fetch_neighbors(collection, 'listing', photo, count, query,
+                                                              projection, session=session)
+        
+        return json_response({
+            'success': True,
+            'photo': serialize_photo(photo),
+            'previous': [serialize_photo(p) for p in previous],
+            'next': [serialize_photo(p) for p in following]
+        })
+    except (InvalidId, InvalidFields, ValueError) as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 400
+    except Exception as e:
+        log.exception("Erro ao buscar vizinhos")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def spool_bypasses_replica_set():
+    """Upload em modo spool com os bytes em disco: nada no caminho da requisição espera o replica set"""
+    return ingest_spool is not None and blob_store.name == 'fs'
+
+
+def admitted(spoolable=False):
+    """Passa a escrita pelo controle de admissão antes de ler o corpo (429/503 com Retry-After).
+    
+    Com `spoolable`, INGEST_MODE=spool e BLOB_STORE=fs a escrita não espera o
+    replica set, então não é recusada por falta de PRIMARY ou de maioria. Com
+    GridFS os bytes ainda são uma escrita majority e a topologia é checada.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                with admission.slot(replicated=not (spoolable and spool_bypasses_replica_set())):
+                    return view(*args, **kwargs)
+            except Overloaded as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), e.status, {'Retry-After': str(e.retry_after)}
+        return wrapper
+    return decorator
 
 
 @app.route('/api/photos', methods=['POST'])
+@admitted(spoolable=True)
 def upload_photo():
     """Upload de foto completa usando GridFS"""
     try:
+        # Rejeitar cedo (antes de ler o corpo) quando o Content-Length já passa do limite
+        if request.content_length and request.content_length > MAX_UPLOAD_BYTES + 64 * 1024:
+            return jsonify({
+                'success': False,
+                'error': f'Arquivo excede o limite de {MAX_UPLOAD_BYTES} bytes'
+            }), 413
+        
         # Verificar se há arquivo na requisição
         if 'file' not in request.files:
             return jsonify({
@@ -221,56 +704,153 @@ def upload_photo():
             }), 400
         
         # Obter metadados do formulário
-        user = request.form.get('user', 'usuario_padrao')
-        description = request.form.get('description', '')
-        tags = request.form.get('tags', '').split(',') if request.form.get('tags') else []
-        
-        # Ler o arquivo em memória
-        file_data = file.read()
-        
-        # Salvar no GridFS com writeConcern majority
-        file_id = get_gridfs().put(
-            file_data,
-            filename=file.filename,
-            content_type=file.content_type,
-            user=user,
-            description=description,
-            tags=tags,
-            upload_date=datetime.utcnow(),
-            size_kb=len(file_data) / 1024
-        )
-        
-        # Criar documento de metadados na collection principal
-        photo_doc = {
-            'gridfs_id': file_id,
-            'filename': file.filename,
-            'user': user,
-            'description': description,
-            'tags': tags,
-            'upload_date': datetime.utcnow(),
-            'size_kb': len(file_data) / 1024,
-            'content_type': file.content_type,
-            'status': 'uploaded'
-        }
-        
-        result = collection.insert_one(photo_doc)
+        user, description, tags = parse_photo_form(request.form)
         
-        return jsonify({
+        # Gravar no GridFS em blocos, reaproveitando o blob se o conteúdo já existir.
+        # Os metadados ficam só no documento da foto (não são repetidos no fs.files)
+        def store(stored=None):
+            if stored is not None:
+                file.stream.seek(0)
+            return store_deduplicated(blob_store, blobs, file.stream, file.filename,
+                                      declared_type=file.mimetype)
+        
+        try:
+            if ingest_spool is None:
+                stored = store()
+            else:
+                # Modo spool: os bytes são gravados sem consultar os blobs (a deduplicação fica para o commit)
+                stored = dict(blob_store.write(file.stream, file.filename, declared_type=file.mimetype),
+                              deduplicated=False)
+        except UploadTooLarge as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 413
+        
+        # Documento de metadados + referência ao blob numa única transação
+        if not stored['deduplicated']:
+            gridfs_bytes.inc(stored['length'], 'in')
+        photo_doc = build_photo_doc(file.filename, user, description, tags, stored)
+        
+        if ingest_spool is not None:
+            try:
+                spool_photo(photo_doc, stored)
+            except SpoolFull as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 503, {'Retry-After': str(SPOOL_FULL_RETRY_AFTER)}
+            # Aceita: a foto fica visível quando o spool for drenado para o MongoDB
+            return jsonify({
+                'success': True,
+                'data': dict(uploaded_photo_summary(photo_doc, stored), status='queued'),
+                'message': 'Foto recebida; ela aparece na galeria em instantes'
+            }), 202
+        
+        token = commit_uploads([(photo_doc, stored)], store)
+        invalidate_photo(metadata_cache, photo_doc['_id'])
+        tag_index.apply(photo_doc)
+        if not stored['deduplicated']:
+            enqueue_thumbnails([photo_doc])
+        
+        return with_causal_token(jsonify({
             'success': True,
-            'data': {
-                '_id': str(result.inserted_id),
-                'gridfs_id': str(file_id),
-                'filename': file.filename,
-                'user': user,
-                'description': description,
-                'tags': tags,
-                'size_kb': round(len(file_data) / 1024, 2)
-            },
+            'data': uploaded_photo_summary(photo_doc, stored),
             'message': 'Foto enviada com sucesso!'
-        }), 201
+        }), token), 201
+        
+    except Exception as e:
+        log.exception("Erro no upload")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/photos/batch', methods=['POST'])
+@admitted()
+def upload_photos_batch():
+    """Upload de vários arquivos (campo `files`) com um único commit transacional dos metadados"""
+    try:
+        files = [f for f in request.files.getlist('files') if f.filename]
+        
+        if not files:
+            return jsonify({
+                'success': False,
+                'error': 'Nenhum arquivo enviado'
+            }), 400
+        
+        if len(files) > BATCH_MAX_FILES:
+            return jsonify({
+                'success': False,
+                'error': f'Máximo de {BATCH_MAX_FILES} arquivos por requisição'
+            }), 400
+        
+        user, description, tags = parse_photo_form(request.form)
+        
+        # Blobs em paralelo (pool limitado); falhas ficam registradas por arquivo
+        results = []
+        pending = []
+        for file, stored in zip(files, store_files(blob_store, blobs, files)):
+            if isinstance(stored, Exception):
+                results.append({'filename': file.filename, 'success': False, 'error': str(stored)})
+            else:
+                if not stored['deduplicated']:
+                    gridfs_bytes.inc(stored['length'], 'in')
+                doc = build_photo_doc(file.filename, user, description, tags, stored)
+                pending.append((len(results), doc, stored, file))
+                results.append(None)
+        
+        by_sha256 = {stored['sha256']: file for _, _, stored, file in pending}
+        
+        def restore(stored):
+            file = by_sha256[stored['sha256']]
+            file.stream.seek(0)
+            return store_deduplicated(blob_store, blobs, file.stream, file.filename,
+                                      declared_type=file.mimetype)
+        
+        # Todas as fotos do lote (e as referências aos blobs) numa única transação:
+        # ou o lote inteiro fica visível ou nenhuma foto dele
+        token = None
+        inserted = []
+        try:
+            if pending:
+                token = commit_uploads([(doc, stored) for _, doc, stored, _ in pending], restore)
+                inserted = [doc for _, doc, _, _ in pending]
+                for position, doc, stored, _ in pending:
+                    results[position] = dict(uploaded_photo_summary(doc, stored), success=True)
+        except Exception as e:
+            log.exception("Erro no commit do lote")
+            delete_blobs([(stored['store'], stored['file_id']) for _, _, stored, _ in pending
+                          if not stored['deduplicated']])
+            for position, doc, _, _ in pending:
+                results[position] = {'filename': doc['filename'], 'success': False, 'error': str(e)}
+        
+        if inserted:
+            metadata_cache.invalidate_kind('list')
+            for doc in inserted:
+                tag_index.apply(doc)
+            enqueue_thumbnails([doc for _, doc, stored, _ in pending if not stored['deduplicated']])
+        
+        if len(inserted) == len(files):
+            status = 201
+        elif inserted:
+            status = 207  # Multi-Status: parte dos arquivos falhou
+        else:
+            status = 500
+        
+        response = jsonify({
+            'success': bool(inserted),
+            'uploaded': len(inserted),
+            'failed': len(files) - len(inserted),
+            'results': results
+        })
+        if token:
+            with_causal_token(response, token)
+        return response, status
         
     except Exception as e:
-        print(f"Erro no upload: {traceback.format_exc()}")
+        log.exception("Erro no upload em lote")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -278,11 +858,15 @@ def upload_photo():
 
 
 @app.route('/api/photos/<photo_id>', methods=['DELETE'])
+@admitted()
 def delete_photo(photo_id):
-    """Remove uma foto e seu arquivo do GridFS"""
+    """Remove uma foto e seu arquivo (GridFS ou disco)"""
     try:
-        # Buscar a foto para obter o gridfs_id
-        photo = collection.find_one({'_id': ObjectId(photo_id)})
+        # Documento e referência ao blob numa única transação
+        with client.start_session(causal_consistency=True) as session:
+            with admission.timed():
+                photo, released = remove_photo(session, collection, blobs, {'_id': ObjectId(photo_id)}, stats)
+            token = encode_token(session)
         
         if not photo:
             return jsonify({
@@ -290,20 +874,19 @@ def delete_photo(photo_id):
                 'error': 'Foto não encontrada'
             }), 404
         
-        # Remover arquivo do GridFS se existir
-        if 'gridfs_id' in photo:
-            try:
-                get_gridfs().delete(photo['gridfs_id'])
-            except Exception as e:
-                print(f"Erro ao remover arquivo do GridFS: {e}")
+        invalidate_photo(metadata_cache, photo_id)
+        tag_index.apply(photo, -1)
         
-        # Remover documento da collection
-        collection.delete_one({'_id': ObjectId(photo_id)})
+        # Remover o arquivo quando não houver mais referências a ele
+        if released:
+            delete_blobs([released])
+            if 'sha256' in photo:
+                thumbnailer.discard(photo['sha256'], released[0])
         
-        return jsonify({
+        return with_causal_token(jsonify({
             'success': True,
             'message': 'Foto removida com sucesso'
-        }), 200
+        }), token), 200
     except Exception as e:
         return jsonify({
             'success': False,
@@ -311,65 +894,156 @@ def delete_photo(photo_id):
         }), 500
 
 
+# Campos da foto usados pelo download
+FILE_PROJECTION = {'gridfs_id': 1, 'storage_path': 1, 'filename': 1, 'content_type': 1, 'upload_date': 1,
+                   'sha256': 1}
+
+
+def local_file_response(photo):
+    """Download de uma foto guardada em disco: o corpo é o próprio arquivo"""
+    try:
+        stored_file = blob_stores['fs'].describe(photo['storage_path'], photo)
+    except FileNotFoundError:
+        return jsonify({
+            'success': False,
+            'error': 'Arquivo não encontrado'
+        }), 404
+    return disk_file_response(stored_file)
+
+
+def disk_file_response(stored_file):
+    """Resposta (200/206/304/416) de um arquivo local descrito por um StoredFile"""
+    status, start, end, headers = plan_file_response(request.headers, stored_file)
+    if status in (304, 416):
+        return Response(status=status, headers=headers)
+    if status == 200 and app.config['USE_X_SENDFILE']:
+        # O servidor na frente (nginx/Apache) envia o arquivo
+        headers['X-Sendfile'] = stored_file.path
+        return Response(status=status, mimetype=grid_content_type(stored_file), headers=headers)
+    if status == 200:
+        # wsgi.file_wrapper: o servidor WSGI pode usar sendfile (zero cópia)
+        body = wrap_file(request.environ, open(stored_file.path, 'rb'))
+    else:
+        body = iter_file_range(stored_file.path, start, end)
+    return Response(body, status=status, mimetype=grid_content_type(stored_file), headers=headers,
+                    direct_passthrough=True)
+
+
+def grid_file_response(grid_out):
+    """Resposta de um arquivo do GridFS em streaming"""
+    status, start, end, headers = plan_file_response(request.headers, grid_out)
+    if status in (304, 416):
+        grid_out.close()
+        return Response(status=status, headers=headers)
+    return Response(
+        iter_grid_out(grid_out, start, end),
+        status=status,
+        mimetype=grid_content_type(grid_out),
+        headers=headers,
+        direct_passthrough=True
+    )
+
+
+def thumbnail_response(photo, width):
+    """Miniatura pré-calculada mais próxima de `width` (gerada agora se faltar).
+
+    Retorna None quando não há miniatura possível (sem Pillow, foto sem
+    `sha256` ou falha ao gerar); nesse caso o original é enviado.
+    """
+    if not thumbnailer.enabled or 'sha256' not in photo:
+        return None
+    try:
+        derivative = thumbnailer.derivative(photo['sha256'], *locate(photo), pick_width(width),
+                                            pick_format(request.headers.get('Accept')))
+    except Exception as e:
+        log.warning(f"Erro ao gerar miniatura de {photo['_id']}: {e}")
+        return None
+    if isinstance(derivative, StoredFile):
+        response = disk_file_response(derivative)
+    else:
+        response = grid_file_response(derivative)
+    # JPEG ou WebP conforme o Accept do navegador
+    response.headers['Vary'] = 'Accept'
+    return response
+
+
 @app.route('/api/photos/<photo_id>/file', methods=['GET'])
 def get_photo_file(photo_id):
-    """Baixa o arquivo da foto do GridFS"""
+    """Envia o arquivo da foto (GridFS em streaming ou arquivo em disco), com Range e cache condicional"""
+    try:
+        width = parse_width(request.args.get('w'))
+    except InvalidWidth as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    # A sessão causal (se houver token) vale para a leitura do documento; os bytes
+    # de quem tem token vêm do PRIMARY (ver open_grid_file)
+    session = start_causal_session(client, request_token(request.headers, request.cookies))
     try:
-        # Buscar a foto
-        photo = collection.find_one({'_id': ObjectId(photo_id)})
+        # No GridFS, nome, tipo e tamanho vêm do documento fs.files; no disco, da foto
+        photo = read_router.find_one(collection, 'file', {'_id': ObjectId(photo_id)}, FILE_PROJECTION,
+                                     session=session)
         
-        if not photo or 'gridfs_id' not in photo:
+        if not photo or not any(field in photo for field in STORE_FIELDS.values()):
             return jsonify({
                 'success': False,
                 'error': 'Foto não encontrada'
             }), 404
         
-        # Buscar arquivo no GridFS
+        if width:
+            response = thumbnail_response(photo, width)
+            if response is not None:
+                return response
+        
+        if 'storage_path' in photo:
+            return local_file_response(photo)
+        
+        # Abrir o arquivo no GridFS (lê só o documento fs.files, nenhum chunk ainda)
         try:
-            grid_out = get_gridfs().get(photo['gridfs_id'])
+            grid_out = open_grid_file(photo['gridfs_id'], causal=session is not None)
         except gridfs.errors.NoFile:
             return jsonify({
                 'success': False,
                 'error': 'Arquivo não encontrado no GridFS'
             }), 404
         
-        # Retornar arquivo como resposta
-        return Response(
-            grid_out.read(),
-            mimetype=photo.get('content_type', 'application/octet-stream'),
-            headers={
-                'Content-Disposition': f'inline; filename="{photo["filename"]}"'
-            }
-        )
+        return grid_file_response(grid_out)
         
     except Exception as e:
-        print(f"Erro ao buscar arquivo: {traceback.format_exc()}")
+        log.exception("Erro ao buscar arquivo")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
+    finally:
+        if session is not None:
+            session.end_session()
 
 
 @app.route('/api/photos/user/<username>', methods=['GET'])
 def get_photos_by_user(username):
     """Lista fotos de um usuário específico"""
     try:
-        photos = list(collection.find({'user': username})
-                     .sort('upload_date', -1)
-                     .limit(100))
-        
-        photos = [serialize_doc(p) for p in photos]
+        limit = parse_page_size(request.args.get('limit'), default=100)
+        projection = parse_fields(request.args.get('fields'))
+        with causal_read() as session:
+            photos, next_cursor = load_listing(listing_key('user', username), {'user': username}, limit,
+                                               request.args.get('cursor'), projection, session=session)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'user': username,
             'count': len(photos),
-            'photos': photos
-        }), 200
+            'photos': photos,
+            'next_cursor': next_cursor
+        })
+    except (InvalidCursor, InvalidPageSize, InvalidFields) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -377,22 +1051,70 @@ def get_photos_by_user(username):
         }), 500
 
 
+def open_export_file(photo, causal=False):
+    """Abre os bytes de uma foto para o export; FileNotFoundError/NoFile se não existirem"""
+    store, file_id = locate(photo)
+    if store is None:
+        raise FileNotFoundError(str(photo['_id']))
+    if store != 'gridfs':
+        return blob_stores[store].open(file_id)
+    return open_grid_file(file_id, causal)
+
+
+def export_photos(username, offset=0, causal=False):
+    """Gerador dos bytes do ZIP com as fotos de `username` a partir da posição `offset`.
+    
+    Com token causal (quem acabou de enviar fotos) metadados e arquivos vêm do
+    PRIMARY, como no download; sem token, dos membros da classe 'file'.
+    """
+    source = collection if causal else collection.with_options(read_preference=read_router.preference('file'))
+    return export_user(source, lambda photo: open_export_file(photo, causal), username, offset)
+
+
+@app.route('/api/photos/user/<username>/export.zip', methods=['GET'])
+def export_photos_by_user(username):
+    """ZIP com as fotos de um usuário (mais antigas primeiro) e o manifest, gerado durante o envio"""
+    try:
+        offset = parse_offset(request.args.get('offset'))
+    except InvalidOffset as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    headers = {
+        'Content-Disposition': f'attachment; filename="{secure_filename(username) or "fotos"}.zip"',
+        'Cache-Control': 'no-store'
+    }
+    causal = start_causal_session(client, request_token(request.headers, request.cookies))
+    if causal is not None:
+        causal.end_session()
+    return Response(export_photos(username, offset, causal is not None), mimetype='application/zip',
+                    headers=headers, direct_passthrough=True)
+
+
 @app.route('/api/photos/tag/<tag>', methods=['GET'])
 def get_photos_by_tag(tag):
     """Lista fotos por tag"""
     try:
-        photos = list(collection.find({'tags': tag})
-                     .sort('upload_date', -1)
-                     .limit(100))
-        
-        photos = [serialize_doc(p) for p in photos]
+        limit = parse_page_size(request.args.get('limit'), default=100)
+        projection = parse_fields(request.args.get('fields'))
+        with causal_read() as session:
+            photos, next_cursor = load_listing(listing_key('tags', tag), {'tags': tag}, limit,
+                                               request.args.get('cursor'), projection, session=session)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'tag': tag,
             'count': len(photos),
-            'photos': photos
-        }), 200
+            'photos': photos,
+            'next_cursor': next_cursor
+        })
+    except (InvalidCursor, InvalidPageSize, InvalidFields) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -404,30 +1126,15 @@ def get_photos_by_tag(tag):
 def get_stats():
     """Estatísticas do sistema"""
     try:
-        total_photos = collection.count_documents({})
-        
-        # Top usuários
-        pipeline = [
-            {'$group': {'_id': '$user', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}},
-            {'$limit': 5}
-        ]
-        top_users = list(collection.aggregate(pipeline))
-        
-        # Top tags
-        pipeline = [
-            {'$unwind': '$tags'},
-            {'$group': {'_id': '$tags', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}},
-            {'$limit': 10}
-        ]
-        top_tags = list(collection.aggregate(pipeline))
+        # Contadores mantidos com $inc no upload/delete (custo O(top N))
+        summary = read_stats(stats)
         
         return jsonify({
             'success': True,
-            'total_photos': total_photos,
-            'top_users': top_users,
-            'top_tags': top_tags
+            'total_photos': summary['total_photos'],
+            'total_bytes': summary['total_bytes'],
+            'top_users': summary['top_users'],
+            'top_tags': summary['top_tags']
         }), 200
     except Exception as e:
         return jsonify({
@@ -436,9 +1143,65 @@ def get_stats():
         }), 500
 
 
+def tag_counts_response(tags):
+    return jsonify({
+        'success': True,
+        'tags': [{'tag': tag, 'count': count} for tag, count in tags]
+    }), 200
+
+
+def tag_index_unavailable():
+    """Resposta enquanto o índice de tags ainda não foi construído (logo após o startup)"""
+    return jsonify({
+        'success': False,
+        'error': 'Índice de tags em construção'
+    }), 503, {'Retry-After': '1'}
+
+
+@app.route('/api/tags/suggest', methods=['GET'])
+def suggest_tags():
+    """Tags mais usadas que começam com `prefix` (opcional: só as de `user`), do índice em memória"""
+    try:
+        limit = parse_limit(request.args.get('limit'))
+    except InvalidLimit as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    if not tag_index.ready:
+        return tag_index_unavailable()
+    return tag_counts_response(tag_index.suggest(request.args.get('prefix', ''), limit,
+                                                 request.args.get('user')))
+
+
+@app.route('/api/tags/facets', methods=['GET'])
+def tag_facets():
+    """Contagem das tags mais usadas (de todos ou de `user`), do índice em memória"""
+    try:
+        limit = parse_limit(request.args.get('limit'))
+    except InvalidLimit as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    if not tag_index.ready:
+        return tag_index_unavailable()
+    return tag_counts_response(tag_index.facets(request.args.get('user'), limit))
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Contadores do cache de metadados"""
+    return jsonify({
+        'success': True,
+        'cache': metadata_cache.stats(),
+        'change_stream': bool(cache_invalidator and cache_invalidator.healthy)
+    }), 200
+
+
 @app.route('/api/search', methods=['GET'])
 def search_photos():
-    """Busca fotos por texto no filename ou description"""
+    """Busca fotos por substring no filename ou description (sem regex)"""
     try:
         query_text = request.args.get('q', '')
         
@@ -448,22 +1211,28 @@ def search_photos():
                 'error': 'Parâmetro "q" é obrigatório'
             }), 400
         
-        # Busca com regex (case insensitive)
-        photos = list(collection.find({
-            '$or': [
-                {'filename': {'$regex': query_text, '$options': 'i'}},
-                {'description': {'$regex': query_text, '$options': 'i'}}
-            ]
-        }).limit(50))
+        # Busca por trigramas (índice multikey) + confirmação da substring
+        limit = parse_page_size(request.args.get('limit'))
+        projection = parse_fields(request.args.get('fields'))
+        with causal_read() as session:
+            page, next_cursor = read_router.fetch_page(collection, 'search', search_query(query_text, gram_sample), limit,
+                                                       request.args.get('cursor'), search_projection(projection),
+                                                       session=session)
         
-        photos = [serialize_doc(p) for p in photos]
+        photos = [serialize_photo(p) for p in page if matches(p, query_text)]
         
-        return jsonify({
+        return json_response({
             'success': True,
             'query': query_text,
             'count': len(photos),
-            'photos': photos
-        }), 200
+            'photos': photos,
+            'next_cursor': next_cursor
+        })
+    except (InvalidSearch, InvalidCursor, InvalidPageSize, InvalidFields) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -473,70 +1242,63 @@ def search_photos():
 
 @app.route('/api/replicaset/status', methods=['GET'])
 def get_replicaset_status():
-    """Retorna o status detalhado dos membros do Replica Set"""
-    print("📡 Requisição recebida em /api/replicaset/status")
-    try:
-        # Executar comando no PRIMARY usando direct_connection para evitar erro de routing
-        # Tentar obter status usando qualquer membro disponível
-        print("🔍 Tentando obter status do replica set...")
-        try:
-            status = client.admin.command('replSetGetStatus')
-            print("✅ Status obtido com sucesso do cliente principal")
-        except Exception as e:
-            # Se falhar, tentar conectar diretamente no PRIMARY conhecido
-            print(f"⚠️ Aviso ao obter status: {e}")
-            print("🔄 Tentando conexão direta com o PRIMARY...")
-            # Criar cliente temporário direto para admin commands
-            temp_client = MongoClient(
-                "mongodb://10.63.144.180:27017/?directConnection=true",
-                serverSelectionTimeoutMS=5000
-            )
-            status = temp_client.admin.command('replSetGetStatus')
-            temp_client.close()
-            print("✅ Status obtido via conexão direta")
-        
-        members = []
-        for member in status.get('members', []):
-            members.append({
-                'name': member.get('name'),
-                'state': member.get('stateStr'),
-                'health': 'Healthy' if member.get('health') == 1 else 'Unhealthy',
-                'uptime': member.get('uptime'),
-                'pingMs': member.get('pingMs', 'N/A')
-            })
-        
-        print(f"📊 Retornando dados de {len(members)} membros")
-        return jsonify({
-            'success': True,
-            'replica_set_name': status.get('set'),
-            'members': members
-        }), 200
-    except Exception as e:
-        error_traceback = traceback.format_exc()
-        print(f"❌ Erro no endpoint /api/replicaset/status: {str(e)}")
-        print(f"📋 Traceback: {error_traceback}")
+    """Retorna o status detalhado dos membros do Replica Set (snapshot do monitor)"""
+    snapshot = topology_monitor.snapshot()
+    
+    members = []
+    for member in snapshot['members']:
+        members.append({
+            'name': member['name'],
+            'state': member.get('state'),
+            'health': member.get('health', 'Unknown'),
+            'uptime': member.get('uptime'),
+            'pingMs': member.get('pingMs', 'N/A'),
+            'lagSeconds': member.get('lagSeconds'),
+            'lastHeartbeat': member.get('lastHeartbeat')
+        })
+    
+    if not members:
         return jsonify({
             'success': False,
-            'error': str(e),
-            'traceback': error_traceback
-        }), 500
+            'error': snapshot['status_error'] or 'Topologia ainda não descoberta'
+        }), 503
+    
+    return jsonify({
+        'success': True,
+        'replica_set_name': snapshot['replica_set'],
+        'primary': snapshot['primary'],
+        'members': members,
+        'elections': snapshot['elections'],
+        'status_refreshed_at': snapshot['status_refreshed_at'],
+        'read_routing': read_router.describe()
+    }), 200
+
+
+def static_response(path):
+    """Serve um arquivo do frontend com cache/compressão decididos por static_assets"""
+    plan = static_store.plan(path, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
+    if plan is None:
+        return jsonify({'success': False, 'error': 'Arquivo não encontrado'}), 404
+    status, file_path, headers = plan
+    if status == 304:
+        return Response(status=304, headers={k: v for k, v in headers.items() if k != 'Content-Type'})
+    # send_file com caminho: wsgi.file_wrapper (sendfile) ou X-Sendfile, sem ler o arquivo no worker
+    response = send_file(file_path, mimetype=headers.pop('Content-Type'), conditional=False, etag=False)
+    response.headers.update(headers)
+    return response
 
 
 @app.route('/<path:path>')
 def serve_static_files(path):
-    """Serve arquivos estáticos do diretório frontend"""
-    return send_from_directory('../frontend', path)
+    """Serve arquivos estáticos do frontend (frontend/dist quando gerado)"""
+    return static_response(path)
 
 
 # Rota raiz
 @app.route('/')
 def index():
-    """Serve a página de login como página inicial"""
-    response = send_from_directory('../frontend', 'login.html')
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    """Serve a página de login como página inicial (revalidada por ETag a cada acesso)"""
+    return static_response('login.html')
 
 
 if __name__ == '__main__':
@@ -548,14 +1310,27 @@ if __name__ == '__main__':
     print("  GET  /api/health          - Status da API")
     print("  GET  /api/photos          - Lista fotos")
     print("  POST /api/photos          - Upload de foto")
+    print("  POST /api/photos/batch    - Upload de vários arquivos")
     print("  GET  /api/photos/<id>     - Busca foto")
+    print("  GET  /api/photos/batch?ids= - Busca várias fotos")
+    print("  GET  /api/photos/<id>/neighbors - Foto e vizinhas")
     print("  DEL  /api/photos/<id>     - Remove foto")
     print("  GET  /api/photos/user/<u> - Fotos do usuário")
     print("  GET  /api/photos/tag/<t>  - Fotos por tag")
     print("  GET  /api/search?q=<text> - Busca texto")
     print("  GET  /api/stats           - Estatísticas")
+    print("  GET  /api/cache/stats     - Estatísticas do cache")
+    print("  GET  /api/metrics         - Métricas (Prometheus)")
     print("  GET  /api/replicaset/status - Status do Replica Set")
     print("\n")
     
+    ensure_indexes()
+    start_cache_invalidator()
+    start_orphan_sweeper()
+    start_thumbnailer()
+    start_ingest_spool()
+    start_tag_index()
+    topology_monitor.start(client)
+    
     # Run in non-debug mode for stable Windows execution
     app.run(debug=False, host='0.0.0.0', port=5000)
@@ -0,0 +1,614 @@
+"""
+Modo de produção assíncrono (ASGI) da API PhotoLeader
+
+As rotas de fotos (listagens, busca por ID, download, upload e delete) são
+reimplementadas com o driver assíncrono do pymongo (AsyncMongoClient) e
+corpos em streaming, então uploads lentos ou downloads grandes não prendem
+um worker inteiro. As demais rotas (stats, busca, health, arquivos
+estáticos...) continuam sendo as do Flask (api.py), montadas via WSGI.
+
+O AsyncMongoClient é criado no startup de cada worker (lifespan), depois do
+fork; o MongoClient síncrono do api.py usa connect=False e só conecta no
+primeiro uso, já dentro do worker.
+
+Uso:
+  uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+(WEB_CONCURRENCY define o número de workers quando --workers é omitido.)
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs import AsyncGridFSBucket
+from gridfs.errors import NoFile
+from pymongo import AsyncMongoClient
+from pymongo.write_concern import WriteConcern
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import api
+from admission import Overloaded
+from ingest_spool import SPOOL_FULL_RETRY_AFTER, SpoolFull
+from causal import (CAUSAL_COOKIE, CAUSAL_HEADER, cookie_options, encode_token, request_token,
+                    start_causal_session)
+from blob_store import BLOB_STORE, STORE_FIELDS, AsyncGridFSStore, StoredFile, locate
+from dedup import store_deduplicated_async
+from file_response import grid_content_type, plan_file_response
+from logs import log_request
+from metrics import CommandMetrics, gridfs_bytes, observe_request
+from metadata_cache import invalidate_photo, listing_key, photo_key
+from read_routing import LOCAL_THRESHOLD_MS
+from photo_commit import BlobGone, commit_photos_async, remove_photo_async
+from pagination import (LISTING_SORT, InvalidCursor, InvalidIds, InvalidPageSize, after_cursor, neighbor_queries, parse_ids,
+                        parse_neighbor_count, parse_page_size, split_page)
+from serialization import FULL_DOCUMENT, InvalidFields, dumps, parse_fields, serialize_photo
+from thumbnails import InvalidWidth, parse_width, pick_format, pick_width
+from upload_stream import MAX_UPLOAD_BYTES, UploadTooLarge
+
+
+class AsyncMongo:
+    """Conexões assíncronas de um worker (criadas no startup, depois do fork)"""
+
+    def __init__(self, uri=api.REPLICA_URI):
+        self.client = AsyncMongoClient(uri, serverSelectionTimeoutMS=5000,
+                                       localThresholdMS=LOCAL_THRESHOLD_MS,
+                                       event_listeners=[CommandMetrics(), api.pool_metrics])
+        self.db = self.client[api.DB_NAME].with_options(
+            write_concern=WriteConcern(w='majority', wtimeout=5000)
+        )
+        self.collection = self.db[api.COLLECTION]
+        self.blobs = self.db[api.BLOBS_COLLECTION]
+        self.stats = self.db[api.STATS_COLLECTION]
+        self.bucket = AsyncGridFSBucket(self.db)
+        self.read_bucket = AsyncGridFSBucket(self.db, read_preference=api.read_router.preference('file'))
+        self.stores = {'gridfs': AsyncGridFSStore(self.bucket), 'fs': api.blob_stores['fs']}
+        self.store = self.stores[BLOB_STORE]
+
+    async def close(self):
+        await self.client.close()
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status_code=status, media_type='application/json')
+
+
+def error_response(message, status):
+    return json_response({'success': False, 'error': str(message)}, status)
+
+
+def admitted(spoolable=False):
+    """Passa a escrita pelo controle de admissão (api.admission) antes de ler o corpo (ver api.admitted)"""
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def wrapper(request):
+            try:
+                async with api.admission.slot_async(replicated=not (spoolable and api.spool_bypasses_replica_set())):
+                    return await endpoint(request)
+            except Overloaded as e:
+                response = error_response(e, e.status)
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+        return wrapper
+    return decorator
+
+
+def causal_session(request):
+    """Sessão causal do token da requisição (None sem token válido)"""
+    token = request_token(request.headers, request.cookies)
+    return start_causal_session(request.app.state.mongo.client, token) if token else None
+
+
+def with_causal_token(response, token):
+    response.headers[CAUSAL_HEADER] = token
+    response.set_cookie(CAUSAL_COOKIE, token, **cookie_options())
+    return response
+
+
+async def fetch_page_async(collection, query, limit, cursor, projection, session=None, max_time_ms=None):
+    options = {'session': session} if session is not None else {}
+    find = collection.find(after_cursor(query, cursor), projection, **options).sort(LISTING_SORT).limit(limit + 1)
+    if max_time_ms:
+        find = find.max_time_ms(max_time_ms)
+    return split_page(await find.to_list(length=limit + 1), limit)
+
+
+async def fetch_neighbors_async(collection, anchor, count, query, projection, session=None, max_time_ms=None):
+    """Versão assíncrona de pagination.fetch_neighbors"""
+    options = {'session': session} if session is not None else {}
+    results = []
+    for where, sort in neighbor_queries(query, anchor):
+        find = collection.find(where, projection, **options).sort(sort).limit(count)
+        if max_time_ms:
+            find = find.max_time_ms(max_time_ms)
+        results.append(await find.to_list(length=count))
+    return tuple(results)
+
+
+async def load_listing_async(key, collection, query, limit, cursor, projection, session=None):
+    """Página serializada; a primeira página (sem token causal) usa o mesmo cache do api.py"""
+    async def load(primary=False):
+        photos, next_cursor = await api.read_router.read_async(
+            collection, 'listing', session,
+            lambda c, options: fetch_page_async(c, query, limit, cursor, projection, **options), primary
+        )
+        return [serialize_photo(p) for p in photos], next_cursor
+
+    if cursor or session is not None:
+        return await load()
+    fields = tuple(sorted(projection)) if projection else None
+    return await api.metadata_cache.get_or_load_async(key + (limit, fields), lambda: load(primary=True))
+
+
+async def aiter_grid_out(grid_out, start, end):
+    """Gera os bytes [start, end) do arquivo, um chunk do GridFS por vez"""
+    remaining = end - start
+    try:
+        await grid_out.seek(start)
+        while remaining > 0:
+            data = await grid_out.readchunk()
+            if not data:
+                break
+            if len(data) > remaining:
+                data = data[:remaining]
+            remaining -= len(data)
+            yield data
+    finally:
+        gridfs_bytes.inc(end - start - remaining, 'out')
+        await grid_out.close()
+
+
+# ============= ROTAS ASSÍNCRONAS =============
+
+async def list_photos(request):
+    """GET /api/photos (mesmos parâmetros do api.py, exceto skip)"""
+    mongo = request.app.state.mongo
+    session = causal_session(request)
+    try:
+        args = request.query_params
+        query = {}
+        if args.get('tag'):
+            query['tags'] = args['tag']
+        if args.get('user'):
+            query['user'] = args['user']
+        photos, next_cursor = await load_listing_async(
+            listing_key('photos', args.get('tag'), args.get('user')), mongo.collection, query,
+            parse_page_size(args.get('limit')), args.get('cursor'), parse_fields(args.get('fields')),
+            session
+        )
+        return json_response({
+            'success': True,
+            'count': len(photos),
+            'photos': photos,
+            'next_cursor': next_cursor
+        })
+    except (InvalidCursor, InvalidPageSize, InvalidFields) as e:
+        return error_response(e, 400)
+    except Exception as e:
+        return error_response(e, 500)
+    finally:
+        if session is not None:
+            await session.end_session()
+
+
+async def list_photos_by(request, field, key):
+    """GET /api/photos/user/<username> e /api/photos/tag/<tag>"""
+    mongo = request.app.state.mongo
+    value = request.path_params['value']
+    session = causal_session(request)
+    try:
+        args = request.query_params
+        photos, next_cursor = await load_listing_async(
+            listing_key(field, value), mongo.collection, {field: value},
+            parse_page_size(args.get('limit'), default=100), args.get('cursor'),
+            parse_fields(args.get('fields')), session
+        )
+        return json_response({
+            'success': True,
+            key: value,
+            'count': len(photos),
+            'photos': photos,
+            'next_cursor': next_cursor
+        })
+    except (InvalidCursor, InvalidPageSize, InvalidFields) as e:
+        return error_response(e, 400)
+    except Exception as e:
+        return error_response(e, 500)
+    finally:
+        if session is not None:
+            await session.end_session()
+
+
+def listing_by(field, key):
+    async def endpoint(request):
+        return await list_photos_by(request, field, key)
+    return endpoint
+
+
+async def get_photo(request):
+    mongo = request.app.state.mongo
+    photo_id = request.path_params['photo_id']
+    session = causal_session(request)
+    try:
+        projection = parse_fields(request.query_params.get('fields'), default=None)
+
+        async def load(primary=False):
+            photo = await api.read_router.find_one_async(mongo.collection, 'detail',
+                                                         {'_id': ObjectId(photo_id)}, projection, session, primary)
+            return serialize_photo(photo) if photo else None
+
+        if projection is FULL_DOCUMENT and session is None:
+            photo = await api.metadata_cache.get_or_load_async(photo_key(photo_id), lambda: load(primary=True))
+        else:
+            photo = await load()
+        if not photo:
+            return error_response('Foto não encontrada', 404)
+        return json_response({'success': True, 'photo': photo})
+    except Exception as e:
+        return error_response(e, 400)
+    finally:
+        if session is not None:
+            await session.end_session()
+
+
+async def get_photos_batch(request):
+    """GET /api/photos/batch?ids= (ver api.get_photos_batch)"""
+    mongo = request.app.state.mongo
+    session = causal_session(request)
+    try:
+        ids = parse_ids(request.query_params.get('ids'))
+        projection = parse_fields(request.query_params.get('fields'))
+        docs = await api.read_router.find_ids_async(mongo.collection, 'detail', ids, projection, session)
+        by_id = {doc['_id']: doc for doc in docs}
+        photos = [serialize_photo(by_id[photo_id]) for photo_id in ids if photo_id in by_id]
+        return json_response({
+            'success': True,
+            'count': len(photos),
+            'photos': photos,
+            'missing': [str(photo_id) for photo_id in ids if photo_id not in by_id]
+        })
+    except (InvalidIds, InvalidFields) as e:
+        return error_response(e, 400)
+    except Exception as e:
+        return error_response(e, 500)
+    finally:
+        if session is not None:
+            await session.end_session()
+
+
+async def get_photo_neighbors(request):
+    """GET /api/photos/<id>/neighbors?n= (ver api.get_photo_neighbors)"""
+    mongo = request.app.state.mongo
+    session = causal_session(request)
+    try:
+        args = request.query_params
+        count = parse_neighbor_count(args.get('n'))
+        projection = parse_fields(args.get('fields'))
+        query = {}
+        if args.get('tag'):
+            query['tags'] = args['tag']
+        if args.get('user'):
+            query['user'] = args['user']
+        photo = await api.read_router.find_one_async(
+            mongo.collection, 'detail', {'_id': ObjectId(request.path_params['photo_id'])}, projection, session
+        )
+        if not photo:
+            return error_response('Foto não encontrada', 404)
+        previous, following = await api.read_router.read_async(
+            mongo.collection, 'listing', session,
+            lambda c, options: fetch_neighbors_async(c, photo, count, query, projection, **options)
+        )
+        return json_response({
+            'success': True,
+            'photo': serialize_photo(photo),
+            'previous': [serialize_photo(p) for p in previous],
+            'next': [serialize_photo(p) for p in following]
+        })
+    except (InvalidId, InvalidFields, ValueError) as e:
+        return error_response(e, 400)
+    except Exception as e:
+        return error_response(e, 500)
+    finally:
+        if session is not None:
+            await session.end_session()
+
+
+def local_file_response(request, photo):
+    """Foto guardada em disco: FileResponse (pathsend/sendfile no servidor) com os cabeçalhos do plano"""
+    try:
+        stored_file = api.blob_stores['fs'].describe(photo['storage_path'], photo)
+    except FileNotFoundError:
+        return error_response('Arquivo não encontrado', 404)
+    return disk_file_response(request, stored_file)
+
+
+def disk_file_response(request, stored_file):
+    status, _, _, headers = plan_file_response(request.headers, stored_file)
+    if status in (304, 416):
+        return Response(status_code=status, headers=headers)
+    # O FileResponse aplica o Range por conta própria (com a mesma ETag do plano)
+    headers = {k: v for k, v in headers.items() if k not in ('Content-Length', 'Content-Range')}
+    return FileResponse(stored_file.path, headers=headers, media_type=grid_content_type(stored_file))
+
+
+async def thumbnail_response(request, photo, width):
+    """Miniatura mais próxima de `width` (ver api.thumbnail_response); None envia o original.
+
+    Usa o Thumbnailer síncrono do api.py numa thread: a busca do derivado é
+    rápida e a geração sob demanda roda no pool de processos.
+    """
+    thumbnailer = api.thumbnailer
+    if not thumbnailer.enabled or 'sha256' not in photo:
+        return None
+    try:
+        derivative = await asyncio.to_thread(thumbnailer.derivative, photo['sha256'], *locate(photo),
+                                             pick_width(width), pick_format(request.headers.get('accept')))
+    except Exception:
+        return None
+    if isinstance(derivative, StoredFile):
+        response = disk_file_response(request, derivative)
+    else:
+        status, start, end, headers = plan_file_response(request.headers, derivative)
+        if status in (304, 416):
+            derivative.close()
+            response = Response(status_code=status, headers=headers)
+        else:
+            # GridOut síncrono: o StreamingResponse itera no threadpool
+            response = StreamingResponse(api.iter_grid_out(derivative, start, end), status_code=status,
+                                         media_type=grid_content_type(derivative), headers=headers)
+    response.headers['Vary'] = 'Accept'
+    return response
+
+
+async def get_photo_file(request):
+    """Download em streaming com Range, ETag e 304 (?w= devolve a miniatura)"""
+    mongo = request.app.state.mongo
+    try:
+        width = parse_width(request.query_params.get('w'))
+    except InvalidWidth as e:
+        return error_response(e, 400)
+    # A sessão causal vale para a leitura do documento; os bytes de quem tem token vêm do PRIMARY
+    session = causal_session(request)
+    try:
+        photo = await api.read_router.find_one_async(
+            mongo.collection, 'file', {'_id': ObjectId(request.path_params['photo_id'])}, api.FILE_PROJECTION,
+            session
+        )
+        if not photo or not any(field in photo for field in STORE_FIELDS.values()):
+            return error_response('Foto não encontrada', 404)
+        if width:
+            response = await thumbnail_response(request, photo, width)
+            if response is not None:
+                return response
+        if 'storage_path' in photo:
+            return local_file_response(request, photo)
+        # Como em api.open_grid_file: o GridFS não aceita max_time_ms, então a leitura causal vai ao PRIMARY
+        try:
+            if session is not None or api.read_router.reads_primary('file'):
+                grid_out = await mongo.bucket.open_download_stream(photo['gridfs_id'])
+            else:
+                try:
+                    grid_out = await mongo.read_bucket.open_download_stream(photo['gridfs_id'])
+                except NoFile:
+                    grid_out = await mongo.bucket.open_download_stream(photo['gridfs_id'])
+        except NoFile:
+            return error_response('Arquivo não encontrado no GridFS', 404)
+
+        status, start, end, headers = plan_file_response(request.headers, grid_out)
+        if status in (304, 416):
+            await grid_out.close()
+            return Response(status_code=status, headers=headers)
+        stream = aiter_grid_out(grid_out, start, end)
+        return StreamingResponse(stream, status_code=status,
+                                 media_type=grid_content_type(grid_out), headers=headers)
+    except InvalidId as e:
+        return error_response(e, 400)
+    except Exception as e:
+        return error_response(e, 500)
+    finally:
+        if session is not None:
+            await session.end_session()
+
+
+async def delete_blobs(mongo, locations):
+    for store, file_id in locations:
+        await mongo.stores[store].delete_async(file_id)
+
+
+async def commit_upload(mongo, photo_doc, stored, upload):
+    """Commit transacional da foto (ver api.commit_uploads); devolve o token causal"""
+    for attempt in range(2):
+        try:
+            async with mongo.client.start_session(causal_consistency=True) as session:
+                with api.admission.timed():
+                    surplus = await commit_photos_async(session, mongo.collection, mongo.blobs,
+                                                        [(photo_doc, stored)], mongo.stats)
+                token = encode_token(session)
+            await delete_blobs(mongo, surplus)
+            return token
+        except BlobGone:
+            if attempt:
+                raise
+            # O blob reaproveitado sumiu antes do commit: regrava o conteúdo
+            await upload.seek(0)
+            stored = await store_deduplicated_async(mongo.store, mongo.blobs, upload, upload.filename,
+                                                    declared_type=upload.content_type)
+
+
+@admitted(spoolable=True)
+async def upload_photo(request):
+    """Upload sem prender o worker: o request.form() do Starlette (python-multipart) grava o arquivo
+    num temporário (SpooledTemporaryFile, em disco acima de 1 MB), que depois é copiado em blocos
+    para o backend de BLOB_STORE"""
+    mongo = request.app.state.mongo
+    content_length = int(request.headers.get('content-length') or 0)
+    if content_length > MAX_UPLOAD_BYTES + 64 * 1024:
+        return error_response(f'Arquivo excede o limite de {MAX_UPLOAD_BYTES} bytes', 413)
+    try:
+        async with request.form() as form:
+            file = form.get('file')
+            if file is None or isinstance(file, str):
+                return error_response('Nenhum arquivo enviado', 400)
+            if not file.filename:
+                return error_response('Nome do arquivo vazio', 400)
+
+            user, description, tags = api.parse_photo_form(form)
+            try:
+                if api.ingest_spool is None:
+                    stored = await store_deduplicated_async(mongo.store, mongo.blobs, file, file.filename,
+                                                            declared_type=file.content_type)
+                else:
+                    # Modo spool: os bytes são gravados sem consultar os blobs (ver api.upload_photo)
+                    stored = dict(await mongo.store.write_async(file, file.filename,
+                                                                declared_type=file.content_type),
+                                  deduplicated=False)
+            except UploadTooLarge as e:
+                return error_response(e, 413)
+
+            if not stored['deduplicated']:
+                gridfs_bytes.inc(stored['length'], 'in')
+            photo_doc = api.build_photo_doc(file.filename, user, description, tags, stored)
+
+            if api.ingest_spool is not None:
+                try:
+                    await asyncio.to_thread(api.spool_photo, photo_doc, stored)
+                except SpoolFull as e:
+                    response = error_response(e, 503)
+                    response.headers['Retry-After'] = str(SPOOL_FULL_RETRY_AFTER)
+                    return response
+                return json_response({
+                    'success': True,
+                    'data': dict(api.uploaded_photo_summary(photo_doc, stored), status='queued'),
+                    'message': 'Foto recebida; ela aparece na galeria em instantes'
+                }, 202)
+
+            token = await commit_upload(mongo, photo_doc, stored, file)
+            invalidate_photo(api.metadata_cache, photo_doc['_id'])
+            api.tag_index.apply(photo_doc)
+            if not stored['deduplicated']:
+                api.enqueue_thumbnails([photo_doc])
+
+            return with_causal_token(json_response({
+                'success': True,
+                'data': api.uploaded_photo_summary(photo_doc, stored),
+                'message': 'Foto enviada com sucesso!'
+            }, 201), token)
+    except Exception as e:
+        return error_response(e, 500)
+
+
+@admitted()
+async def delete_photo(request):
+    mongo = request.app.state.mongo
+    photo_id = request.path_params['photo_id']
+    try:
+        async with mongo.client.start_session(causal_consistency=True) as session:
+            with api.admission.timed():
+                photo, released = await remove_photo_async(session, mongo.collection, mongo.blobs,
+                                                            {'_id': ObjectId(photo_id)}, mongo.stats)
+            token = encode_token(session)
+        if not photo:
+            return error_response('Foto não encontrada', 404)
+
+        invalidate_photo(api.metadata_cache, photo_id)
+        api.tag_index.apply(photo, -1)
+
+        if released:
+            await delete_blobs(mongo, [released])
+            if 'sha256' in photo:
+                await asyncio.to_thread(api.thumbnailer.discard, photo['sha256'], released[0])
+        return with_causal_token(json_response({'success': True, 'message': 'Foto removida com sucesso'}), token)
+    except Exception as e:
+        return error_response(e, 500)
+
+
+async def static_asset(request):
+    """Arquivos com hash do frontend/dist, servidos direto pelo ASGI (FileResponse usa
+    http.response.pathsend quando o servidor suporta)"""
+    path = 'static/' + request.path_params['path']
+    plan = api.static_store.plan(path, request.headers.get('accept-encoding'), request.headers.get('if-none-match'))
+    if plan is None:
+        return json_response({'success': False, 'error': 'Arquivo não encontrado'}, 404)
+    status, file_path, headers = plan
+    media_type = headers.pop('Content-Type')
+    if status == 304:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(file_path, headers=headers, media_type=media_type)
+
+
+class MetricsMiddleware:
+    """Mede as rotas assíncronas; as rotas do Flask montadas via WSGI são medidas pelo próprio Flask"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            if isinstance(route, Route):
+                seconds = time.perf_counter() - started
+                observe_request(route.path, scope['method'], status[0], seconds)
+                log_request(route.path, scope['method'], status[0], seconds)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Executado em cada worker, depois do fork. Cache, índice de tags, miniaturas, spool e
+    # topologia são estado do processo e rodam em todos; a limpeza de órfãos varre o banco
+    # e só roda no worker que tem o lease (leases.py)
+    app.state.mongo = AsyncMongo()
+    api.ensure_indexes()
+    api.start_cache_invalidator()
+    api.start_orphan_sweeper()
+    api.start_thumbnailer()
+    api.start_ingest_spool()
+    api.start_tag_index()
+    api.topology_monitor.start(api.client)
+    try:
+        yield
+    finally:
+        await app.state.mongo.close()
+
+
+routes = [
+    Route('/api/photos', list_photos, methods=['GET']),
+    Route('/api/photos', upload_photo, methods=['POST']),
+    Route('/api/photos/user/{value}', listing_by('user', 'user'), methods=['GET']),
+    Route('/api/photos/tag/{value}', listing_by('tags', 'tag'), methods=['GET']),
+    Route('/api/photos/batch', get_photos_batch, methods=['GET']),
+    Route('/api/photos/{photo_id}/file', get_photo_file, methods=['GET']),
+    Route('/api/photos/{photo_id}/neighbors', get_photo_neighbors, methods=['GET']),
+    Route('/api/photos/{photo_id}', get_photo, methods=['GET']),
+    Route('/api/photos/{photo_id}', delete_photo, methods=['DELETE']),
+    Route('/static/{path:path}', static_asset, methods=['GET', 'HEAD']),
+    # Demais rotas (stats, busca, health, páginas HTML...) continuam no Flask
+    Mount('/', app=WSGIMiddleware(api.app)),
+]
+
+app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    middleware=[Middleware(MetricsMiddleware),
+                Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                           expose_headers=[CAUSAL_HEADER])]
+)
@@ -0,0 +1,36 @@
+"""
+Upload de vários arquivos numa única requisição (POST /api/photos/batch)
+
+Os blobs são gravados (GridFS ou disco) em paralelo por um pool de threads limitado
+e os metadados de todas as fotos vão num único commit transacional
+(photo_commit.commit_photos), então um álbum inteiro espera uma confirmação
+majority em vez de duas por foto.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from dedup import store_deduplicated
+
+# Gravações simultâneas no GridFS por requisição
+BATCH_UPLOAD_WORKERS = int(os.environ.get('BATCH_UPLOAD_WORKERS', 4))
+# Máximo de arquivos aceitos numa requisição
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 500))
+
+
+def store_files(store, blobs, files, workers=BATCH_UPLOAD_WORKERS):
+    """Grava os arquivos no `store` (GridFS ou disco) em paralelo.
+
+    Retorna uma lista, na ordem de `files`, com o dict de store_deduplicated
+    ou a exceção que impediu a gravação daquele arquivo.
+    """
+    def store_one(file):
+        try:
+            return store_deduplicated(store, blobs, file.stream, file.filename,
+                                      declared_type=file.mimetype)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(files)))) as pool:
+        return list(pool.map(store_one, files))
+
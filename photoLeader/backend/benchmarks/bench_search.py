@@ -0,0 +1,88 @@
+"""Benchmark da busca: $regex sem âncora x índice de trigramas.
+
+Uso:
+  python backend/benchmarks/bench_search.py --uri MONGO_URI [--docs 1000000] [--queries praia "pôr do sol"]
+
+Popula a collection `bench_search` (banco `uploadDB_bench`) com N documentos
+sintéticos, cria o índice de trigramas e mede, para cada consulta, a
+latência da busca antiga (regex) e da nova, com docs examinados via explain.
+Rode com tamanhos diferentes (--docs 10000, 100000, 1000000) para ver a
+latência da busca indexada ficar estável enquanto a do regex cresce.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_index  # noqa: E402
+from pagination import LISTING_SORT  # noqa: E402
+
+WORDS = ['praia', 'montanha', 'cidade', 'noite', 'festa', 'familia', 'viagem', 'cachorro',
+         'gato', 'flor', 'chuva', 'neve', 'por do sol', 'retrato', 'paisagem', 'ponte']
+
+
+def seed(coll, count, batch_size=10000):
+    coll.drop()
+    base = datetime(2025, 1, 1)
+    batch = []
+    for i in range(count):
+        doc = {
+            'filename': f'IMG_{i:08d}.jpg',
+            'description': ' '.join(random.sample(WORDS, k=3)) + f' {random.randint(0, 99999)}',
+            'user': f'user_{i % 1000}',
+            'upload_date': base + timedelta(seconds=i)
+        }
+        doc['search_grams'] = search_index.document_grams(doc)
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            coll.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        coll.insert_many(batch, ordered=False)
+    for keys in search_index.SEARCH_INDEXES:
+        coll.create_index(keys)
+
+
+def run(coll, query, limit, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(coll.find(query).sort(LISTING_SORT).limit(limit))
+        timings.append((time.perf_counter() - start) * 1000)
+    stats = coll.find(query).sort(LISTING_SORT).limit(limit).explain()['executionStats']
+    return min(timings), stats['totalDocsExamined']
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--uri', type=str, required=True, help='MongoDB URI')
+    parser.add_argument('--docs', type=int, default=1_000_000)
+    parser.add_argument('--queries', nargs='+', default=['praia', 'por do sol', 'IMG_0000', 'gat'])
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-seed', action='store_true', help='Reutiliza os dados já populados')
+    args = parser.parse_args()
+
+    coll = MongoClient(args.uri)['uploadDB_bench']['bench_search']
+    if not args.skip_seed:
+        print(f'Populando {args.docs} documentos...')
+        seed(coll, args.docs)
+
+    print(f"{'consulta':>12} {'regex (ms)':>12} {'docs':>9} {'trigramas (ms)':>15} {'docs':>9}")
+    for text in args.queries:
+        regex = {'$or': [{'filename': {'$regex': text, '$options': 'i'}},
+                         {'description': {'$regex': text, '$options': 'i'}}]}
+        regex_ms, regex_docs = run(coll, regex, args.limit, args.repeat)
+        gram_ms, gram_docs = run(coll, search_index.search_query(text), args.limit, args.repeat)
+        print(f'{text:>12} {regex_ms:>12.2f} {regex_docs:>9} {gram_ms:>15.2f} {gram_docs:>9}')
+
+
+if __name__ == '__main__':
+    main()
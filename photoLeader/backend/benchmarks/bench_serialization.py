@@ -0,0 +1,98 @@
+"""Benchmark da serialização das listagens de fotos (antes x depois).
+
+Uso:
+  python backend/benchmarks/bench_serialization.py [--sizes 1000 5000 10000] [--repeat 5]
+
+Compara, para N documentos sintéticos:
+  - antes: serialize_doc mutando cada documento + loop do photo_url + flask.jsonify
+  - depois: serialize_photo em passada única + json_response (orjson se instalado)
+  - depois + card: o mesmo, com os documentos já reduzidos pela projeção "card"
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serialization  # noqa: E402
+
+
+def make_docs(count):
+    base = datetime(2025, 10, 28, 10, 0, 0)
+    tags = ['natureza', 'pessoa', 'urbano', 'evento', 'paisagem', 'macro']
+    return [{
+        '_id': ObjectId(),
+        'gridfs_id': ObjectId(),
+        'filename': f'image_{i}.jpg',
+        'user': f'user_{i % 50}',
+        'description': 'Foto de teste gerada pelo benchmark',
+        'tags': random.sample(tags, k=2),
+        'upload_date': base + timedelta(seconds=i),
+        'size_kb': 2450.5,
+        'content_type': 'image/jpeg',
+        'sha256': '0' * 64,
+        'status': 'uploaded'
+    } for i in range(count)]
+
+
+def legacy_serialize_doc(doc):
+    if doc:
+        if '_id' in doc:
+            doc['_id'] = str(doc['_id'])
+        if 'gridfs_id' in doc and isinstance(doc['gridfs_id'], ObjectId):
+            doc['gridfs_id'] = str(doc['gridfs_id'])
+    return doc
+
+
+def before(docs):
+    photos = [legacy_serialize_doc(dict(d)) for d in docs]
+    for photo in photos:
+        if 'gridfs_id' in photo:
+            photo['photo_url'] = f"/api/photos/{photo['_id']}/file"
+    return jsonify({'success': True, 'count': len(photos), 'photos': photos}).get_data()
+
+
+def after(docs):
+    photos = [serialization.serialize_photo(d) for d in docs]
+    return serialization.json_response({'success': True, 'count': len(photos), 'photos': photos}).get_data()
+
+
+def best_of(fn, docs, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    card = set(serialization.parse_fields(None)) | {'_id'}
+    backend = 'orjson' if serialization.orjson is not None else 'json'
+    print(f'Encoder JSON: {backend}')
+    print(f"{'docs':>8} {'antes (ms)':>12} {'depois (ms)':>12} {'depois+card (ms)':>17}")
+
+    app = Flask(__name__)
+    with app.app_context():
+        for size in args.sizes:
+            docs = make_docs(size)
+            card_docs = [{k: v for k, v in d.items() if k in card} for d in docs]
+            print(f'{size:>8} {best_of(before, docs, args.repeat):>12.2f} '
+                  f'{best_of(after, docs, args.repeat):>12.2f} '
+                  f'{best_of(after, card_docs, args.repeat):>17.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark do índice de tags em memória (tag_index.py).
+
+Uso:
+  python backend/benchmarks/bench_tag_index.py [--tags 1000000] [--photos 2000000] [--users 1000]
+
+Gera fotos sintéticas com `--tags` tags distintas (distribuição de Zipf, como
+tags reais), constrói o índice e imprime, em JSON, o tempo de construção, a
+memória estimada e as latências p50/p99 de suggest (prefixos de 1 a 4
+letras, com e sem top em cache), facets e apply.
+"""
+
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tag_index import TagIndex  # noqa: E402
+
+
+def synthetic_tags(count, rng):
+    tags = set()
+    while len(tags) < count:
+        tags.add(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 12))))
+    return sorted(tags, key=lambda _: rng.random())
+
+
+def synthetic_photos(tags, photos, users, rng):
+    # Zipf aproximado: o peso da tag de posição i é 1/(i+1); toda tag aparece ao menos uma vez
+    weights = [1 / (i + 1) for i in range(len(tags))]
+    extra = rng.choices(tags, weights=weights, k=max(0, photos - len(tags)))
+    for i, tag in enumerate(tags + extra):
+        yield {'user': f'user_{i % users}', 'tags': [tag]}
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        'p50_us': round(samples[len(samples) // 2] * 1e6, 1),
+        'p99_us': round(samples[int(len(samples) * 0.99)] * 1e6, 1),
+        'max_us': round(samples[-1] * 1e6, 1)
+    }
+
+
+def timed(fn, args_list):
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do índice de tags em memória')
+    parser.add_argument('--tags', type=int, default=1000000)
+    parser.add_argument('--photos', type=int, default=None, help='Padrão: 2x --tags')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tags = synthetic_tags(args.tags, rng)
+    index = TagIndex()
+
+    started = time.perf_counter()
+    index.rebuild(synthetic_photos(tags, args.photos or 2 * args.tags, args.users, rng))
+    build_seconds = time.perf_counter() - started
+
+    prefixes = {n: [(''.join(rng.choices(string.ascii_lowercase, k=n)),) for _ in range(args.queries)]
+                for n in (1, 2, 3, 4)}
+    report = {
+        'tags': index.stats()['tags'],
+        'build_seconds': round(build_seconds, 2),
+        'memory_mb': round(index.memory_bytes() / 1024 / 1024, 1),
+        # Primeira passada: prefixos curtos calculam e guardam o top; a segunda já vem do cache
+        'suggest_cold': {n: timed(index.suggest, p) for n, p in prefixes.items()},
+        'suggest': {n: timed(index.suggest, p) for n, p in prefixes.items()},
+        'suggest_user': timed(lambda p: index.suggest(p, user='user_7'), prefixes[1]),
+        'facets_user': timed(index.facets, [(f'user_{rng.randrange(args.users)}',) for _ in range(args.queries)]),
+        'apply': timed(index.apply, [({'user': 'user_1', 'tags': [rng.choice(tags)]}, 1)
+                                     for _ in range(args.queries)]),
+    }
+    report['cached_prefixes'] = index.stats()['cached_prefixes']
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
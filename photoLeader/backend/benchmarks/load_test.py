@@ -0,0 +1,114 @@
+"""Teste de carga do modo ASGI: vazão x número de workers.
+
+Uso:
+  python backend/benchmarks/load_test.py [--workers 1 2 4 8] [--concurrency 64]
+                                         [--duration 15] [--path /api/photos?limit=20]
+
+Para cada quantidade de workers, sobe `uvicorn asgi:app --workers N` numa
+porta livre, dispara requisições com `concurrency` clientes simultâneos
+durante `duration` segundos e imprime requisições/s, latências p50/p99 e
+erros. O MongoDB usado é o da variável MONGO_URI (mesma do api.py).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, port):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning', '--no-access-log'],
+        cwd=BACKEND_DIR
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/api/cache/stats', timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.3)
+    process.terminate()
+    raise RuntimeError(f'Servidor com {workers} workers não respondeu')
+
+
+async def run_load(url, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies, errors
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--path', type=str, default='/api/photos?limit=20')
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        port = free_port()
+        process = start_server(workers, port)
+        try:
+            latencies, errors = asyncio.run(
+                run_load(f'http://127.0.0.1:{port}{args.path}', args.concurrency, args.duration)
+            )
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        result = {
+            'workers': workers,
+            'requests': len(latencies),
+            'rps': round(len(latencies) / args.duration, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'errors': errors
+        }
+        results.append(result)
+        print(json.dumps(result))
+
+    print(json.dumps({'path': args.path, 'concurrency': args.concurrency, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
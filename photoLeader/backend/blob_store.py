@@ -0,0 +1,311 @@
+"""
+Armazenamento dos bytes das fotos: GridFS ou sistema de arquivos local
+
+BLOB_STORE escolhe onde os uploads novos são gravados:
+
+- gridfs (padrão): chunks no próprio replica set;
+- fs: arquivos em BLOB_DIR, num diretório fragmentado pelo hash
+  (`ab/cd/<sha256>-<ObjectId>`), e o MongoDB guarda só os metadados.
+
+O documento da foto (e o do blob, ver dedup.py) diz onde estão os bytes:
+`gridfs_id` para o GridFS ou `storage_path` para o sistema de arquivos.
+Leituras e remoções seguem o campo presente, então os dois backends
+convivem durante a migração (migrate_blobs.py).
+
+A gravação no sistema de arquivos é atômica: o conteúdo vai para um
+arquivo temporário em BLOB_DIR/tmp, recebe fsync e só então é renomeado
+para o caminho final. Downloads saem direto do arquivo (sendfile via
+wsgi.file_wrapper, X-Sendfile ou FileResponse no modo ASGI), sem passar
+pelo replica set.
+
+Os derivados de cada conteúdo (miniaturas, ver thumbnails.py) ficam no
+mesmo backend do original: no bucket GridFS `thumbs` ou em
+BLOB_DIR/thumbs, endereçados por `<sha256>/<nome>`.
+"""
+
+import asyncio
+import mimetypes
+import os
+from datetime import datetime, timezone
+
+import gridfs
+from bson import ObjectId
+from gridfs.errors import NoFile
+from pymongo import MongoClient
+
+from upload_stream import (MAX_UPLOAD_BYTES, UPLOAD_BLOCK_SIZE, stream_to_file, stream_to_gridfs,
+                           stream_to_gridfs_async)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BLOB_STORE = os.environ.get('BLOB_STORE', 'gridfs')
+BLOB_DIR = os.environ.get('BLOB_DIR', os.path.join(BACKEND_DIR, 'blobs'))
+
+# Campo do documento que guarda a localização dos bytes em cada backend
+STORE_FIELDS = {'gridfs': 'gridfs_id', 'fs': 'storage_path'}
+
+TMP_DIR = 'tmp'
+THUMBS_DIR = 'thumbs'
+
+# Buckets dos GridFSReader, um MongoClient por processo
+_READER_BUCKETS = {}
+
+
+def locate(doc):
+    """(backend, id do arquivo) de uma foto ou blob; (None, None) se não houver"""
+    for name, field in STORE_FIELDS.items():
+        if doc.get(field) is not None:
+            return name, doc[field]
+    return None, None
+
+
+def location(store_name, file_id):
+    """Campos do documento para um arquivo do backend `store_name`"""
+    return {STORE_FIELDS[store_name]: file_id}
+
+
+class StoredFile:
+    """Dados de um arquivo local no formato esperado por file_response.plan_file_response"""
+
+    md5 = None
+
+    def __init__(self, path, key, filename, content_type, upload_date):
+        self.path = path
+        self._id = key
+        self.length = os.stat(path).st_size
+        self.filename = filename
+        self.upload_date = upload_date
+        self.metadata = {'contentType': content_type}
+
+
+class GridFSStore:
+    """Backend GridFS (API síncrona); `bucket` e `derivative_bucket` são funções que devolvem o GridFSBucket"""
+
+    name = 'gridfs'
+
+    def __init__(self, bucket, derivative_bucket=None):
+        self._bucket = bucket
+        self._derivative_bucket = derivative_bucket
+
+    def write(self, stream, filename, declared_type=None):
+        stored = stream_to_gridfs(self._bucket(), stream, filename, declared_type=declared_type)
+        return dict(stored, store=self.name)
+
+    def open(self, file_id):
+        return self._bucket().open_download_stream(file_id)
+
+    def existing(self, file_ids):
+        """Quais dos `file_ids` ainda têm fs.files (uma consulta só)"""
+        return {grid_out._id for grid_out in self._bucket().find({'_id': {'$in': list(file_ids)}})}
+
+    def delete(self, file_id):
+        try:
+            self._bucket().delete(file_id)
+        except NoFile:
+            pass
+
+    def write_derivative(self, sha256, name, data, content_type):
+        self._derivative_bucket().upload_from_stream(f'{sha256}/{name}', data,
+                                                     metadata={'contentType': content_type})
+
+    def open_derivative(self, sha256, name):
+        """GridOut do derivado, ou None se ainda não foi gerado"""
+        try:
+            return self._derivative_bucket().open_download_stream_by_name(f'{sha256}/{name}')
+        except NoFile:
+            return None
+
+    def delete_derivatives(self, sha256):
+        bucket = self._derivative_bucket()
+        for grid_out in bucket.find({'filename': {'$regex': f'^{sha256}/'}}):
+            try:
+                bucket.delete(grid_out._id)
+            except NoFile:
+                pass
+
+
+class GridFSReader:
+    """Leitura do GridFS nos processos do pool de miniaturas (thumbnails.py).
+
+    Atravessa o spawn por pickle só com a URI; o MongoClient é criado no
+    processo que lê, uma vez, porque o do processo principal não pode ser
+    enviado.
+    """
+
+    def __init__(self, uri, db_name, bucket_name='fs'):
+        self.uri = uri
+        self.db_name = db_name
+        self.bucket_name = bucket_name
+
+    def open(self, file_id):
+        key = (self.uri, self.db_name, self.bucket_name)
+        bucket = _READER_BUCKETS.get(key)
+        if bucket is None:
+            client = MongoClient(self.uri, serverSelectionTimeoutMS=5000)
+            bucket = _READER_BUCKETS[key] = gridfs.GridFSBucket(client[self.db_name], self.bucket_name)
+        return bucket.open_download_stream(file_id)
+
+
+class AsyncGridFSStore:
+    """Backend GridFS para o modo ASGI (AsyncGridFSBucket)"""
+
+    name = 'gridfs'
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    async def write_async(self, upload, filename, declared_type=None):
+        stored = await stream_to_gridfs_async(self.bucket, upload, filename, declared_type=declared_type)
+        return dict(stored, store=self.name)
+
+    async def delete_async(self, file_id):
+        try:
+            await self.bucket.delete(file_id)
+        except NoFile:
+            pass
+
+
+class FileSystemStore:
+    """Backend em disco: um arquivo por gravação, renomeado para o lugar só depois de completo"""
+
+    name = 'fs'
+
+    def __init__(self, root=BLOB_DIR, fsync=True):
+        self.root = os.path.abspath(root)
+        self.fsync = fsync
+
+    def path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Caminho de blob inválido: {key}")
+        return path
+
+    def write(self, stream, filename, declared_type=None, max_bytes=MAX_UPLOAD_BYTES,
+              block_size=UPLOAD_BLOCK_SIZE):
+        """Grava `stream` e devolve o mesmo dict de stream_to_gridfs (file_id = storage_path)"""
+        file_oid = ObjectId()
+        stored = {}
+
+        def write(out):
+            stored.update(stream_to_file(stream, out, max_bytes, block_size, declared_type))
+            sha256 = stored['sha256']
+            # O ObjectId no nome torna cada gravação única (a remoção de um blob
+            # nunca apaga o arquivo de outro upload do mesmo conteúdo) e dá a idade
+            # usada pela limpeza de órfãos
+            return f'{sha256[:2]}/{sha256[2:4]}/{sha256}-{file_oid}'
+
+        key = self._write_atomic(file_oid, write)
+        return dict(stored, file_id=key, store=self.name)
+
+    def _write_atomic(self, file_oid, write):
+        """Grava num temporário com `write(out)` (que devolve a chave final), fsync e rename"""
+        tmp_dir = os.path.join(self.root, TMP_DIR)
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, f'{file_oid}.part')
+        try:
+            with open(tmp_path, 'wb') as out:
+                key = write(out)
+                if self.fsync:
+                    out.flush()
+                    os.fsync(out.fileno())
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return key
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def existing(self, keys):
+        """Quais das `keys` ainda estão no disco"""
+        return {key for key in keys if os.path.exists(self.path(key))}
+
+    def describe(self, key, photo):
+        """StoredFile com nome, tipo e data vindos do documento da foto"""
+        return StoredFile(self.path(key), key, photo.get('filename', os.path.basename(key)),
+                          photo.get('content_type'), photo.get('upload_date'))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _derivative_key(self, sha256, name):
+        return f'{THUMBS_DIR}/{sha256[:2]}/{sha256}/{name}'
+
+    def write_derivative(self, sha256, name, data, content_type=None):
+        key = self._derivative_key(sha256, name)
+
+        def write(out):
+            out.write(data)
+            return key
+
+        self._write_atomic(ObjectId(), write)
+
+    def open_derivative(self, sha256, name):
+        """StoredFile do derivado, ou None se ainda não foi gerado"""
+        key = self._derivative_key(sha256, name)
+        path = self.path(key)
+        try:
+            modified = datetime.fromtimestamp(os.stat(path).st_mtime, timezone.utc)
+            return StoredFile(path, key, name, mimetypes.guess_type(name)[0], modified.replace(tzinfo=None))
+        except FileNotFoundError:
+            return None
+
+    def delete_derivatives(self, sha256):
+        directory = os.path.dirname(self.path(self._derivative_key(sha256, 'x')))
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+    async def write_async(self, upload, filename, declared_type=None):
+        """Grava um UploadFile do Starlette numa thread (E/S de disco bloqueante)"""
+        return await asyncio.to_thread(self.write, upload.file, filename, declared_type)
+
+    async def delete_async(self, key):
+        await asyncio.to_thread(self.delete, key)
+
+    def old_keys(self, cutoff):
+        """Gera as chaves de arquivos criados antes de `cutoff` (ObjectId) e remove temporários antigos"""
+        tmp_dir = os.path.join(self.root, TMP_DIR)
+        if os.path.isdir(tmp_dir):
+            for entry in os.scandir(tmp_dir):
+                if entry.stat().st_mtime < cutoff.generation_time.timestamp():
+                    os.remove(entry.path)
+        for directory, dirs, files in os.walk(self.root):
+            if directory == self.root:
+                dirs[:] = sorted(d for d in dirs if d not in (TMP_DIR, THUMBS_DIR))
+            for name in files:
+                _, _, oid = name.rpartition('-')
+                if ObjectId.is_valid(oid) and ObjectId(oid) < cutoff:
+                    yield os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+
+
+def iter_file_range(path, start, end, block_size=UPLOAD_BLOCK_SIZE):
+    """Gera os bytes [start, end) de um arquivo local em blocos"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            data = f.read(min(block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
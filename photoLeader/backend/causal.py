@@ -0,0 +1,127 @@
+"""
+Token de consistência causal (read-your-writes sem fixar leituras no PRIMARY)
+
+Depois de uma escrita (upload, upload em lote, delete) a API devolve o
+operationTime/clusterTime da sessão causal como token, no cabeçalho
+X-Causal-Token e no cookie `pl_causal` (o cookie cobre o <img src> da
+galeria, que não envia cabeçalhos). Leituras que trazem o token abrem uma
+sessão causal avançada até esse ponto: o driver envia
+readConcern.afterClusterTime e qualquer secondary atende assim que tiver
+replicado a escrita. Só quem escreveu espera a replicação; leituras sem
+token continuam como antes.
+
+O token é assinado com HMAC (CAUSAL_TOKEN_SECRET), então um cliente não
+consegue forjar um clusterTime no futuro. Com vários workers a variável
+precisa ser a mesma em todos: sem ela cada processo sortearia a sua e os
+tokens emitidos por outro worker seriam ignorados em silêncio, então com
+WEB_CONCURRENCY > 1 e sem CAUSAL_TOKEN_SECRET o import falha
+(MissingCausalSecret). Um processo só (desenvolvimento) sorteia a chave.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+import bson
+
+CAUSAL_HEADER = 'X-Causal-Token'
+CAUSAL_COOKIE = 'pl_causal'
+
+# Validade do token: depois disso a escrita já replicou em todos os membros saudáveis
+CAUSAL_TOKEN_TTL = int(os.environ.get('CAUSAL_TOKEN_TTL', 300))
+# Espera máxima (ms) de um secondary alcançar o token antes de ler do PRIMARY
+CAUSAL_WAIT_MS = int(os.environ.get('CAUSAL_WAIT_MS', 2000))
+
+
+
+class InvalidCausalToken(ValueError):
+    """Token causal malformado, com assinatura inválida ou expirado"""
+
+
+class MissingCausalSecret(ValueError):
+    """Vários workers sem CAUSAL_TOKEN_SECRET: cada um assinaria com uma chave diferente"""
+
+
+def load_secret(environ=os.environ):
+    """Chave HMAC dos tokens: CAUSAL_TOKEN_SECRET, ou uma aleatória quando há um worker só"""
+    secret = environ.get('CAUSAL_TOKEN_SECRET', '')
+    if secret:
+        return secret.encode()
+    workers = environ.get('WEB_CONCURRENCY') or '1'
+    if not workers.isdigit() or int(workers) > 1:
+        raise MissingCausalSecret(f'CAUSAL_TOKEN_SECRET é obrigatório com WEB_CONCURRENCY={workers}: '
+                                  'todos os workers precisam assinar os tokens causais com a mesma chave')
+    return os.urandom(32)
+
+
+_SECRET = load_secret()
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(payload, secret):
+    return hmac.new(secret, payload, hashlib.sha256).digest()[:16]
+
+
+def encode_token(session, secret=None, now=None):
+    """Token com o operationTime/clusterTime de uma sessão após a escrita"""
+    payload = bson.encode({
+        'op': session.operation_time,
+        'ct': session.cluster_time,
+        'at': int(now if now is not None else time.time())
+    })
+    return f'{_b64encode(payload)}.{_b64encode(_sign(payload, secret or _SECRET))}'
+
+
+def decode_token(token, secret=None, now=None):
+    """Retorna (operation_time, cluster_time) de um token válido"""
+    try:
+        payload_text, signature_text = token.split('.')
+        payload = _b64decode(payload_text)
+        signature = _b64decode(signature_text)
+    except (ValueError, TypeError):
+        raise InvalidCausalToken('Token causal malformado')
+    if not hmac.compare_digest(signature, _sign(payload, secret or _SECRET)):
+        raise InvalidCausalToken('Assinatura do token causal inválida')
+    data = bson.decode(payload)
+    if (now if now is not None else time.time()) - data['at'] > CAUSAL_TOKEN_TTL:
+        raise InvalidCausalToken('Token causal expirado')
+    return data['op'], data['ct']
+
+
+def request_token(headers, cookies):
+    """Token enviado pelo cliente (cabeçalho tem prioridade sobre o cookie)"""
+    return headers.get(CAUSAL_HEADER) or cookies.get(CAUSAL_COOKIE)
+
+
+def start_causal_session(client, token):
+    """Sessão causal avançada até o token, ou None se não houver token válido.
+
+    Funciona com MongoClient e AsyncMongoClient (start_session é síncrono em
+    ambos). Quem chama é responsável por encerrar a sessão.
+    """
+    if not token:
+        return None
+    try:
+        operation_time, cluster_time = decode_token(token)
+    except InvalidCausalToken:
+        return None
+    session = client.start_session(causal_consistency=True)
+    if cluster_time:
+        session.advance_cluster_time(cluster_time)
+    if operation_time:
+        session.advance_operation_time(operation_time)
+    return session
+
+
+def cookie_options():
+    """Parâmetros do cookie do token (mesmos no Flask e no Starlette)"""
+    return {'max_age': CAUSAL_TOKEN_TTL, 'path': '/api', 'httponly': True, 'samesite': 'lax'}
@@ -0,0 +1,147 @@
+"""Coleta de resultados dos geradores de carga (upload_sim / read_sim).
+
+LoadRecorder guarda a latência de cada operação (em ms), os erros por tipo
+e as operações concluídas em cada segundo do teste, e gera o relatório em
+JSON com p50/p95/p99/max, histograma e vazão ao longo do tempo.
+"""
+
+import math
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+
+# Limites superiores (ms) das faixas do histograma; a última faixa é "+Inf"
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+def percentile(sorted_values, pct):
+    """Percentil por posição (nearest-rank) de uma sequência já ordenada"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadRecorder:
+    """Acumula latências, erros e a linha do tempo de um teste de carga (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = array('d')
+        self._errors = Counter()
+        self._timeline = defaultdict(lambda: [0, 0])  # segundo -> [ok, erros]
+        self._ops = 0
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+
+    def record(self, latency_s, ops=1):
+        """Operação bem-sucedida; `ops` é o número de documentos/arquivos da requisição"""
+        second = int(time.perf_counter() - self.started_at)
+        with self._lock:
+            self._latencies.append(latency_s * 1000)
+            self._ops += ops
+            self._timeline[second][0] += 1
+
+    def record_error(self, error):
+        second = int(time.perf_counter() - self.started_at)
+        with self._lock:
+            self._errors[type(error).__name__] += 1
+            self._timeline[second][1] += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    def report(self, config=None):
+        """Relatório do teste como dict serializável em JSON"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            errors = dict(self._errors)
+            timeline = dict(self._timeline)
+            ops = self._ops
+        elapsed = (self.finished_at or time.perf_counter()) - self.started_at
+
+        histogram = []
+        index = 0
+        for bound in HISTOGRAM_BOUNDS_MS + (math.inf,):
+            count = 0
+            while index < len(latencies) and latencies[index] <= bound:
+                count += 1
+                index += 1
+            histogram.append({'le_ms': 'inf' if bound == math.inf else bound, 'count': count})
+
+        def rounded(value):
+            return round(value, 3) if value is not None else None
+
+        return {
+            'config': config or {},
+            'duration_s': round(elapsed, 3),
+            'requests': len(latencies) + sum(errors.values()),
+            'succeeded': len(latencies),
+            'operations': ops,
+            'throughput': {
+                'requests_per_s': round(len(latencies) / elapsed, 2) if elapsed else None,
+                'operations_per_s': round(ops / elapsed, 2) if elapsed else None
+            },
+            'latency_ms': {
+                'p50': rounded(percentile(latencies, 50)),
+                'p95': rounded(percentile(latencies, 95)),
+                'p99': rounded(percentile(latencies, 99)),
+                'max': rounded(latencies[-1] if latencies else None),
+                'mean': rounded(sum(latencies) / len(latencies) if latencies else None)
+            },
+            'histogram': histogram,
+            'timeline': [{'second': s, 'ok': timeline[s][0], 'errors': timeline[s][1]}
+                         for s in sorted(timeline)],
+            'errors': errors
+        }
+
+
+def run_workers(operation, workers, total=None, duration=None, rate=None, recorder=None):
+    """Executa `operation()` em `workers` threads até `total` operações ou `duration` segundos.
+
+    Com `rate` (requisições/s) a carga é de malha aberta: cada requisição tem
+    um horário de início agendado e a latência é medida a partir desse
+    horário, então atrasos do servidor não reduzem a carga enviada
+    (evita coordinated omission). Sem `rate`, cada worker dispara a próxima
+    requisição assim que a anterior termina.
+
+    `operation()` retorna o número de operações da requisição (documentos
+    inseridos, arquivos enviados...) ou levanta exceção em caso de erro.
+    """
+    recorder = recorder or LoadRecorder()
+    lock = threading.Lock()
+    issued = [0]
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    def next_slot():
+        with lock:
+            n = issued[0]
+            if total is not None and n >= total:
+                return None
+            issued[0] += 1
+        return start + n / rate if rate else time.perf_counter()
+
+    def worker():
+        while True:
+            scheduled = next_slot()
+            if scheduled is None or (deadline and scheduled >= deadline):
+                return
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                ops = operation()
+            except Exception as e:
+                recorder.record_error(e)
+            else:
+                recorder.record(time.perf_counter() - scheduled, ops or 1)
+
+    threads = [threading.Thread(target=worker, name=f'load-{i}', daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    recorder.finish()
+    return recorder
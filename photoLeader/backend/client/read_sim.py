@@ -2,13 +2,30 @@
 
 Uso:
   python client/read_sim.py [--tag TAG] [--uri MONGO_URI]
+  python client/read_sim.py --benchmark [--modes primary secondaryPreferred] [--workers W]
+                            [--count N | --duration S] [--rate R] [--max-staleness S]
+                            [--uri MONGO_URI] [--out relatorio.json]
 
 Este script conecta-se ao cluster com readPreference=secondaryPreferred para demonstrar
 escala de leitura em followers. Pode receber uma URI completa via --uri.
+
+Com --benchmark roda listagens concorrentes (por tag/usuário aleatórios) para
+cada read preference de --modes, com um único MongoClient compartilhado pelos
+workers, e gera um relatório JSON com vazão e latências gerais e por membro do
+Replica Set (medidas por um CommandListener), mostrando como a carga se
+distribui entre PRIMARY e secondaries.
 """
 
 import argparse
-from pymongo import MongoClient
+import json
+import random
+import threading
+from pymongo import MongoClient, monitoring
+
+try:
+    from client.load_stats import LoadRecorder, run_workers
+except ImportError:  # executado como script (python client/read_sim.py)
+    from load_stats import LoadRecorder, run_workers
 
 SEEDS = ["mongodb://localhost:27017",
          "mongodb://localhost:27018",
@@ -23,13 +40,13 @@ DB_NAME = 'uploadDB'
 COLLECTION = 'files'
 
 
-def make_read_client(uri: str = None):
+def make_read_client(uri: str = None, read_preference: str = 'secondaryPreferred', **options):
     # Conecta com preferência por secondaries para leituras escaláveis
     if uri:
-        client = MongoClient(uri, serverSelectionTimeoutMS=5000, readPreference='secondaryPreferred')
+        client = MongoClient(uri, serverSelectionTimeoutMS=5000, readPreference=read_preference, **options)
     else:
         # Usa a URI do replica set dos notebooks
-        client = MongoClient(REPLICA_URI, serverSelectionTimeoutMS=5000, readPreference='secondaryPreferred')
+        client = MongoClient(REPLICA_URI, serverSelectionTimeoutMS=5000, readPreference=read_preference, **options)
     return client
 
 
@@ -47,9 +64,106 @@ def list_gallery(tag: str = None, limit: int = 20, uri: str = None):
         print(f"_id={d.get('_id')} user={d.get('user')} status={d.get('status')} tags={d.get('tags')} filename={d.get('filename')}")
 
 
+# ============= BENCHMARK DE LEITURA =============
+
+TAGS = ['natureza', 'pessoa', 'urbano', 'evento', 'paisagem', 'macro']
+USERS = [f'user_{i}' for i in range(1, 6)]
+
+
+class MemberLatencyListener(monitoring.CommandListener):
+    """Latência e volume das leituras (find) por membro do Replica Set"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.members = {}
+
+    def _recorder(self, event):
+        host, port = event.connection_id
+        with self._lock:
+            return self.members.setdefault(f'{host}:{port}', LoadRecorder())
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name == 'find':
+            self._recorder(event).record(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        if event.command_name == 'find':
+            self._recorder(event).record_error(RuntimeError(event.failure.get('errmsg', 'find falhou')))
+
+    def report(self):
+        with self._lock:
+            members = dict(self.members)
+        result = {}
+        for name, recorder in sorted(members.items()):
+            recorder.finish()
+            full = recorder.report()
+            result[name] = {key: full[key] for key in ('requests', 'throughput', 'latency_ms', 'errors')}
+        return result
+
+
+def gallery_query():
+    """Listagem aleatória: galeria geral, por tag ou por usuário"""
+    kind = random.random()
+    if kind < 0.4:
+        return {'tags': random.choice(TAGS)}
+    if kind < 0.7:
+        return {'user': random.choice(USERS)}
+    return {}
+
+
+def run_read_benchmark(mode='secondaryPreferred', workers=16, count=None, duration=None, rate=None,
+                       uri=None, max_staleness=None, limit=20):
+    """Roda listagens concorrentes com a read preference `mode` e retorna o relatório"""
+    listener = MemberLatencyListener()
+    options = {'event_listeners': [listener]}
+    if max_staleness and mode != 'primary':
+        options['maxStalenessSeconds'] = max_staleness
+    client = make_read_client(uri, mode, **options)
+    coll = client.get_database(DB_NAME).get_collection(COLLECTION)
+
+    def operation():
+        list(coll.find(gallery_query()).sort('upload_date', -1).limit(limit))
+        return 1
+
+    try:
+        recorder = run_workers(operation, workers, total=count, duration=duration, rate=rate)
+    finally:
+        client.close()
+    report = recorder.report({'mode': mode, 'workers': workers, 'rate': rate, 'count': count,
+                              'duration': duration, 'max_staleness': max_staleness, 'limit': limit})
+    report['members'] = listener.report()
+    return report
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--tag', type=str, help='Filtrar por tag')
     parser.add_argument('--uri', type=str, default=None, help='MongoDB URI para conectar ao replicaset')
+    parser.add_argument('--benchmark', action='store_true', help='Roda o benchmark de leitura concorrente')
+    parser.add_argument('--modes', nargs='+', default=['primary', 'secondaryPreferred'],
+                        help='Read preferences comparadas no benchmark')
+    parser.add_argument('--workers', type=int, default=16, help='Workers (threads) simultâneos')
+    parser.add_argument('--count', type=int, default=None, help='Leituras por modo (padrão: 1000 sem --duration)')
+    parser.add_argument('--duration', type=float, default=None, help='Duração de cada modo em segundos')
+    parser.add_argument('--rate', type=float, default=None, help='Taxa alvo em leituras/s (malha aberta)')
+    parser.add_argument('--max-staleness', type=int, default=None, help='maxStalenessSeconds (>= 90)')
+    parser.add_argument('--out', type=str, default=None, help='Arquivo para gravar o relatório JSON')
     args = parser.parse_args()
-    list_gallery(args.tag, uri=args.uri)
+
+    if not args.benchmark:
+        list_gallery(args.tag, uri=args.uri)
+    else:
+        count = args.count if args.count is not None or args.duration else 1000
+        reports = {mode: run_read_benchmark(mode, args.workers, count, args.duration, args.rate,
+                                            args.uri, args.max_staleness)
+                   for mode in args.modes}
+        output = json.dumps(reports, indent=2)
+        if args.out:
+            with open(args.out, 'w') as f:
+                f.write(output)
+            print(f"📊 Relatório gravado em {args.out}")
+        else:
+            print(output)
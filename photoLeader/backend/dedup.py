@@ -0,0 +1,147 @@
+"""
+Deduplicação de fotos por conteúdo (SHA-256) com contagem de referências
+
+Cada conteúdo distinto tem um documento na collection `blobs`:
+
+    {'_id': <sha256>, 'gridfs_id': ObjectId | 'storage_path': str,
+     'refcount': int, 'length': int, 'content_type': str}
+
+O `_id` é o próprio hash, então o índice único do _id garante um único
+blob por conteúdo. Uploads repetidos não gravam os bytes de novo; o
+refcount é incrementado na mesma transação que insere a foto e o arquivo
+(no GridFS ou no disco, ver blob_store.py) só é removido quando a última
+referência vai embora.
+"""
+
+from pymongo import ReturnDocument, UpdateOne
+
+from blob_store import locate, location
+from upload_stream import hash_stream, hash_stream_async
+
+BLOBS_COLLECTION = 'blobs'
+
+
+def find_blob(blobs, sha256):
+    """Blob já gravado para o conteúdo (apenas leitura; a referência é contada no commit)"""
+    return blobs.find_one({'_id': sha256})
+
+
+def reused_blob(blob, sha256):
+    """Dict de store_deduplicated para um conteúdo que já tem blob"""
+    store, file_id = locate(blob)
+    return {
+        'file_id': file_id,
+        'store': store,
+        'length': blob['length'],
+        'sha256': sha256,
+        'content_type': blob['content_type'],
+        'deduplicated': True
+    }
+
+
+def blob_reference_ops(stored_files):
+    """UpdateOne por conteúdo com o $inc das novas referências.
+
+    Conteúdo recém-gravado faz upsert com o próprio arquivo; se o
+    blob já existir (outro upload venceu), o $setOnInsert é ignorado e o
+    arquivo gravado sobra (ver surplus_files). Conteúdo deduplicado só
+    incrementa o blob existente.
+    """
+    references = {}
+    for stored in stored_files:
+        count, new = references.get(stored['sha256'], (0, None))
+        if new is None and not stored['deduplicated']:
+            new = stored
+        references[stored['sha256']] = (count + 1, new)
+
+    ops = []
+    for sha256, (count, new) in references.items():
+        if new is None:
+            ops.append(UpdateOne({'_id': sha256}, {'$inc': {'refcount': count}}))
+        else:
+            ops.append(UpdateOne({'_id': sha256}, {
+                '$setOnInsert': dict(
+                    location(new['store'], new['file_id']),
+                    length=new['length'],
+                    content_type=new['content_type']
+                ),
+                '$inc': {'refcount': count}
+            }, upsert=True))
+    return ops
+
+
+def surplus_files(stored_files, locations):
+    """(backend, arquivo) gravados que não viraram o arquivo do blob (corrida entre uploads)"""
+    return [(stored['store'], stored['file_id']) for stored in stored_files
+            if not stored['deduplicated'] and locations.get(stored['sha256']) != (stored['store'], stored['file_id'])]
+
+
+def release_blob(blobs, sha256, session=None):
+    """Decrementa o refcount; retorna (backend, arquivo) a remover se era a última referência"""
+    blob = blobs.find_one_and_update(
+        {'_id': sha256},
+        {'$inc': {'refcount': -1}},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if not blob or blob['refcount'] > 0:
+        return None
+    # Só remove se ninguém voltou a referenciar o blob nesse meio tempo
+    result = blobs.delete_one({'_id': sha256, 'refcount': {'$lte': 0}}, session=session)
+    if result.deleted_count:
+        return locate(blob)
+    return None
+
+
+def store_deduplicated(store, blobs, stream, filename, declared_type=None):
+    """Grava o conteúdo de `stream` no `store` (blob_store.py) apenas se ele ainda não existir.
+
+    Quando o stream é seekable (o Werkzeug guarda uploads em arquivo
+    temporário), o hash é calculado numa primeira leitura e os bytes só são
+    escritos se o conteúdo for novo. Nada aqui torna a foto visível nem
+    conta referências: isso é feito pelo commit (photo_commit.py). Retorna o
+    dict de store.write (file_id, store, length, sha256, content_type), com a
+    chave extra `deduplicated`.
+    """
+    if stream.seekable():
+        sha256, _ = hash_stream(stream)
+        stream.seek(0)
+        blob = find_blob(blobs, sha256)
+        if blob:
+            return reused_blob(blob, sha256)
+
+    stored = store.write(stream, filename, declared_type=declared_type)
+    return dict(stored, deduplicated=False)
+
+
+# ---------- Versões assíncronas (modo ASGI, AsyncMongoClient) ----------
+
+async def find_blob_async(blobs, sha256):
+    return await blobs.find_one({'_id': sha256})
+
+
+async def release_blob_async(blobs, sha256, session=None):
+    blob = await blobs.find_one_and_update(
+        {'_id': sha256},
+        {'$inc': {'refcount': -1}},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    if not blob or blob['refcount'] > 0:
+        return None
+    result = await blobs.delete_one({'_id': sha256, 'refcount': {'$lte': 0}}, session=session)
+    if result.deleted_count:
+        return locate(blob)
+    return None
+
+
+async def store_deduplicated_async(store, blobs, upload, filename, declared_type=None):
+    """Versão assíncrona de store_deduplicated para um UploadFile do Starlette"""
+    sha256, _ = await hash_stream_async(upload)
+    await upload.seek(0)
+    blob = await find_blob_async(blobs, sha256)
+    if blob:
+        return reused_blob(blob, sha256)
+
+    stored = await store.write_async(upload, filename, declared_type=declared_type)
+    return dict(stored, deduplicated=False)
@@ -0,0 +1,84 @@
+"""
+Cabeçalhos do download de fotos: ETag, Last-Modified, cache condicional e Range
+
+Independe do framework: recebe os cabeçalhos da requisição e os dados do
+arquivo GridFS e decide status (200, 206, 304 ou 416), intervalo de bytes e
+cabeçalhos de resposta. Usado pela rota Flask e pela rota ASGI.
+"""
+
+from werkzeug.http import (http_date, parse_date, parse_etags, parse_if_range_header,
+                           parse_range_header, quote_etag)
+
+# Cache de um ano: o conteúdo de uma foto nunca muda para o mesmo ID
+PHOTO_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def build_etag(grid_out):
+    """Monta a ETag a partir do _id, tamanho e md5 (quando existir) do arquivo GridFS"""
+    parts = [str(grid_out._id), str(grid_out.length)]
+    md5 = getattr(grid_out, 'md5', None)
+    if md5:
+        parts.append(md5)
+    return '-'.join(parts)
+
+
+def grid_content_type(grid_out):
+    """Tipo MIME do arquivo: metadata.contentType (GridFSBucket) ou contentType (GridFS.put)"""
+    metadata = grid_out.metadata or {}
+    return (metadata.get('contentType')
+            or getattr(grid_out, 'contentType', None)
+            or 'application/octet-stream')
+
+
+def plan_file_response(request_headers, grid_out):
+    """Decide a resposta para um download.
+
+    Retorna (status, start, end, headers); o corpo, quando houver (200/206),
+    são os bytes [start, end) do arquivo.
+    """
+    length = grid_out.length
+    etag = build_etag(grid_out)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': PHOTO_CACHE_CONTROL,
+        'Content-Disposition': f'inline; filename="{grid_out.filename}"',
+        'ETag': quote_etag(etag)
+    }
+    if grid_out.upload_date:
+        headers['Last-Modified'] = http_date(grid_out.upload_date)
+
+    # Validação condicional: If-None-Match tem prioridade sobre If-Modified-Since
+    if_none_match = request_headers.get('If-None-Match')
+    if_modified_since = parse_date(request_headers.get('If-Modified-Since'))
+    if if_none_match:
+        not_modified = parse_etags(if_none_match).contains(etag)
+    elif if_modified_since and grid_out.upload_date:
+        upload_date = grid_out.upload_date.replace(microsecond=0, tzinfo=None)
+        not_modified = upload_date <= if_modified_since.replace(tzinfo=None)
+    else:
+        not_modified = False
+    if not_modified:
+        return 304, 0, 0, headers
+
+    # Range só é aplicado se o If-Range (quando enviado) ainda bater com a ETag atual
+    byte_range = parse_range_header(request_headers.get('Range'))
+    if_range = request_headers.get('If-Range')
+    if byte_range and if_range and parse_if_range_header(if_range).etag != etag:
+        byte_range = None
+    # Vários intervalos pediriam multipart/byteranges, que não é gerado: o RFC 9110
+    # permite ignorar o Range e enviar o arquivo inteiro (416 faria o cliente desistir)
+    if byte_range and len(byte_range.ranges) != 1:
+        byte_range = None
+
+    if byte_range:
+        bounds = byte_range.range_for_length(length)
+        if bounds is None:
+            headers['Content-Range'] = f'bytes */{length}'
+            return 416, 0, 0, headers
+        start, end = bounds
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{length}'
+        headers['Content-Length'] = str(end - start)
+        return 206, start, end, headers
+
+    headers['Content-Length'] = str(length)
+    return 200, 0, length, headers
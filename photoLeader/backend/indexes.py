@@ -0,0 +1,137 @@
+"""
+Índices do MongoDB usados pela aplicação (registro declarativo)
+
+Cada consulta da API tem o índice que a serve registrado aqui, por
+collection. `ensure_indexes` cria, no startup, os que faltarem: o
+createIndexes é idempotente para a mesma definição, então nós recriados
+(reset-mongo-node.ps1 ou à mão) voltam a ter todos os índices sem depender
+do mongo-init.js. Os índices do GridFS (fs e thumbs) também entram no
+registro, em vez de serem criados no primeiro upload.
+
+`plan_problems` analisa a saída de um explain(): é a base dos testes de
+regressão dos planos (tests/test_indexes.py), que falham quando uma
+consulta cai em COLLSCAN, em SORT em memória ou examina documentos demais
+para o que devolve.
+
+Uso avulso:
+
+  python indexes.py            # cria os índices que faltam
+  python indexes.py --check    # só lista os que faltam (código de saída 1 se faltar algum)
+"""
+
+import argparse
+import sys
+
+from pymongo import IndexModel
+
+from dedup import BLOBS_COLLECTION
+from logs import get_logger
+from orphan_sweeper import SWEEPER_INDEXES
+from search_index import SEARCH_INDEXES
+from stats_counters import STATS_COLLECTION, STATS_INDEXES
+
+PHOTOS_COLLECTION = 'files'
+
+# Listagens: filtro + ordenação (upload_date, _id), também usados pelo cursor e pelos vizinhos
+LISTING_INDEXES = [
+    [('upload_date', -1), ('_id', -1)],
+    [('user', 1), ('upload_date', -1), ('_id', -1)],
+    [('tags', 1), ('upload_date', -1), ('_id', -1)],
+]
+
+# Índices que o próprio driver usa em cada bucket do GridFS
+GRIDFS_FILES_INDEXES = [[('filename', 1), ('uploadDate', 1)]]
+GRIDFS_CHUNKS_INDEX = IndexModel([('files_id', 1), ('n', 1)], unique=True)
+
+INDEXES = {
+    PHOTOS_COLLECTION: [IndexModel(keys) for keys in LISTING_INDEXES + SEARCH_INDEXES + SWEEPER_INDEXES],
+    BLOBS_COLLECTION: [IndexModel(keys) for keys in SWEEPER_INDEXES],
+    STATS_COLLECTION: [IndexModel(keys) for keys in STATS_INDEXES],
+}
+for bucket in ('fs', 'thumbs'):
+    INDEXES[f'{bucket}.files'] = [IndexModel(keys) for keys in GRIDFS_FILES_INDEXES]
+    INDEXES[f'{bucket}.chunks'] = [GRIDFS_CHUNKS_INDEX]
+
+# Documentos examinados por documento devolvido acima disso contam como regressão
+MAX_EXAMINED_RATIO = 2.0
+
+log = get_logger('indexes')
+
+
+def _key(model):
+    return list(model.document['key'].items())
+
+
+def missing_indexes(db, registry=INDEXES):
+    """{collection: [nomes]} dos índices do registro que não existem no banco"""
+    missing = {}
+    for name, models in registry.items():
+        existing = [list(info['key']) for info in db[name].index_information().values()]
+        absent = [model.document['name'] for model in models if _key(model) not in existing]
+        if absent:
+            missing[name] = absent
+    return missing
+
+
+def ensure_indexes(db, registry=INDEXES):
+    """Cria os índices do registro que faltam; retorna {collection: [nomes]} dos que falharam.
+
+    Uma collection com problema (ex.: índice com o mesmo nome e outra
+    definição) não impede as demais.
+    """
+    failed = {}
+    for name, models in registry.items():
+        try:
+            db[name].create_indexes(models)
+        except Exception as e:
+            log.warning(f"⚠️ Erro ao criar índices em {name}: {e}")
+            failed[name] = [model.document['name'] for model in models]
+    return failed
+
+
+def _stages(plan):
+    """Estágios de um plano do explain (árvore de inputStage/inputStages, clássico ou SBE)"""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+
+def plan_problems(explain, max_examined_ratio=MAX_EXAMINED_RATIO):
+    """Problemas do plano vencedor de um explain(); lista vazia quando o plano é bom"""
+    planner = explain.get('queryPlanner', {})
+    stages = set(_stages(planner.get('winningPlan', {})))
+    problems = []
+    if 'COLLSCAN' in stages:
+        problems.append('COLLSCAN')
+    if 'SORT' in stages:
+        problems.append('SORT em memória')
+
+    stats = explain.get('executionStats')
+    if stats:
+        returned = max(stats.get('nReturned', 0), 1)
+        ratio = stats.get('totalDocsExamined', 0) / returned
+        if ratio > max_examined_ratio:
+            problems.append(f'{ratio:.1f} documentos examinados por documento devolvido')
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cria ou confere os índices da aplicação')
+    parser.add_argument('--check', action='store_true', help='Só lista os índices que faltam')
+    args = parser.parse_args()
+
+    import api
+
+    if not args.check:
+        ensure_indexes(api.db)
+    missing = missing_indexes(api.db)
+    for name, absent in missing.items():
+        print(f'{name}: faltando {", ".join(absent)}')
+    if not missing:
+        print('✅ Todos os índices presentes')
+    sys.exit(1 if missing else 0)
@@ -0,0 +1,394 @@
+"""
+Spool local de ingestão (write-behind dos metadados dos uploads)
+
+No modo padrão cada upload espera o commit majority dos metadados; a vazão
+fica presa às idas e voltas do replica set e para durante uma eleição.
+Com INGEST_MODE=spool o upload grava os bytes, acrescenta o registro dos
+metadados (documento da foto, já com o _id gerado aqui, + referência ao
+arquivo) num arquivo local só de acréscimo e responde 202 com o id:
+
+- cada registro é [tamanho][crc32][BSON]; escritas concorrentes dividem o
+  mesmo fsync (group commit), então a vazão depende do disco local;
+- uma thread drena o arquivo em ordem, em lotes de até SPOOL_BATCH
+  registros, com um único commit transacional por lote (photo_commit.py).
+  O commit é idempotente pelo _id: registros já gravados são pulados, então
+  reprocessar o spool depois de uma queda não duplica fotos;
+- cada processo escreve no próprio segmento (`<pid>-<ns>.spool`, com flock).
+  No startup, segmentos sem dono (processo que caiu ou reiniciou) são
+  drenados antes dos novos registros e apagados. Um registro cortado no fim
+  (queda no meio da escrita) é descartado: o upload dele não recebeu 202;
+- quando o commit falha (eleição, replica set fora do ar) o lote é repetido
+  a cada SPOOL_RETRY_SECONDS. Com mais de SPOOL_MAX_BYTES pendentes o
+  upload recebe 503 (SpoolFull);
+- um lote que falha SPOOL_MAX_ATTEMPTS vezes com um erro que não é de rede
+  ou de eleição é repetido registro a registro; os registros que ainda
+  falham, e os que passam no crc mas não decodificam, vão para
+  `quarantine.bad` no SPOOL_DIR (mesmo formato) e a drenagem segue;
+- um segmento órfão que some no meio do caminho (outro processo já o drenou)
+  é ignorado; outros erros ao drená-lo deixam o segmento para o próximo
+  startup sem parar a thread.
+
+O atraso (registros, bytes e idade do mais antigo ainda não confirmado)
+vai para /api/metrics. Sem fcntl (Windows) os segmentos não são travados:
+use um único processo por SPOOL_DIR.
+"""
+
+import glob
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+import bson
+from bson.errors import InvalidBSON
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+from logs import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava dos segmentos
+    fcntl = None
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# sync (padrão): commit dos metadados na requisição; spool: write-behind por este módulo
+INGEST_MODE = os.environ.get('INGEST_MODE', 'sync')
+SPOOL_DIR = os.environ.get('SPOOL_DIR', os.path.join(BACKEND_DIR, 'spool'))
+# Registros (uploads) por commit
+SPOOL_BATCH = int(os.environ.get('SPOOL_BATCH', 256))
+# Bytes pendentes (ainda não confirmados no MongoDB) aceitos antes de recusar uploads
+SPOOL_MAX_BYTES = int(os.environ.get('SPOOL_MAX_BYTES', 256 * 1024 * 1024))
+# Espera entre tentativas de commit de um lote que falhou
+SPOOL_RETRY_SECONDS = float(os.environ.get('SPOOL_RETRY_SECONDS', 1))
+# Falhas não transitórias de um lote antes de repeti-lo registro a registro (e pôr em quarentena)
+SPOOL_MAX_ATTEMPTS = int(os.environ.get('SPOOL_MAX_ATTEMPTS', 5))
+# Tamanho a partir do qual o segmento é zerado quando tudo já foi confirmado
+SPOOL_ROTATE_BYTES = int(os.environ.get('SPOOL_ROTATE_BYTES', 64 * 1024 * 1024))
+# Retry-After (segundos) dos uploads recusados com o spool cheio
+SPOOL_FULL_RETRY_AFTER = 5
+
+SPOOL_SUFFIX = '.spool'
+# Registros que não puderam ser gravados (fora do padrão *.spool, então não são drenados)
+QUARANTINE_NAME = 'quarantine.bad'
+
+# Cabeçalho de cada registro: tamanho do BSON e crc32 do BSON
+_HEADER = struct.Struct('<II')
+
+log = get_logger('ingest_spool')
+
+
+class SpoolFull(Exception):
+    """Spool com mais de SPOOL_MAX_BYTES pendentes (o MongoDB não está acompanhando)"""
+
+
+class _PoisonBatch(Exception):
+    """Lote que falhou SPOOL_MAX_ATTEMPTS vezes com um erro que não é transitório"""
+
+
+def encode_record(entries):
+    """Registro do spool para [(photo_doc, stored), ...]"""
+    payload = bson.encode({'entries': [{'doc': doc, 'stored': stored} for doc, stored in entries]})
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(f, offset=0, end=None, limit=None, quarantine=None):
+    """Gera (offset do fim do registro, [(photo_doc, stored), ...]) a partir de `offset`.
+
+    Para no primeiro registro incompleto ou corrompido (fim cortado por uma
+    queda) e em `end`/`limit`, quando informados. Um registro íntegro que não
+    decodifica é passado a `quarantine(registro, erro)` e sai com a lista
+    vazia (sem `quarantine`, o erro é levantado).
+    """
+    f.seek(offset)
+    count = 0
+    while (end is None or offset < end) and (limit is None or count < limit):
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        length, crc = _HEADER.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        offset += _HEADER.size + length
+        count += 1
+        try:
+            record = bson.decode(payload)
+            entries = [(entry['doc'], entry['stored']) for entry in record['entries']]
+        except (InvalidBSON, KeyError, TypeError) as e:
+            if quarantine is None:
+                raise
+            quarantine(header + payload, e)
+            entries = []
+        yield offset, entries
+
+
+def pending_files(directory=SPOOL_DIR):
+    """(backend, file_id) citados pelos segmentos do spool e pela quarentena.
+
+    Esses arquivos ainda não têm blob nem foto (os metadados não foram
+    drenados), então o orphan_sweeper não os remove, por mais antigos que sejam.
+    """
+    files = set()
+    paths = glob.glob(os.path.join(directory, f'*{SPOOL_SUFFIX}')) + [os.path.join(directory, QUARANTINE_NAME)]
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                for _, entries in read_records(f, quarantine=lambda record, e: None):
+                    files.update((stored['store'], stored['file_id']) for _, stored in entries)
+        except FileNotFoundError:
+            continue  # Segmento drenado e apagado entre o glob e o open
+    return files
+
+
+def _transient(error):
+    """Falha de rede ou eleição: o lote é repetido sem limite de tentativas"""
+    if isinstance(error, PyMongoError) and error.has_error_label('TransientTransactionError'):
+        return True
+    return isinstance(error, (ConnectionFailure, ConnectionError, TimeoutError))
+
+
+def _try_lock(f):
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class IngestSpool(threading.Thread):
+    """Segmento de spool deste processo e a thread que o drena para o MongoDB.
+
+    `commit(entries)` grava um lote [(photo_doc, stored), ...] e precisa ser
+    idempotente pelo _id das fotos.
+    """
+
+    def __init__(self, commit, directory=SPOOL_DIR, batch=SPOOL_BATCH, max_bytes=SPOOL_MAX_BYTES,
+                 retry_seconds=SPOOL_RETRY_SECONDS, rotate_bytes=SPOOL_ROTATE_BYTES,
+                 max_attempts=SPOOL_MAX_ATTEMPTS, fsync=True):
+        super().__init__(name='ingest-spool', daemon=True)
+        self.commit = commit
+        self.directory = directory
+        self.batch = batch
+        self.max_bytes = max_bytes
+        self.retry_seconds = retry_seconds
+        self.rotate_bytes = rotate_bytes
+        self.max_attempts = max_attempts
+        self.fsync = fsync
+        self.path = None
+        self.totals = {'appended': 0, 'committed': 0, 'replayed': 0, 'errors': 0, 'quarantined': 0}
+        self._file = None
+        self._reader = None
+        self._written = 0
+        self._synced = 0
+        self._committed = 0
+        # (offset do fim, horário do acréscimo) dos registros ainda não confirmados
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stop_event = threading.Event()
+
+    def _open(self):
+        # Chamado com self._lock adquirido
+        if self._file is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f'{os.getpid()}-{time.time_ns()}{SPOOL_SUFFIX}')
+        self._file = open(self.path, 'ab', buffering=0)
+        _try_lock(self._file)
+        self._reader = open(self.path, 'rb', buffering=0)  # Sem buffer: o segmento pode ser zerado e reescrito
+        self._written = self._synced = self._committed = 0
+        self._pending.clear()
+
+    def open(self):
+        with self._lock:
+            self._open()
+        return self
+
+    # ---------- escrita (threads das requisições) ----------
+
+    def append(self, entries):
+        """Acrescenta um registro e retorna depois do fsync (levanta SpoolFull)"""
+        record = encode_record(entries)
+        with self._lock:
+            self._open()
+            if self._written - self._committed + len(record) > self.max_bytes:
+                raise SpoolFull(f'Spool com mais de {self.max_bytes} bytes aguardando o MongoDB')
+            self._file.write(record)
+            self._written += len(record)
+            end = self._written
+            self._pending.append((end, time.time()))
+            self.totals['appended'] += 1
+        self._sync(end)
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def _sync(self, end):
+        # Quem chega primeiro faz o fsync de tudo o que já foi escrito; quem
+        # estava esperando o lock normalmente já encontra o próprio registro no disco
+        with self._sync_lock:
+            if self._synced >= end:
+                return
+            target = self._written
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._synced = target
+
+    # ---------- drenagem (thread do spool) ----------
+
+    def _commit_with_retry(self, entries):
+        """True quando gravou, False se a thread foi parada; _PoisonBatch depois de max_attempts erros não transitórios"""
+        attempts = 0
+        while not self._stop_event.is_set():
+            try:
+                self.commit(entries)
+                return True
+            except Exception as e:
+                self.totals['errors'] += 1
+                if not _transient(e):
+                    attempts += 1
+                    if attempts >= self.max_attempts:
+                        raise _PoisonBatch(e) from e
+                log.warning(f"Erro ao gravar {len(entries)} uploads do spool (nova tentativa): {e}")
+                self._stop_event.wait(self.retry_seconds)
+        return False
+
+    def _commit_records(self, records):
+        """Grava os registros [(offset, entries), ...]; os que falham sempre vão para a quarentena"""
+        entries = [entry for _, batch in records for entry in batch]
+        if not entries:
+            return True
+        try:
+            return self._commit_with_retry(entries)
+        except _PoisonBatch as e:
+            if len(records) == 1:
+                self._quarantine(encode_record(entries), e.__cause__)
+                return True
+        # Lote com algum registro que nunca grava: repete um a um para isolá-lo
+        for record in records:
+            if not self._commit_records([record]):
+                return False
+        return True
+
+    def _quarantine(self, record, error):
+        # Só a thread do spool chama: não precisa de trava
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, QUARANTINE_NAME), 'ab') as f:
+            f.write(record)
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.totals['quarantined'] += 1
+        log.error(f"Registro do spool em quarentena ({QUARANTINE_NAME}): {error!r}")
+
+    def _replay_segment(self, path):
+        # Uploads gravados do segmento, ou None se a thread foi parada no meio
+        replayed = 0
+        with open(path, 'rb') as f:
+            if not _try_lock(f):
+                return 0  # Segmento de outro processo vivo
+            offset = 0
+            while True:
+                records = list(read_records(f, offset, limit=self.batch, quarantine=self._quarantine))
+                if not records:
+                    break
+                if not self._commit_records(records):
+                    self.totals['replayed'] += replayed
+                    return None
+                offset = records[-1][0]
+                replayed += len(records)
+            if offset < os.fstat(f.fileno()).st_size:
+                log.warning(f"Registro incompleto descartado no fim de {path}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Outro processo drenou o mesmo segmento (o commit é idempotente)
+        self.totals['replayed'] += replayed
+        return replayed
+
+    def replay_orphans(self):
+        """Drena e apaga os segmentos de processos que não estão mais rodando; retorna quantos uploads"""
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, f'*{SPOOL_SUFFIX}'))):
+            if path == self.path:
+                continue
+            try:
+                count = self._replay_segment(path)
+            except FileNotFoundError:
+                continue  # Já drenado e apagado por outro processo
+            except Exception as e:
+                self.totals['errors'] += 1
+                log.error(f"Erro ao drenar {path} (fica para o próximo startup): {e}")
+                continue
+            if count is None:
+                break
+            replayed += count
+        return replayed
+
+    def drain(self):
+        """Grava um lote do próprio segmento; retorna quantos registros foram confirmados"""
+        records = list(read_records(self._reader, self._committed, self._synced, self.batch,
+                                    quarantine=self._quarantine))
+        if not records:
+            return 0
+        if not self._commit_records(records):
+            return 0
+        end = records[-1][0]
+        with self._lock:
+            self._committed = end
+            while self._pending and self._pending[0][0] <= end:
+                self._pending.popleft()
+            self.totals['committed'] += len(records)
+            self._maybe_rotate()
+        return len(records)
+
+    def _maybe_rotate(self):
+        # Chamado com self._lock adquirido: zera o segmento quando tudo já foi confirmado
+        if self._committed < self._written or self._written < self.rotate_bytes:
+            return
+        with self._sync_lock:
+            self._file.truncate(0)
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._written = self._synced = self._committed = 0
+
+    def close(self):
+        """Fecha (e destrava) o segmento; o que não foi drenado fica para o próximo startup"""
+        with self._lock:
+            for f in (self._file, self._reader):
+                if f is not None:
+                    f.close()
+            self._file = self._reader = None
+
+    def stop(self):
+        self._stop_event.set()
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def run(self):
+        self.open()
+        self.replay_orphans()
+        while not self._stop_event.is_set():
+            with self._wakeup:
+                if self._committed >= self._synced:
+                    self._wakeup.wait(1)
+            try:
+                self.drain()
+            except Exception as e:
+                self.totals['errors'] += 1
+                log.error(f"Erro ao drenar o spool (nova tentativa): {e}")
+                self._stop_event.wait(self.retry_seconds)
+
+    def stats(self):
+        with self._lock:
+            oldest = self._pending[0][1] if self._pending else None
+            return {
+                'pending': len(self._pending),
+                'pending_bytes': self._written - self._committed,
+                'lag_seconds': round(time.time() - oldest, 3) if oldest is not None else 0.0,
+                **self.totals
+            }
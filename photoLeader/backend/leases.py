@@ -0,0 +1,57 @@
+"""
+Lease no MongoDB para jobs que devem rodar em um processo só
+
+Com vários workers (WEB_CONCURRENCY) o startup roda em cada processo. Jobs
+que têm estado por processo (cache de metadados, índice de tags, monitor da
+topologia, spool) precisam rodar em todos; jobs que só varrem o banco, como
+a limpeza de órfãos, fariam o mesmo trabalho N vezes. Antes de cada passada
+esses jobs chamam `Lease.acquire()`:
+
+    {'_id': <job>, 'owner': '<host>:<pid>:<aleatório>', 'expires_at': datetime}
+
+O dono renova o prazo a cada passada; os outros só assumem depois que ele
+vence (processo que caiu ou travou). O prazo usa o relógio de quem pede:
+com hosts dessincronizados duas passadas podem se sobrepor, o que só é
+aceitável para jobs idempotentes.
+"""
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+LEASES_COLLECTION = 'leases'
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Lease:
+    """Lease `name` na collection `leases`, válido por `ttl_seconds` a cada acquire()"""
+
+    def __init__(self, collection, name, ttl_seconds, owner=None, clock=_utcnow):
+        self.collection = collection
+        self.name = name
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.owner = owner or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.clock = clock
+
+    def acquire(self):
+        """True se este processo é (ou passou a ser) o dono até agora + ttl"""
+        now = self.clock()
+        try:
+            doc = self.collection.find_one_and_update(
+                {'_id': self.name, '$or': [{'owner': self.owner}, {'expires_at': {'$lte': now}}]},
+                {'$set': {'owner': self.owner, 'expires_at': now + self.ttl}},
+                upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            return False  # O documento existe e é de outro dono ainda no prazo
+        return doc is not None and doc['owner'] == self.owner
+
+    def release(self):
+        """Solta o lease (no stop), para outro processo assumir sem esperar o prazo"""
+        self.collection.delete_one({'_id': self.name, 'owner': self.owner})
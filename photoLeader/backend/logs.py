@@ -0,0 +1,80 @@
+"""
+Logging estruturado, com níveis e amostragem, no lugar dos print() por requisição
+
+- Uma linha JSON por evento (LOG_FORMAT=text para o formato legível).
+- Nível configurável por LOG_LEVEL (padrão INFO).
+- Requisições bem-sucedidas e rápidas são registradas por amostragem
+  (LOG_SAMPLE_RATE, padrão 1%); erros 5xx e requisições mais lentas que
+  LOG_SLOW_MS sempre são registrados.
+
+Tracebacks só são formatados quando o registro é de fato emitido.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+LOG_SLOW_MS = float(os.environ.get('LOG_SLOW_MS', 1000))
+
+ROOT_LOGGER = 'photoleader'
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata o registro como um objeto JSON (campos extras em `fields`)"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Configura o logger raiz da aplicação (idempotente)"""
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    if not root.handlers:
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(JsonFormatter() if fmt == 'json'
+                             else logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        root.addHandler(handler)
+        root.propagate = False
+    return root
+
+
+def get_logger(name):
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+request_logger = get_logger('http')
+
+
+def log_request(route, method, status, seconds, sample_rate=None, slow_ms=None, **fields):
+    """Registra uma requisição: sempre se for 5xx ou lenta, senão com probabilidade `sample_rate`"""
+    sample_rate = LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    slow_ms = LOG_SLOW_MS if slow_ms is None else slow_ms
+    duration_ms = seconds * 1000
+    if status >= 500:
+        level = logging.ERROR
+    elif duration_ms >= slow_ms:
+        level = logging.WARNING
+    elif random.random() < sample_rate:
+        level = logging.INFO
+    else:
+        return
+    if request_logger.isEnabledFor(level):
+        request_logger.log(level, 'request', extra={'fields': dict(
+            fields, route=route, method=method, status=status, duration_ms=round(duration_ms, 2)
+        )})
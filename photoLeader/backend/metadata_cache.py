@@ -0,0 +1,206 @@
+"""
+Cache read-through dos metadados de fotos
+
+Os metadados de uma foto praticamente não mudam depois do upload, então a
+busca por ID e a primeira página das listagens mais acessadas ficam num
+cache LRU em memória, com tamanho máximo, TTL e contadores de hit/miss.
+
+A invalidação é feita por um change stream (`collection.watch()`) numa
+thread em background: qualquer insert/update/delete na collection remove a
+foto afetada e as primeiras páginas das listagens. Se o change stream cair,
+o cache passa a usar um TTL curto até o stream voltar.
+
+Os valores que entram no cache são lidos no PRIMARY (ver read_routing.py) e
+misses não são guardados, então uma escrita aparece na leitura seguinte à
+invalidação.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from logs import get_logger
+
+log = get_logger('cache')
+
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 2048))
+# TTL com o change stream ativo (segundos)
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 300))
+# TTL usado enquanto o change stream está fora do ar
+CACHE_FALLBACK_TTL = float(os.environ.get('CACHE_FALLBACK_TTL', 5))
+
+# Erros em que o resume token não serve mais (oplog já descartou o ponto)
+_RESUME_TOKEN_LOST_CODES = (280, 286)  # ChangeStreamFatalError, ChangeStreamHistoryLost
+
+_MISSING = object()
+
+
+class MetadataCache:
+    """Cache LRU com TTL e contadores, seguro para uso entre threads"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Muda a cada invalidação; evita guardar um valor lido antes dela
+        self._generation = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                stored_at, value = entry
+                if self._clock() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Retorna o valor em cache ou chama `loader()` e guarda o resultado.
+
+        None (foto não encontrada) não é guardado: a foto pode só não ter
+        chegado ainda ao membro lido, e o 404 ficaria no cache até o TTL.
+        """
+        generation = self._generation
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            if value is not None:
+                self.set(key, value, generation)
+        return value
+
+    async def get_or_load_async(self, key, loader):
+        """Versão de get_or_load para loaders assíncronos (modo ASGI)"""
+        generation = self._generation
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = await loader()
+            if value is not None:
+                self.set(key, value, generation)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def invalidate_kind(self, kind):
+        """Remove todas as entradas cuja chave começa com `kind`"""
+        with self._lock:
+            self._generation += 1
+            stale = [k for k in self._entries if k[0] == kind]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def photo_key(photo_id):
+    return ('photo', str(photo_id))
+
+
+def listing_key(*parts):
+    return ('list',) + parts
+
+
+def invalidate_photo(cache, photo_id):
+    """Invalida a foto e as primeiras páginas das listagens (que podem incluí-la)"""
+    cache.invalidate(photo_key(photo_id))
+    cache.invalidate_kind('list')
+
+
+class ChangeStreamInvalidator(threading.Thread):
+    """Thread que consome o change stream da collection e invalida o cache"""
+
+    def __init__(self, collection, cache, ttl=CACHE_TTL, fallback_ttl=CACHE_FALLBACK_TTL,
+                 retry_seconds=2.0):
+        super().__init__(name='cache-invalidator', daemon=True)
+        self.collection = collection
+        self.cache = cache
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.retry_seconds = retry_seconds
+        self.healthy = False
+        self._resume_token = None
+        self._stop_event = threading.Event()
+        self._set_healthy(False)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def handle_change(self, change):
+        self._resume_token = change.get('_id')
+        document_key = change.get('documentKey') or {}
+        if '_id' in document_key:
+            invalidate_photo(self.cache, document_key['_id'])
+        else:
+            # drop/rename/invalidate: não dá para saber o que mudou
+            self.cache.clear()
+
+    def _set_healthy(self, healthy):
+        self.healthy = healthy
+        self.cache.ttl = self.ttl if healthy else self.fallback_ttl
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                with self.collection.watch(resume_after=self._resume_token,
+                                           max_await_time_ms=1000) as stream:
+                    if self._resume_token is None:
+                        # Sem resume token, eventos anteriores podem ter sido perdidos
+                        self.cache.clear()
+                    self._set_healthy(True)
+                    while not self._stop_event.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            self.handle_change(change)
+            except OperationFailure as e:
+                log.warning(f"⚠️ Change stream do cache interrompido: {e}")
+                if e.code in _RESUME_TOKEN_LOST_CODES:
+                    self._resume_token = None
+            except PyMongoError as e:
+                log.warning(f"⚠️ Change stream do cache interrompido: {e}")
+            self._set_healthy(False)
+            self._stop_event.wait(self.retry_seconds)
@@ -0,0 +1,328 @@
+"""
+Métricas da API no formato texto do Prometheus (GET /api/metrics)
+
+- Requisições por rota (contagem e histograma de latência), com a rota no
+  formato do template (`/api/photos/<photo_id>`) para não explodir a
+  cardinalidade.
+- Latência dos comandos do MongoDB por comando e por servidor, coletada por
+  um CommandListener do pymongo, e estatísticas do pool de conexões por um
+  ConnectionPoolListener.
+- Bytes gravados/lidos no GridFS e contadores do cache de metadados.
+
+Implementação mínima e sem dependências (contadores e histogramas com lock).
+Cada processo tem os seus valores: com vários workers do uvicorn, o
+Prometheus deve coletar cada worker ou usar a soma das séries.
+"""
+
+import threading
+
+from pymongo import monitoring
+
+# Limites (segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """Conjunto de métricas e coletores renderizados em /api/metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func):
+        """Registra `func()` -> [(nome, tipo, ajuda, [(labels_dict, valor)])] lida na hora da coleta"""
+        self._collectors.append(func)
+        return func
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception:
+                continue
+            for name, kind, help_text, samples in families:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{_labels(self.label_names, label_values)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [contagens por faixa..., soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return series[-1] if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = (('le', _number(float(bound))),)
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}')
+            le = (('le', '+Inf'),)
+            lines.append(f'{self.name}_bucket{_labels(self.label_names, label_values, le)} {series[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, label_values)} {_number(series[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, label_values)} {series[-1]}')
+        return lines
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.register(Counter(
+    'photoleader_http_requests_total', 'Requisições HTTP por rota, método e status',
+    ('route', 'method', 'status')
+))
+http_latency = REGISTRY.register(Histogram(
+    'photoleader_http_request_duration_seconds', 'Latência das requisições HTTP por rota',
+    ('route', 'method')
+))
+mongo_commands = REGISTRY.register(Histogram(
+    'photoleader_mongo_command_duration_seconds', 'Latência dos comandos do MongoDB',
+    ('command', 'server')
+))
+mongo_failures = REGISTRY.register(Counter(
+    'photoleader_mongo_command_failures_total', 'Comandos do MongoDB que falharam',
+    ('command', 'server')
+))
+gridfs_bytes = REGISTRY.register(Counter(
+    'photoleader_gridfs_bytes_total', 'Bytes gravados (in) e lidos (out) no GridFS',
+    ('direction',)
+))
+
+
+def observe_request(route, method, status, seconds):
+    http_requests.inc(1, route, method, str(status))
+    http_latency.observe(seconds, route, method)
+
+
+def _server(connection_id):
+    host, port = connection_id
+    return f'{host}:{port}'
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Latência dos comandos por nome e servidor"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_commands.observe(event.duration_micros / 1e6, event.command_name, _server(event.connection_id))
+
+    def failed(self, event):
+        server = _server(event.connection_id)
+        mongo_commands.observe(event.duration_micros / 1e6, event.command_name, server)
+        mongo_failures.inc(1, event.command_name, server)
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Conexões abertas/em uso por servidor e falhas/espera de checkout"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _pool(self, address):
+        server = _server(address)
+        pool = self._pools.get(server)
+        if pool is None:
+            pool = self._pools[server] = {'open': 0, 'in_use': 0, 'checkouts': 0,
+                                          'checkout_failures': 0, 'wait_seconds': 0.0, 'cleared': 0}
+        return pool
+
+    def _update(self, address, field, delta):
+        with self._lock:
+            self._pool(address)[field] += delta
+
+    def pool_created(self, event):
+        self._update(event.address, 'open', 0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, 'cleared', 1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, 'open', 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, 'open', -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, 'checkout_failures', 1)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['in_use'] += 1
+            pool['checkouts'] += 1
+            pool['wait_seconds'] += getattr(event, 'duration', 0) or 0
+
+    def connection_checked_in(self, event):
+        self._update(event.address, 'in_use', -1)
+
+    def collect(self):
+        with self._lock:
+            pools = {server: dict(pool) for server, pool in self._pools.items()}
+        families = [
+            ('photoleader_mongo_pool_connections', 'gauge', 'Conexões abertas no pool', 'open'),
+            ('photoleader_mongo_pool_in_use', 'gauge', 'Conexões em uso (checked out)', 'in_use'),
+            ('photoleader_mongo_pool_checkouts_total', 'counter', 'Checkouts de conexão', 'checkouts'),
+            ('photoleader_mongo_pool_checkout_failures_total', 'counter', 'Checkouts que falharam',
+             'checkout_failures'),
+            ('photoleader_mongo_pool_wait_seconds_total', 'counter', 'Tempo total de espera por conexão',
+             'wait_seconds'),
+            ('photoleader_mongo_pool_cleared_total', 'counter', 'Vezes que o pool foi limpo', 'cleared'),
+        ]
+        return [(name, kind, help_text, [({'server': server}, pool[field]) for server, pool in sorted(pools.items())])
+                for name, kind, help_text, field in families]
+
+
+def cache_collector(cache):
+    """Coletor com os contadores do MetadataCache"""
+    def collect():
+        stats = cache().stats()
+        return [
+            ('photoleader_cache_hits_total', 'counter', 'Acertos do cache de metadados', [({}, stats['hits'])]),
+            ('photoleader_cache_misses_total', 'counter', 'Faltas do cache de metadados', [({}, stats['misses'])]),
+            ('photoleader_cache_hit_ratio', 'gauge', 'Taxa de acerto do cache', [({}, stats['hit_rate'])]),
+            ('photoleader_cache_entries', 'gauge', 'Entradas no cache', [({}, stats['entries'])]),
+            ('photoleader_cache_evictions_total', 'counter', 'Entradas despejadas por LRU/TTL',
+             [({}, stats['evictions'])]),
+            ('photoleader_cache_invalidations_total', 'counter', 'Entradas invalidadas', [({}, stats['invalidations'])]),
+        ]
+    return collect
+
+
+def admission_collector(controller):
+    """Coletor com o estado do controle de admissão das escritas"""
+    def collect():
+        stats = controller().stats()
+        return [
+            ('photoleader_admission_limit', 'gauge', 'Escritas simultâneas permitidas (limite adaptativo)',
+             [({}, stats['limit'])]),
+            ('photoleader_admission_active', 'gauge', 'Escritas em andamento', [({}, stats['active'])]),
+            ('photoleader_admission_queued', 'gauge', 'Escritas aguardando vaga', [({}, stats['queued'])]),
+            ('photoleader_admission_latency_seconds', 'gauge', 'Média móvel da latência do commit majority',
+             [({}, stats['latency_ms'] / 1000)]),
+            ('photoleader_admission_rejected_total', 'counter', 'Escritas recusadas pelo controle de admissão',
+             [({'status': str(status)}, count) for status, count in stats['rejected'].items()]),
+        ]
+    return collect
+
+
+def spool_collector(spool):
+    """Coletor com o atraso do spool de ingestão (INGEST_MODE=spool)"""
+    def collect():
+        stats = spool().stats()
+        return [
+            ('photoleader_spool_pending', 'gauge', 'Uploads no spool ainda não gravados no MongoDB',
+             [({}, stats['pending'])]),
+            ('photoleader_spool_pending_bytes', 'gauge', 'Bytes do spool ainda não gravados no MongoDB',
+             [({}, stats['pending_bytes'])]),
+            ('photoleader_spool_lag_seconds', 'gauge', 'Idade do upload mais antigo ainda não gravado',
+             [({}, stats['lag_seconds'])]),
+            ('photoleader_spool_committed_total', 'counter', 'Uploads do spool gravados no MongoDB',
+             [({}, stats['committed'] + stats['replayed'])]),
+            ('photoleader_spool_errors_total', 'counter', 'Falhas de commit de lotes do spool',
+             [({}, stats['errors'])]),
+            ('photoleader_spool_quarantined_total', 'counter', 'Registros do spool que não puderam ser gravados',
+             [({}, stats['quarantined'])]),
+        ]
+    return collect
+
+
+def tag_index_collector(index):
+    """Coletor com o tamanho do índice de tags em memória"""
+    def collect():
+        stats = index().stats()
+        return [
+            ('photoleader_tag_index_tags', 'gauge', 'Tags distintas no índice em memória', [({}, stats['tags'])]),
+            ('photoleader_tag_index_cached_prefixes', 'gauge', 'Prefixos com top-K guardado',
+             [({}, stats['cached_prefixes'])]),
+            ('photoleader_tag_index_ready', 'gauge', '1 quando o índice de tags já foi construído',
+             [({}, int(stats['ready']))]),
+        ]
+    return collect
@@ -0,0 +1,201 @@
+"""
+Migração dos bytes das fotos entre backends (ver blob_store.py)
+
+  python migrate_blobs.py --to fs                  # GridFS -> disco (BLOB_DIR)
+  python migrate_blobs.py --to gridfs              # disco -> GridFS
+  python migrate_blobs.py --to fs --limit 1000 --keep-source
+
+Para cada blob no backend de origem: copia os bytes para o destino
+(conferindo o SHA-256), troca a localização do blob e de todas as fotos que
+o referenciam numa única transação (majority) e só então apaga o arquivo de
+origem. A remoção espera MIGRATE_DELETE_DELAY segundos depois do commit:
+leituras roteadas para secondaries (maxStalenessSeconds, ver
+read_routing.py) ainda podem ver a localização antiga nesse intervalo.
+Fotos antigas sem `sha256` (anteriores à deduplicação) ganham um blob na
+mesma transação. Downloads continuam funcionando durante a migração: cada
+documento aponta para a origem até o commit.
+
+Pode ser interrompida e executada de novo. Uma cópia cujo commit não
+aconteceu (ou a origem, com --keep-source ou numa interrupção antes do fim
+da espera) fica sem referência e é recolhida pelo orphan_sweeper.py.
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+
+from pymongo import WriteConcern
+from pymongo.client_session import TransactionOptions
+
+from blob_store import STORE_FIELDS, locate, location
+from logs import get_logger
+
+log = get_logger('migrate')
+
+# Espera entre o commit da nova localização e a remoção da origem; deve passar
+# do maior max_staleness de READ_ROUTING (90 s por padrão) mais o heartbeat (10 s)
+MIGRATE_DELETE_DELAY = float(os.environ.get('MIGRATE_DELETE_DELAY', 120))
+
+# A troca de localização precisa estar na maioria antes de a espera começar
+_MAJORITY = TransactionOptions(write_concern=WriteConcern(w='majority'))
+
+
+class ChecksumMismatch(Exception):
+    """O conteúdo copiado não tem o SHA-256 do blob de origem"""
+
+
+def copy_blob(source, target, file_id, filename, expected_sha256=None):
+    """Copia um arquivo de `source` para `target`; retorna o dict de target.write"""
+    with source.open(file_id) as stream:
+        stored = target.write(stream, filename)
+    if expected_sha256 and stored['sha256'] != expected_sha256:
+        target.delete(stored['file_id'])
+        raise ChecksumMismatch(f"{file_id}: esperado {expected_sha256}, copiado {stored['sha256']}")
+    return stored
+
+
+def _relocate(new_location):
+    """Update que grava a nova localização e remove a dos outros backends"""
+    unset = {field: '' for field in STORE_FIELDS.values() if field not in new_location}
+    return {'$set': new_location, '$unset': unset}
+
+
+def migrate_blob(client, photos, blobs, blob, source, target):
+    """Move um blob (e as fotos que o referenciam); retorna False se ele mudou no meio do caminho"""
+    source_name, file_id = locate(blob)
+    stored = copy_blob(source, target, file_id, blob['_id'], expected_sha256=blob['_id'])
+    old_field = STORE_FIELDS[source_name]
+    update = _relocate(location(target.name, stored['file_id']))
+
+    def callback(s):
+        result = blobs.update_one({'_id': blob['_id'], old_field: file_id}, update, session=s)
+        if not result.matched_count:
+            return False
+        photos.update_many({'sha256': blob['_id'], old_field: file_id}, update, session=s)
+        return True
+
+    with client.start_session(default_transaction_options=_MAJORITY) as session:
+        moved = session.with_transaction(callback)
+    if moved:
+        return True
+    # Blob removido (ou já migrado) durante a cópia: descarta a cópia
+    target.delete(stored['file_id'])
+    return False
+
+
+def migrate_legacy_photo(client, photos, blobs, photo, source, target):
+    """Move o arquivo de uma foto sem `sha256`, criando (ou reaproveitando) o blob do conteúdo"""
+    source_name, file_id = locate(photo)
+    stored = copy_blob(source, target, file_id, photo.get('filename') or str(file_id))
+    old_field = STORE_FIELDS[source_name]
+    sha256 = stored['sha256']
+
+    def callback(s):
+        if not photos.find_one({'_id': photo['_id'], old_field: file_id}, {'_id': 1}, session=s):
+            return None
+        blobs.update_one({'_id': sha256}, {
+            '$setOnInsert': dict(location(target.name, stored['file_id']),
+                                 length=stored['length'], content_type=stored['content_type']),
+            '$inc': {'refcount': 1}
+        }, upsert=True, session=s)
+        blob_location = locate(blobs.find_one({'_id': sha256}, session=s))
+        update = _relocate(location(*blob_location))
+        update['$set']['sha256'] = sha256
+        photos.update_one({'_id': photo['_id']}, update, session=s)
+        return blob_location
+
+    with client.start_session(default_transaction_options=_MAJORITY) as session:
+        blob_location = session.with_transaction(callback)
+    if blob_location != (target.name, stored['file_id']):
+        # Conteúdo já tinha blob (ou a foto mudou): a cópia não é usada
+        target.delete(stored['file_id'])
+    return blob_location is not None
+
+
+class _PendingDeletes:
+    """Origens já migradas, apagadas só `delay` segundos depois do commit"""
+
+    def __init__(self, delay, clock=time.monotonic, sleep=time.sleep):
+        self.delay = delay
+        self.clock = clock
+        self.sleep = sleep
+        self._queue = deque()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def add(self, source, file_id, blob_id=None):
+        self._queue.append((self.clock() + self.delay, source, file_id, blob_id))
+        self.run()
+
+    def run(self, wait=False):
+        """Apaga as origens vencidas; com `wait`, espera e apaga todas"""
+        while self._queue and (wait or self._queue[0][0] <= self.clock()):
+            due, source, file_id, blob_id = self._queue.popleft()
+            self.sleep(max(0.0, due - self.clock()))
+            source.delete(file_id)
+            if blob_id is not None:
+                # Miniaturas ficam no backend do original; no destino são geradas de novo
+                source.delete_derivatives(blob_id)
+
+
+def migrate(client, photos, blobs, stores, to, limit=None, keep_source=False,
+            delete_delay=MIGRATE_DELETE_DELAY, clock=time.monotonic, sleep=time.sleep):
+    """Migra tudo que está fora de `stores[to]`; retorna os totais"""
+    pending = _PendingDeletes(delete_delay, clock, sleep)
+    totals = _migrate(client, photos, blobs, stores, to, limit, None if keep_source else pending)
+    if pending:
+        log.info(f"Aguardando {delete_delay:.0f}s para apagar a origem dos últimos arquivos migrados")
+    pending.run(wait=True)
+    return totals
+
+
+def _migrate(client, photos, blobs, stores, to, limit, pending):
+    target = stores[to]
+    totals = {'blobs': 0, 'photos': 0, 'skipped': 0, 'errors': 0}
+    remaining = limit
+
+    for source_name, source in stores.items():
+        if source_name == to:
+            continue
+        field = STORE_FIELDS[source_name]
+        jobs = [
+            ('blobs', blobs.find({field: {'$exists': True}}), migrate_blob),
+            ('photos', photos.find({'sha256': {'$exists': False}, field: {'$exists': True}},
+                                   {'filename': 1, field: 1}), migrate_legacy_photo),
+        ]
+        for kind, cursor, move in jobs:
+            for doc in cursor:
+                if remaining is not None and remaining <= 0:
+                    return totals
+                try:
+                    moved = move(client, photos, blobs, doc, source, target)
+                except Exception as e:
+                    log.warning(f"Erro ao migrar {kind} {doc['_id']}: {e}")
+                    totals['errors'] += 1
+                    continue
+                if not moved:
+                    totals['skipped'] += 1
+                    continue
+                totals[kind] += 1
+                if remaining is not None:
+                    remaining -= 1
+                if pending is not None:
+                    pending.add(source, doc[field], doc['_id'] if kind == 'blobs' else None)
+    return totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Migra os bytes das fotos entre GridFS e disco')
+    parser.add_argument('--to', choices=sorted(STORE_FIELDS), required=True, help='Backend de destino')
+    parser.add_argument('--limit', type=int, default=None, help='Máximo de blobs/fotos migrados')
+    parser.add_argument('--keep-source', action='store_true',
+                        help='Não apaga a origem (fica para o orphan_sweeper)')
+    args = parser.parse_args()
+
+    import api
+
+    api.ensure_indexes()
+    print(migrate(api.client, api.collection, api.blobs, api.blob_stores, args.to,
+                  limit=args.limit, keep_source=args.keep_source))
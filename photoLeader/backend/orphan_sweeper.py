@@ -0,0 +1,212 @@
+"""
+Limpeza de arquivos órfãos do GridFS (e do backend em disco)
+
+Com o commit transacional (photo_commit.py) uma foto nunca fica visível sem
+arquivo, mas um arquivo do GridFS pode sobrar sem ninguém que o referencie
+quando o processo cai entre as etapas:
+
+- upload: chunks e fs.files gravados, transação de commit não executada;
+- remoção: transação executada, GridFS ainda não apagado;
+- GridFS interrompido no meio da gravação: chunks sem fs.files.
+
+A cada ORPHAN_SWEEP_INTERVAL segundos (0 desliga) uma thread procura, em
+lotes de ORPHAN_SWEEP_BATCH, arquivos mais antigos que ORPHAN_GRACE_SECONDS
+(uploads em andamento não são tocados) que não são referenciados por
+nenhum blob nem por nenhuma foto (fotos antigas, sem `sha256`), e chunks
+cujo fs.files não existe. O `_id` do GridFS é um ObjectId, então a idade
+vem do próprio id.
+
+Com o backend em disco (blob_store.FileSystemStore) também são removidos os
+arquivos antigos de BLOB_DIR que nenhum blob/foto referencia em
+`storage_path` (a idade vem do ObjectId no nome do arquivo) e temporários
+de gravações interrompidas.
+
+Com INGEST_MODE=spool os arquivos citados pelo spool local (uploads cujos
+metadados ainda não foram drenados) nunca são removidos, qualquer que seja
+o atraso da drenagem (`protected`, lido a cada passada).
+
+Com vários workers só um varre: cada passada começa pelo lease
+`orphan_sweeper` (leases.py); os outros pulam a passada enquanto o dono o
+renova.
+
+Uso avulso:
+
+  python orphan_sweeper.py            # uma passada, imprime os totais
+"""
+
+import itertools
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from logs import get_logger
+
+ORPHAN_SWEEP_INTERVAL = float(os.environ.get('ORPHAN_SWEEP_INTERVAL', 600))
+ORPHAN_SWEEP_BATCH = int(os.environ.get('ORPHAN_SWEEP_BATCH', 500))
+ORPHAN_GRACE_SECONDS = float(os.environ.get('ORPHAN_GRACE_SECONDS', 3600))
+# Nome do lease que escolhe o worker que varre
+SWEEPER_LEASE = 'orphan_sweeper'
+
+# Chunks examinados por passada na busca por chunks sem fs.files
+CHUNK_SCAN_LIMIT = 20000
+
+# Índices para os $lookup/consultas da varredura
+SWEEPER_INDEXES = [[('gridfs_id', 1)], [('storage_path', 1)]]
+
+log = get_logger('sweeper')
+
+
+def grace_cutoff(grace_seconds=ORPHAN_GRACE_SECONDS, now=None):
+    """ObjectId limite: arquivos com _id menor são antigos o bastante para serem varridos"""
+    now = now or datetime.now(timezone.utc)
+    return ObjectId.from_datetime(now - timedelta(seconds=grace_seconds))
+
+
+def orphan_files_pipeline(cutoff, blobs_name, photos_name, batch, exclude=()):
+    """fs.files antigos sem blob nem foto que apontem para eles (fora os de `exclude`)"""
+    match = {'$lt': cutoff}
+    if exclude:
+        match['$nin'] = list(exclude)
+    return [
+        {'$match': {'_id': match}},
+        {'$lookup': {'from': blobs_name, 'localField': '_id', 'foreignField': 'gridfs_id',
+                     'pipeline': [{'$project': {'_id': 1}}, {'$limit': 1}], 'as': 'blob'}},
+        {'$match': {'blob': []}},
+        {'$lookup': {'from': photos_name, 'localField': '_id', 'foreignField': 'gridfs_id',
+                     'pipeline': [{'$project': {'_id': 1}}, {'$limit': 1}], 'as': 'photo'}},
+        {'$match': {'photo': []}},
+        {'$limit': batch},
+        {'$project': {'_id': 1}}
+    ]
+
+
+def orphan_chunks_pipeline(cutoff, start, files_name, scan_limit):
+    """files_id (a partir de `start`) de chunks antigos cujo fs.files não existe"""
+    match = {'files_id': {'$lt': cutoff}}
+    if start is not None:
+        match['files_id']['$gt'] = start
+    return [
+        {'$match': match},
+        {'$sort': {'files_id': 1}},
+        {'$limit': scan_limit},
+        {'$group': {'_id': '$files_id', 'chunks': {'$sum': 1}}},
+        {'$sort': {'_id': 1}},
+        {'$lookup': {'from': files_name, 'localField': '_id', 'foreignField': '_id',
+                     'pipeline': [{'$project': {'_id': 1}}], 'as': 'file'}},
+        {'$project': {'chunks': 1, 'orphan': {'$eq': ['$file', []]}}}
+    ]
+
+
+class OrphanSweeper(threading.Thread):
+    """Thread que remove, em lotes, arquivos e chunks órfãos do GridFS"""
+
+    def __init__(self, db, photos, blobs, bucket_name='fs', fs_store=None, interval=ORPHAN_SWEEP_INTERVAL,
+                 batch=ORPHAN_SWEEP_BATCH, grace_seconds=ORPHAN_GRACE_SECONDS, protected=None, lease=None):
+        super().__init__(name='orphan-sweeper', daemon=True)
+        self.files = db[f'{bucket_name}.files']
+        self.chunks = db[f'{bucket_name}.chunks']
+        self.photos = photos
+        self.blobs = blobs
+        self.fs_store = fs_store
+        self.interval = interval
+        self.batch = batch
+        self.grace_seconds = grace_seconds
+        # Função que devolve os (backend, file_id) que não podem ser removidos (spool ainda não drenado)
+        self.protected = protected
+        # leases.Lease: só o processo dono varre (None: varre sempre)
+        self.lease = lease
+        self.totals = {'files': 0, 'chunk_groups': 0, 'local_files': 0, 'passes': 0}
+        self._chunk_cursor = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.lease is not None:
+            try:
+                self.lease.release()
+            except Exception as e:
+                log.warning(f"Erro ao soltar o lease da limpeza de órfãos: {e}")
+
+    def _delete_files(self, file_ids):
+        # Chunks primeiro: se cair no meio, o fs.files restante é achado na próxima passada
+        self.chunks.delete_many({'files_id': {'$in': file_ids}})
+        self.files.delete_many({'_id': {'$in': file_ids}})
+
+    def sweep_files(self, cutoff, exclude=()):
+        """Remove fs.files (e chunks) órfãos, fora os de `exclude`; retorna quantos"""
+        removed = 0
+        while not self._stop_event.is_set():
+            pipeline = orphan_files_pipeline(cutoff, self.blobs.name, self.photos.name, self.batch, exclude)
+            file_ids = [doc['_id'] for doc in self.files.aggregate(pipeline)]
+            if not file_ids:
+                break
+            self._delete_files(file_ids)
+            removed += len(file_ids)
+            if len(file_ids) < self.batch:
+                break
+        return removed
+
+    def sweep_chunks(self, cutoff):
+        """Remove chunks sem fs.files numa janela de CHUNK_SCAN_LIMIT chunks; retorna quantos arquivos"""
+        groups = list(self.chunks.aggregate(
+            orphan_chunks_pipeline(cutoff, self._chunk_cursor, self.files.name, CHUNK_SCAN_LIMIT)
+        ))
+        orphans = [group['_id'] for group in groups if group['orphan']]
+        for start in range(0, len(orphans), self.batch):
+            self.chunks.delete_many({'files_id': {'$in': orphans[start:start + self.batch]}})
+        # A janela avança pelos files_id; ao chegar ao fim recomeça do início
+        scanned = sum(group['chunks'] for group in groups)
+        self._chunk_cursor = groups[-1]['_id'] if scanned >= CHUNK_SCAN_LIMIT else None
+        return len(orphans)
+
+    def sweep_local_files(self, cutoff, exclude=frozenset()):
+        """Remove arquivos do backend em disco sem blob nem foto, fora os de `exclude`; retorna quantos"""
+        if self.fs_store is None:
+            return 0
+        removed = 0
+        keys = self.fs_store.old_keys(cutoff)
+        while not self._stop_event.is_set():
+            batch = list(itertools.islice(keys, self.batch))
+            if not batch:
+                break
+            query = {'storage_path': {'$in': batch}}
+            referenced = {doc['storage_path'] for doc in self.blobs.find(query, {'storage_path': 1})}
+            referenced.update(doc['storage_path'] for doc in self.photos.find(query, {'storage_path': 1}))
+            for key in batch:
+                if key not in referenced and key not in exclude:
+                    self.fs_store.delete(key)
+                    removed += 1
+        return removed
+
+    def sweep_once(self):
+        cutoff = grace_cutoff(self.grace_seconds)
+        protected = self.protected() if self.protected is not None else set()
+        result = {'files': self.sweep_files(cutoff, [fid for store, fid in protected if store == 'gridfs']),
+                  'chunk_groups': self.sweep_chunks(cutoff),
+                  'local_files': self.sweep_local_files(cutoff, {fid for store, fid in protected if store == 'fs'})}
+        for key, count in result.items():
+            self.totals[key] += count
+        self.totals['passes'] += 1
+        if any(result.values()):
+            log.info('Órfãos do GridFS removidos', extra={'fields': result})
+        return result
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if self.lease is not None and not self.lease.acquire():
+                    continue  # Outro worker está varrendo
+                self.sweep_once()
+            except Exception as e:
+                log.warning(f"Erro na limpeza de órfãos do GridFS: {e}")
+
+
+if __name__ == '__main__':
+    import api
+
+    api.ensure_indexes()
+    sweeper = OrphanSweeper(api.db, api.collection, api.blobs, fs_store=api.blob_stores['fs'],
+                            protected=api.spool_pending_files)
+    print(sweeper.sweep_once())
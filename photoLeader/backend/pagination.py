@@ -0,0 +1,179 @@
+"""
+Paginação por cursor (keyset) para as listagens de fotos
+
+As listagens são ordenadas por (upload_date, _id) decrescente. Em vez de
+`skip`, o cliente recebe um `next_cursor` opaco com a chave do último item
+da página; a próxima página começa logo depois dessa chave, usando o índice
+composto, então qualquer página custa o mesmo que a primeira.
+
+O mesmo keyset dá os vizinhos de uma foto (GET /api/photos/<id>/neighbors):
+as N anteriores e as N seguintes na ordenação são duas consultas pelo
+índice, a partir da chave da própria foto, sem percorrer a listagem.
+
+No sentido contrário (mais antigas primeiro), `iter_oldest_first` percorre
+todas as fotos de uma consulta em páginas curtas (export em ZIP).
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Ordenação estável das listagens (desempate pelo _id)
+LISTING_SORT = [('upload_date', -1), ('_id', -1)]
+# Mesmo índice percorrido no sentido contrário (fotos anteriores na listagem)
+REVERSE_SORT = [('upload_date', 1), ('_id', 1)]
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+DEFAULT_NEIGHBORS = 1
+MAX_NEIGHBORS = 20
+
+
+class InvalidCursor(ValueError):
+    """Cursor de paginação malformado"""
+
+
+class InvalidPageSize(ValueError):
+    """Parâmetro `limit` que não é um inteiro"""
+
+
+class InvalidIds(ValueError):
+    """Lista de IDs (`ids=`) vazia, grande demais ou com ID malformado"""
+
+
+def encode_cursor(doc):
+    """Gera o cursor opaco a partir do upload_date e _id de um documento"""
+    payload = {'d': doc['upload_date'].isoformat(), 'i': str(doc['_id'])}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decodifica o cursor, retornando (upload_date, _id)"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        return datetime.fromisoformat(payload['d']), ObjectId(payload['i'])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidCursor('Cursor inválido') from e
+
+
+def after_cursor(query, token):
+    """Restringe `query` aos documentos que vêm depois do cursor na ordenação"""
+    if not token:
+        return query
+    upload_date, last_id = decode_cursor(token)
+    return _restrict(query, _keyset(upload_date, last_id, '$lt'))
+
+
+def _keyset(upload_date, _id, op):
+    """Documentos depois ('$lt') ou antes ('$gt') da chave (upload_date, _id) na ordenação"""
+    return {'$or': [
+        {'upload_date': {op: upload_date}},
+        {'upload_date': upload_date, '_id': {op: _id}}
+    ]}
+
+
+def _restrict(query, keyset):
+    if not query:
+        return keyset
+    return {'$and': [query, keyset]}
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Converte o parâmetro `limit`, limitado a MAX_PAGE_SIZE"""
+    try:
+        limit = int(value) if value else default
+    except ValueError:
+        raise InvalidPageSize('limit deve ser um número inteiro')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def parse_neighbor_count(value):
+    """Converte o parâmetro `n` dos vizinhos, limitado a MAX_NEIGHBORS"""
+    count = int(value) if value else DEFAULT_NEIGHBORS
+    return max(1, min(count, MAX_NEIGHBORS))
+
+
+def parse_ids(value, limit=MAX_PAGE_SIZE):
+    """Converte `ids=a,b,c` em ObjectIds (sem repetidos, na ordem pedida)"""
+    raw = [part.strip() for part in (value or '').split(',') if part.strip()]
+    if not raw:
+        raise InvalidIds('Informe os IDs em `ids`')
+    if len(raw) > limit:
+        raise InvalidIds(f'Máximo de {limit} IDs por requisição')
+    try:
+        return list(dict.fromkeys(ObjectId(part) for part in raw))
+    except InvalidId as e:
+        raise InvalidIds(f'ID inválido em `ids`: {e}') from e
+
+
+def neighbor_queries(query, anchor):
+    """Filtros e ordenações das fotos antes e depois de `anchor` (documento com upload_date e _id).
+
+    Retorna ((filtro, ordenação) das anteriores, (filtro, ordenação) das
+    seguintes); nas duas, a primeira foto devolvida é a mais próxima.
+    """
+    key = (anchor['upload_date'], anchor['_id'])
+    return ((_restrict(query, _keyset(*key, '$gt')), REVERSE_SORT),
+            (_restrict(query, _keyset(*key, '$lt')), LISTING_SORT))
+
+
+def fetch_neighbors(collection, anchor, count, query=None, projection=None, session=None, max_time_ms=None):
+    """Busca até `count` fotos antes e depois de `anchor`; retorna (anteriores, seguintes)"""
+    options = {'session': session} if session is not None else {}
+    results = []
+    for where, sort in neighbor_queries(query, anchor):
+        find = collection.find(where, projection, **options).sort(sort).limit(count)
+        if max_time_ms:
+            find = find.max_time_ms(max_time_ms)
+        results.append(list(find))
+    return tuple(results)
+
+
+def fetch_page(collection, query, limit, cursor=None, projection=None, skip=0, session=None,
+               max_time_ms=None):
+    """Busca uma página da listagem.
+
+    Retorna (documentos, next_cursor); next_cursor é None na última página.
+    """
+    options = {'session': session} if session is not None else {}
+    find = collection.find(after_cursor(query, cursor), projection, **options).sort(LISTING_SORT)
+    if skip:
+        find = find.skip(skip)
+    if max_time_ms:
+        find = find.max_time_ms(max_time_ms)
+    # Um documento a mais indica se existe próxima página
+    return split_page(list(find.limit(limit + 1)), limit)
+
+
+def iter_oldest_first(collection, query, projection=None, offset=0, page_size=DEFAULT_PAGE_SIZE):
+    """Percorre os documentos de `query` do mais antigo ao mais novo, em páginas pelo keyset.
+
+    Só a primeira página usa `skip(offset)`; as seguintes começam depois da
+    chave do último documento, então nenhum cursor fica aberto enquanto quem
+    consome demora (ex.: export de arquivos grandes). Fotos novas entram no
+    fim, então o `offset` de uma retomada continua válido.
+    """
+    where, skip = query, offset
+    while True:
+        find = collection.find(where, projection).sort(REVERSE_SORT)
+        if skip:
+            find = find.skip(skip)
+        page = list(find.limit(page_size))
+        yield from page
+        if len(page) < page_size:
+            return
+        where, skip = _restrict(query, _keyset(page[-1]['upload_date'], page[-1]['_id'], '$gt')), 0
+
+
+def split_page(docs, limit):
+    """Recebe até limit + 1 documentos e retorna (página, next_cursor)"""
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1])
+    return docs, None
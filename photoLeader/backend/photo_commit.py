@@ -0,0 +1,128 @@
+"""
+Commit de uploads e remoções numa única transação
+
+O documento em `files` é o que torna uma foto visível. Ele é inserido na
+mesma transação que conta a referência ao blob (dedup.py), então o commit
+de um upload é uma única confirmação majority, seja de uma foto ou de um
+lote inteiro:
+
+    bytes (GridFS ou disco, antes)  ->  transação {blobs $inc/upsert, files insert, stats $inc}
+
+A remoção faz o inverso: {files find_one_and_delete, blobs $inc -1 (e delete
+na última referência), stats $inc -1} numa transação, e só depois apaga o
+arquivo. Os contadores de /api/stats (stats_counters.py) mudam junto com a
+foto, então uma falha entre as duas escritas não os deixa errados. Todo
+commit incrementa o documento `global`; transações concorrentes conflitam
+nele e o with_transaction as repete (TransientTransactionError). Se o
+processo cair entre a gravação dos bytes e o commit (ou entre o commit da
+remoção e a limpeza), o arquivo fica sem blob que o referencie e é
+recolhido pelo orphan_sweeper.py.
+"""
+
+from blob_store import STORE_FIELDS, locate, location
+from dedup import blob_reference_ops, release_blob, release_blob_async, surplus_files
+from stats_counters import counter_updates
+
+
+class BlobGone(Exception):
+    """Um blob reaproveitado foi removido entre a leitura e o commit; o conteúdo precisa ser regravado"""
+
+    def __init__(self, sha256s):
+        super().__init__(f"Blob removido durante o upload: {', '.join(sorted(sha256s))}")
+        self.sha256s = set(sha256s)
+
+
+# Campos lidos dos blobs no commit
+_LOCATION_PROJECTION = {field: 1 for field in STORE_FIELDS.values()}
+
+
+def _link_blobs(entries, blobs_found):
+    locations = {blob['_id']: locate(blob) for blob in blobs_found}
+    missing = {stored['sha256'] for _, stored in entries} - set(locations)
+    if missing:
+        raise BlobGone(missing)
+    for doc, stored in entries:
+        for field in STORE_FIELDS.values():
+            doc.pop(field, None)
+        doc.update(location(*locations[stored['sha256']]))
+    return locations
+
+
+def _photo_counters(photos, sign):
+    return [op for photo in photos for op in counter_updates(photo, sign)]
+
+
+def commit_photos(session, collection, blobs, entries, stats=None):
+    """Insere as fotos e conta as referências aos blobs (e os contadores em `stats`) numa transação.
+
+    `entries` é uma lista de (photo_doc, stored), com `stored` vindo de
+    store_deduplicated. A localização dos bytes (`gridfs_id`/`storage_path`)
+    de cada documento passa a ser a do blob, que pode ser de outro upload do
+    mesmo conteúdo. Retorna os (backend, arquivo) gravados que sobraram e
+    podem ser removidos.
+    """
+    stored_files = [stored for _, stored in entries]
+
+    def callback(s):
+        blobs.bulk_write(blob_reference_ops(stored_files), ordered=True, session=s)
+        found = blobs.find({'_id': {'$in': [stored['sha256'] for stored in stored_files]}},
+                           _LOCATION_PROJECTION, session=s)
+        locations = _link_blobs(entries, found)
+        collection.insert_many([doc for doc, _ in entries], session=s)
+        if stats is not None:
+            stats.bulk_write(_photo_counters([doc for doc, _ in entries], 1), ordered=False, session=s)
+        return locations
+
+    return surplus_files(stored_files, session.with_transaction(callback))
+
+
+def remove_photo(session, collection, blobs, query, stats=None):
+    """Remove a foto e solta a referência ao blob (e os contadores em `stats`) numa transação.
+
+    Retorna (foto removida ou None, (backend, arquivo) a apagar ou None).
+    """
+    def callback(s):
+        photo = collection.find_one_and_delete(query, session=s)
+        if not photo:
+            return None, None
+        if stats is not None:
+            stats.bulk_write(_photo_counters([photo], -1), ordered=False, session=s)
+        if 'sha256' in photo:
+            return photo, release_blob(blobs, photo['sha256'], session=s)
+        store, file_id = locate(photo)
+        return photo, (store, file_id) if store else None
+
+    return session.with_transaction(callback)
+
+
+# ---------- Versões assíncronas (modo ASGI, AsyncMongoClient) ----------
+
+async def commit_photos_async(session, collection, blobs, entries, stats=None):
+    stored_files = [stored for _, stored in entries]
+
+    async def callback(s):
+        await blobs.bulk_write(blob_reference_ops(stored_files), ordered=True, session=s)
+        cursor = blobs.find({'_id': {'$in': [stored['sha256'] for stored in stored_files]}},
+                            _LOCATION_PROJECTION, session=s)
+        locations = _link_blobs(entries, await cursor.to_list(None))
+        await collection.insert_many([doc for doc, _ in entries], session=s)
+        if stats is not None:
+            await stats.bulk_write(_photo_counters([doc for doc, _ in entries], 1), ordered=False, session=s)
+        return locations
+
+    return surplus_files(stored_files, await session.with_transaction(callback))
+
+
+async def remove_photo_async(session, collection, blobs, query, stats=None):
+    async def callback(s):
+        photo = await collection.find_one_and_delete(query, session=s)
+        if not photo:
+            return None, None
+        if stats is not None:
+            await stats.bulk_write(_photo_counters([photo], -1), ordered=False, session=s)
+        if 'sha256' in photo:
+            return photo, await release_blob_async(blobs, photo['sha256'], session=s)
+        store, file_id = locate(photo)
+        return photo, (store, file_id) if store else None
+
+    return await session.with_transaction(callback)
@@ -0,0 +1,210 @@
+"""
+Política de roteamento de leituras por classe de endpoint
+
+Cada classe de leitura da API tem sua própria read preference:
+
+- listing: GET /api/photos, /api/photos/user/<u>, /api/photos/tag/<t>,
+           /api/photos/<id>/neighbors
+- detail:  GET /api/photos/<id>, /api/photos/batch?ids=
+- search:  GET /api/search
+- file:    GET /api/photos/<id>/file (documento + chunks do GridFS)
+
+Por padrão todas usam secondaryPreferred com maxStalenessSeconds=90, o que
+tira as leituras do PRIMARY e ainda descarta secondaries muito atrasados.
+Leituras pontuais (detail/file) que não encontram o documento fora do
+PRIMARY são repetidas no PRIMARY, então uma foto recém-enviada que ainda não
+chegou ao secondary escolhido não vira 404.
+
+Leituras com sessão causal (token de read-your-writes, ver causal.py)
+esperam até CAUSAL_WAIT_MS o membro escolhido alcançar o token; se ele não
+alcançar a tempo, a leitura vai para o PRIMARY.
+
+Leituras que vão preencher o cache de metadados (`primary=True`) são feitas
+no PRIMARY: um secondary atrasado devolveria o valor de antes da escrita que
+acabou de invalidar a entrada, e ele ficaria no cache até o TTL.
+
+Configuração pela variável READ_ROUTING (JSON), por classe:
+
+  READ_ROUTING='{"listing": {"mode": "nearest", "tags": [{"dc": "lab"}, {}]},
+                 "detail": "primaryPreferred",
+                 "search": {"mode": "secondary", "max_staleness": 120, "hedge": true}}'
+
+`localThresholdMS` vale para o cliente inteiro (não por leitura) e vem de
+READ_LOCAL_THRESHOLD_MS. Hedged reads estão obsoletas a partir do MongoDB 8.0
+(o pymongo emite DeprecationWarning), por isso ficam desligadas por padrão.
+"""
+
+import json
+import os
+
+from pymongo.errors import ExecutionTimeout
+from pymongo.read_preferences import (Nearest, Primary, PrimaryPreferred, ReadPreference,
+                                      Secondary, SecondaryPreferred)
+
+from causal import CAUSAL_WAIT_MS
+from pagination import fetch_neighbors, fetch_page
+
+READ_CLASSES = ('listing', 'detail', 'search', 'file')
+
+DEFAULT_POLICY = {'mode': 'secondaryPreferred', 'max_staleness': 90}
+
+# Janela de latência (ms) entre o membro mais rápido e os demais elegíveis
+LOCAL_THRESHOLD_MS = int(os.environ.get('READ_LOCAL_THRESHOLD_MS', 15))
+
+# maxStalenessSeconds mínimo aceito pelo servidor
+MIN_MAX_STALENESS = 90
+
+_MODES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest
+}
+
+
+class InvalidReadPolicy(ValueError):
+    """Política de leitura mal configurada em READ_ROUTING"""
+
+
+def build_read_preference(policy):
+    """Converte uma política ({'mode', 'tags', 'max_staleness', 'hedge'}) em read preference"""
+    mode = policy.get('mode', 'primary')
+    if mode not in _MODES:
+        raise InvalidReadPolicy(f"Modo de leitura desconhecido: {mode}")
+    if mode == 'primary':
+        if policy.get('tags') or policy.get('max_staleness') or policy.get('hedge'):
+            raise InvalidReadPolicy("O modo primary não aceita tags, max_staleness nem hedge")
+        return Primary()
+
+    kwargs = {}
+    if policy.get('tags'):
+        kwargs['tag_sets'] = policy['tags']
+    max_staleness = policy.get('max_staleness')
+    if max_staleness is not None and max_staleness != -1:
+        if max_staleness < MIN_MAX_STALENESS:
+            raise InvalidReadPolicy(f"max_staleness deve ser >= {MIN_MAX_STALENESS} segundos")
+        kwargs['max_staleness'] = int(max_staleness)
+    if policy.get('hedge'):
+        kwargs['hedge'] = {'enabled': True}
+    return _MODES[mode](**kwargs)
+
+
+def load_policies(raw=None):
+    """Políticas por classe: DEFAULT_POLICY sobrescrito pelo JSON de READ_ROUTING"""
+    if raw is None:
+        raw = os.environ.get('READ_ROUTING')
+    policies = {kind: dict(DEFAULT_POLICY) for kind in READ_CLASSES}
+    if raw:
+        try:
+            overrides = json.loads(raw)
+        except ValueError as e:
+            raise InvalidReadPolicy(f"READ_ROUTING não é um JSON válido: {e}")
+        for kind, policy in overrides.items():
+            if kind not in READ_CLASSES:
+                raise InvalidReadPolicy(f"Classe de leitura desconhecida: {kind}")
+            policies[kind] = {'mode': policy} if isinstance(policy, str) else dict(policy)
+    return policies
+
+
+class ReadRouter:
+    """Aplica a read preference de cada classe de endpoint às collections"""
+
+    def __init__(self, policies=None):
+        self.policies = policies if policies is not None else load_policies()
+        self._preferences = {kind: build_read_preference(policy)
+                             for kind, policy in self.policies.items()}
+
+    def preference(self, kind):
+        return self._preferences[kind]
+
+    def reads_primary(self, kind):
+        return isinstance(self._preferences[kind], Primary)
+
+    def collection(self, coll, kind):
+        """A collection com a read preference da classe `kind`"""
+        return coll.with_options(read_preference=self._preferences[kind])
+
+    @staticmethod
+    def primary(coll):
+        return coll.with_options(read_preference=ReadPreference.PRIMARY)
+
+    def read(self, coll, kind, session, read, primary=False):
+        """Executa read(collection, opções) com a política da classe.
+
+        Com sessão causal o membro tem CAUSAL_WAIT_MS para alcançar o token;
+        se estourar, a leitura é refeita no PRIMARY (sempre atualizado).
+        `primary=True` (preenchimento do cache) lê direto no PRIMARY.
+        """
+        if primary:
+            return read(self.primary(coll), {})
+        if session is None:
+            return read(self.collection(coll, kind), {})
+        try:
+            return read(self.collection(coll, kind), {'session': session, 'max_time_ms': CAUSAL_WAIT_MS})
+        except ExecutionTimeout:
+            return read(self.primary(coll), {})
+
+    async def read_async(self, coll, kind, session, read, primary=False):
+        """Versão de read para AsyncCollection (`read` retorna um awaitable)"""
+        if primary:
+            return await read(self.primary(coll), {})
+        if session is None:
+            return await read(self.collection(coll, kind), {})
+        try:
+            return await read(self.collection(coll, kind), {'session': session, 'max_time_ms': CAUSAL_WAIT_MS})
+        except ExecutionTimeout:
+            return await read(self.primary(coll), {})
+
+    def find_one(self, coll, kind, query, projection=None, session=None, primary=False):
+        """find_one com a política da classe; um documento ausente fora do PRIMARY é relido no PRIMARY"""
+        doc = self.read(coll, kind, session, lambda c, options: c.find_one(query, projection, **options), primary)
+        if doc is None and not (primary or self.reads_primary(kind)):
+            doc = coll.with_options(read_preference=ReadPreference.PRIMARY).find_one(query, projection)
+        return doc
+
+    async def find_one_async(self, coll, kind, query, projection=None, session=None, primary=False):
+        """Versão para AsyncCollection de find_one"""
+        doc = await self.read_async(coll, kind, session,
+                                     lambda c, options: c.find_one(query, projection, **options), primary)
+        if doc is None and not (primary or self.reads_primary(kind)):
+            doc = await coll.with_options(read_preference=ReadPreference.PRIMARY).find_one(query, projection)
+        return doc
+
+    def find_ids(self, coll, kind, ids, projection=None, session=None):
+        """Documentos com `_id` em `ids` numa consulta $in; os ausentes fora do PRIMARY são relidos no PRIMARY"""
+        docs = self.read(coll, kind, session,
+                         lambda c, options: list(c.find({'_id': {'$in': ids}}, projection, **options)))
+        missing = set(ids) - {doc['_id'] for doc in docs}
+        if missing and not self.reads_primary(kind):
+            primary = coll.with_options(read_preference=ReadPreference.PRIMARY)
+            docs.extend(primary.find({'_id': {'$in': list(missing)}}, projection))
+        return docs
+
+    async def find_ids_async(self, coll, kind, ids, projection=None, session=None):
+        """Versão para AsyncCollection de find_ids"""
+        docs = await self.read_async(coll, kind, session, lambda c, options: c.find(
+            {'_id': {'$in': ids}}, projection, **options
+        ).to_list(None))
+        missing = set(ids) - {doc['_id'] for doc in docs}
+        if missing and not self.reads_primary(kind):
+            primary = coll.with_options(read_preference=ReadPreference.PRIMARY)
+            docs.extend(await primary.find({'_id': {'$in': list(missing)}}, projection).to_list(None))
+        return docs
+
+    def fetch_neighbors(self, coll, kind, anchor, count, query=None, projection=None, session=None):
+        """pagination.fetch_neighbors com a política da classe"""
+        return self.read(coll, kind, session, lambda c, options: fetch_neighbors(
+            c, anchor, count, query, projection, **options
+        ))
+
+    def fetch_page(self, coll, kind, query, limit, cursor=None, projection=None, skip=0, session=None,
+                   primary=False):
+        """pagination.fetch_page com a política da classe (e a sessão causal, se houver)"""
+        return self.read(coll, kind, session, lambda c, options: fetch_page(
+            c, query, limit, cursor, projection, skip=skip, **options
+        ), primary)
+
+    def describe(self):
+        """Políticas efetivas, no formato do documento $readPreference"""
+        return {kind: dict(pref.document) for kind, pref in self._preferences.items()}
@@ -0,0 +1,176 @@
+"""Busca por substring indexada (trigramas) para /api/search.
+
+Cada foto guarda em `search_grams` os trigramas normalizados (minúsculas,
+sem acentos) do filename e da description. A busca exige que a foto tenha
+todos os trigramas do texto pesquisado (`$all`, servido pelo índice
+multikey) e depois confirma a substring em Python, descartando os falsos
+positivos. O texto do usuário nunca é interpretado como regex.
+
+O índice é varrido pelo primeiro trigrama do `$all`, então os trigramas vão
+do mais raro para o mais comum: a frequência vem de uma amostra ($sample de
+SEARCH_GRAM_SAMPLE fotos, refeita a cada SEARCH_GRAM_SAMPLE_TTL segundos) e
+os empates deixam para o fim os trigramas com espaço e os de STOP_GRAMS. Em
+'lua e', por exemplo, ' e ' aparece em quase toda descrição e 'lua' em
+poucas: começar por 'lua' examina só as fotos que podem casar.
+
+Os trigramas são gravados junto com o documento no upload e somem com ele
+no delete. Para fotos antigas:
+  python search_index.py backfill [--uri MONGO_URI]
+"""
+
+import argparse
+import os
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from pymongo import MongoClient, UpdateOne
+
+from logs import get_logger
+
+MIN_QUERY_LENGTH = 3
+SEARCH_FIELDS = ('filename', 'description')
+
+# Índice multikey dos trigramas + ordenação da listagem (upload_date, _id)
+SEARCH_INDEXES = [
+    [('search_grams', 1), ('upload_date', -1), ('_id', -1)],
+]
+
+# Fotos amostradas para estimar a frequência dos trigramas, e a validade da amostra (segundos)
+SEARCH_GRAM_SAMPLE = int(os.environ.get('SEARCH_GRAM_SAMPLE', 1000))
+SEARCH_GRAM_SAMPLE_TTL = float(os.environ.get('SEARCH_GRAM_SAMPLE_TTL', 600))
+
+# Trigramas comuns em qualquer acervo (câmeras, extensões, numeração, palavras curtas)
+STOP_GRAMS = frozenset({
+    'img', 'mg_', 'dsc', 'sc_', 'jpg', '.jp', 'jpe', 'peg', 'png', '.pn', 'hei', 'eic', '.he',
+    '_00', '000', 'com', 'ent', 'nte', 'est', 'ado', 'ara', 'par', 'que', 'cao', 'oes',
+})
+
+log = get_logger('search')
+
+
+class InvalidSearch(ValueError):
+    """Texto de busca curto demais para usar o índice de trigramas"""
+
+
+def normalize(text):
+    """Minúsculas, sem acentos e com espaços colapsados"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.lower().split())
+
+
+def trigrams(text):
+    text = normalize(text)
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def document_grams(doc):
+    """Trigramas de todos os campos pesquisáveis de uma foto (ordenados)"""
+    grams = set()
+    for field in SEARCH_FIELDS:
+        grams |= trigrams(doc.get(field))
+    return sorted(grams)
+
+
+def rarest_first(grams, frequency=None):
+    """Trigramas do mais raro para o mais comum (`frequency(gram)` estima a frequência)"""
+    def key(gram):
+        common = ' ' in gram or gram in STOP_GRAMS
+        return (frequency(gram) if frequency is not None else 0, common, gram)
+    return sorted(grams, key=key)
+
+
+def search_query(text, frequency=None):
+    """Filtro do Mongo para o texto pesquisado, com o trigrama mais raro primeiro"""
+    needle = normalize(text)
+    if len(needle) < MIN_QUERY_LENGTH:
+        raise InvalidSearch(f'A busca precisa de pelo menos {MIN_QUERY_LENGTH} caracteres')
+    return {'search_grams': {'$all': rarest_first(trigrams(needle), frequency)}}
+
+
+class GramSample:
+    """Frequência dos trigramas numa amostra das fotos; chamável como `frequency` de search_query.
+
+    A amostra é refeita na primeira consulta depois de `ttl` segundos, por
+    uma requisição só (as outras usam a anterior); se falhar, a ordem fica
+    a de STOP_GRAMS até a próxima tentativa.
+    """
+
+    def __init__(self, collection, size=SEARCH_GRAM_SAMPLE, ttl=SEARCH_GRAM_SAMPLE_TTL, clock=time.monotonic):
+        self.collection = collection
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self._counts = Counter()
+        self._sampled_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        counts = Counter()
+        pipeline = [{'$sample': {'size': self.size}}, {'$project': {'_id': 0, 'search_grams': 1}}]
+        for doc in self.collection.aggregate(pipeline):
+            counts.update(doc.get('search_grams') or ())
+        self._counts = counts
+        return counts
+
+    def _maybe_refresh(self):
+        if self._sampled_at is not None and self.clock() - self._sampled_at < self.ttl:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._sampled_at = self.clock()
+            self.refresh()
+        except Exception as e:
+            log.warning(f"Erro ao amostrar os trigramas da busca: {e}")
+        finally:
+            self._lock.release()
+
+    def __call__(self, gram):
+        self._maybe_refresh()
+        return self._counts[gram]
+
+
+def matches(doc, text):
+    """Confirma que o texto aparece como substring em algum campo pesquisável"""
+    needle = normalize(text)
+    return any(needle in normalize(doc.get(field)) for field in SEARCH_FIELDS)
+
+
+def search_projection(projection):
+    """Garante que os campos usados na confirmação venham na projeção"""
+    if projection and 1 in projection.values():
+        return dict(projection, **dict.fromkeys(SEARCH_FIELDS, 1))
+    return projection
+
+
+def backfill(collection, batch_size=1000):
+    """Calcula `search_grams` das fotos que ainda não têm o campo"""
+    updated = 0
+    batch = []
+    cursor = collection.find({'search_grams': {'$exists': False}}, dict.fromkeys(SEARCH_FIELDS, 1))
+    for doc in cursor:
+        batch.append(UpdateOne({'_id': doc['_id']}, {'$set': {'search_grams': document_grams(doc)}}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    for keys in SEARCH_INDEXES:
+        collection.create_index(keys)
+    return updated
+
+
+if __name__ == '__main__':
+    from api import COLLECTION, DB_NAME, REPLICA_URI
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--uri', type=str, default=REPLICA_URI, help='MongoDB URI do replica set')
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri, serverSelectionTimeoutMS=5000)
+    count = backfill(client[DB_NAME][COLLECTION])
+    print(f'✅ search_grams calculado para {count} fotos')
@@ -0,0 +1,90 @@
+"""
+Serialização rápida das listagens de fotos
+
+- Projeções no servidor: o parâmetro `fields=` escolhe os campos retornados
+  (padrão: projeção "card" da galeria; `fields=all` devolve o documento
+  completo, sem campos internos).
+- Serializador de passada única: monta um dict novo convertendo ObjectId e
+  datetime e já inclui o `photo_url` (e o `thumb_url` da miniatura), sem mutar o documento do Mongo.
+- Encoder JSON opcional: usa `orjson` quando instalado, senão o `json` da
+  biblioteca padrão.
+"""
+
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from flask import Response
+
+from thumbnails import THUMB_DEFAULT_WIDTH
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+# Campos que um cliente pode pedir via `fields=`
+PHOTO_FIELDS = frozenset([
+    '_id', 'gridfs_id', 'storage_path', 'filename', 'user', 'description', 'tags',
+    'upload_date', 'size_kb', 'content_type', 'status', 'sha256'
+])
+
+# Projeção padrão das listagens: só o necessário para montar um card da galeria
+CARD_FIELDS = ('filename', 'user', 'description', 'tags', 'upload_date', 'gridfs_id')
+
+# Documento completo, sem os campos internos (trigramas da busca)
+FULL_DOCUMENT = {'search_grams': 0}
+
+# Campos sempre projetados: upload_date (cursor da paginação) e a localização
+# dos bytes, gridfs_id ou storage_path (photo_url)
+_REQUIRED_FIELDS = ('upload_date', 'gridfs_id', 'storage_path')
+
+
+class InvalidFields(ValueError):
+    """Parâmetro `fields` com campos desconhecidos"""
+
+
+def parse_fields(value, default=CARD_FIELDS):
+    """Converte o parâmetro `fields` numa projeção do Mongo.
+
+    `fields=all` (ou nenhum `fields` com default=None) devolve FULL_DOCUMENT.
+    """
+    if value == 'all' or (not value and default is None):
+        return FULL_DOCUMENT
+    if value:
+        fields = [f.strip() for f in value.split(',') if f.strip()]
+        unknown = set(fields) - PHOTO_FIELDS
+        if unknown:
+            raise InvalidFields(f"Campos inválidos em fields: {', '.join(sorted(unknown))}")
+    else:
+        fields = default
+    projection = dict.fromkeys(fields, 1)
+    projection.update(dict.fromkeys(_REQUIRED_FIELDS, 1))
+    return projection
+
+
+def serialize_photo(doc):
+    """Converte um documento de foto em dict pronto para JSON, numa única passada"""
+    out = {}
+    for key, value in doc.items():
+        if isinstance(value, ObjectId):
+            value = str(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        out[key] = value
+    if 'gridfs_id' in out or 'storage_path' in out:
+        out['photo_url'] = f"/api/photos/{out['_id']}/file"
+        out['thumb_url'] = f"{out['photo_url']}?w={THUMB_DEFAULT_WIDTH}"
+    return out
+
+
+def dumps(payload):
+    """Codifica `payload` em JSON (bytes), com orjson quando disponível"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Equivalente ao jsonify para payloads já serializados com serialize_photo"""
+    return Response(dumps(payload), status=status, mimetype='application/json')
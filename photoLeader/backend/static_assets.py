@@ -0,0 +1,210 @@
+"""
+Pipeline e servidor dos arquivos estáticos do frontend
+
+Build (`python static_assets.py build`) gera `frontend/dist`:
+
+- CSS, JS e imagens vão para `dist/static/` com o hash do conteúdo no nome
+  (`estiloLogin.3f9c2a1b7e.css`) e as referências nos HTML/CSS são
+  reescritas para esses nomes;
+- as páginas HTML ficam na raiz de `dist/` com os nomes originais;
+- arquivos de texto ganham variantes pré-comprimidas `.gz` (e `.br` quando
+  o pacote opcional `brotli` está instalado);
+- `manifest.json` mapeia o caminho original para o nome com hash.
+
+Ao servir, `AssetStore.plan` escolhe a variante pelo Accept-Encoding, marca os
+arquivos com hash como imutáveis (cache de um ano) e valida HTML por ETag
+(304). O corpo é sempre um arquivo em disco: o Flask usa send_file
+(wsgi.file_wrapper/sendfile no servidor WSGI, ou X-Sendfile com
+STATIC_X_SENDFILE=1 atrás do nginx) e o modo ASGI usa FileResponse.
+
+Sem `dist/` (desenvolvimento) os arquivos de `frontend/` são servidos como
+estão, com revalidação por ETag.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import threading
+
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FRONTEND_DIR = os.path.join(os.path.dirname(BACKEND_DIR), 'frontend')
+DIST_DIR = os.environ.get('STATIC_DIR', os.path.join(FRONTEND_DIR, 'dist'))
+MANIFEST = 'manifest.json'
+STATIC_PREFIX = 'static'
+
+# Envia o arquivo via X-Sendfile (nginx/Apache) em vez de lê-lo no worker
+STATIC_X_SENDFILE = os.environ.get('STATIC_X_SENDFILE', '0') == '1'
+
+HASHED_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+COMPRESSIBLE = frozenset(['.html', '.css', '.js', '.json', '.svg', '.txt'])
+# Variantes pré-comprimidas, em ordem de preferência
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# href="...", src="..." (com ou sem espaços em volta do `=`) e url(...) com caminhos relativos
+_REFERENCE = re.compile(r'''(?P<prefix>(?:href|src)\s*=\s*["']|url\(\s*["']?)(?P<path>[^"')?#]+)''')
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+# ============= BUILD =============
+
+def _source_files(source, output):
+    for directory, dirs, files in os.walk(source):
+        dirs[:] = [d for d in dirs if not d.startswith('.')
+                   and os.path.abspath(os.path.join(directory, d)) != os.path.abspath(output)]
+        for name in files:
+            if name.startswith('.') or name == 'README.md':
+                continue
+            yield os.path.relpath(os.path.join(directory, name), source).replace(os.sep, '/')
+
+
+def rewrite_references(text, manifest):
+    """Troca referências a arquivos do manifest pelos nomes com hash (caminho absoluto)"""
+    def replace(match):
+        path = match.group('path').strip()
+        target = manifest.get(path[2:] if path.startswith('./') else path)
+        if target is None:
+            return match.group(0)
+        return match.group('prefix') + '/' + target
+    return _REFERENCE.sub(replace, text)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _precompress(path, data):
+    _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write(path + '.br', brotli.compress(data, quality=11))
+
+
+def build(source=FRONTEND_DIR, output=DIST_DIR):
+    """Gera `output` a partir de `source`; retorna o manifest"""
+    shutil.rmtree(output, ignore_errors=True)
+    files = sorted(_source_files(source, output))
+
+    def kind(path):
+        ext = os.path.splitext(path)[1].lower()
+        return 2 if ext == '.html' else 1 if ext in ('.css', '.js') else 0
+
+    manifest = {}
+    # Imagens primeiro (referenciadas pelo CSS), depois CSS/JS, por fim o HTML
+    for path in sorted(files, key=kind):
+        with open(os.path.join(source, path), 'rb') as f:
+            data = f.read()
+        ext = os.path.splitext(path)[1].lower()
+        if kind(path):
+            data = rewrite_references(data.decode('utf-8'), manifest).encode('utf-8')
+        if kind(path) == 2:
+            target = path
+        else:
+            stem, ext_original = os.path.splitext(path)
+            target = f'{STATIC_PREFIX}/{stem}.{content_hash(data)}{ext_original}'
+            manifest[path] = target
+        _write(os.path.join(output, target), data)
+        if ext in COMPRESSIBLE:
+            _precompress(os.path.join(output, target), data)
+
+    with open(os.path.join(output, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+# ============= SERVIDOR =============
+
+class AssetStore:
+    """Resolve caminhos e monta os cabeçalhos dos arquivos estáticos"""
+
+    def __init__(self, dist=DIST_DIR, source=FRONTEND_DIR):
+        manifest_path = os.path.join(dist, MANIFEST)
+        self.built = os.path.isfile(manifest_path)
+        self.root = dist if self.built else source
+        self.hashed = set()
+        if self.built:
+            with open(manifest_path) as f:
+                self.hashed = set(json.load(f).values())
+        self._etags = {}
+        self._lock = threading.Lock()
+
+    def _etag(self, file_path, stat):
+        key = (file_path, stat.st_mtime_ns, stat.st_size)
+        etag = self._etags.get(key)
+        if etag is None:
+            with open(file_path, 'rb') as f:
+                etag = content_hash(f.read())
+            with self._lock:
+                self._etags[key] = etag
+        return etag
+
+    def plan(self, path, accept_encoding=None, if_none_match=None):
+        """Decide a resposta para `path`.
+
+        Retorna None (404) ou (status, caminho_do_arquivo, cabeçalhos), com
+        status 200 ou 304.
+        """
+        if path == MANIFEST:
+            return None
+        file_path = safe_join(self.root, path)
+        if file_path is None or not os.path.isfile(file_path):
+            return None
+
+        ext = os.path.splitext(path)[1].lower()
+        headers = {'Content-Type': mimetypes.guess_type(path)[0] or 'application/octet-stream'}
+        if headers['Content-Type'].startswith('text/') or ext in ('.js', '.json', '.svg'):
+            headers['Content-Type'] += '; charset=utf-8'
+
+        encoding = None
+        if ext in COMPRESSIBLE:
+            headers['Vary'] = 'Accept-Encoding'
+            accepted = parse_accept_header(accept_encoding)
+            for name, suffix in ENCODINGS:
+                if accepted.quality(name) > 0 and os.path.isfile(file_path + suffix):
+                    encoding, file_path = name, file_path + suffix
+                    headers['Content-Encoding'] = name
+                    break
+
+        if path in self.hashed:
+            # Nome muda quando o conteúdo muda: pode ficar em cache para sempre
+            headers['Cache-Control'] = HASHED_CACHE_CONTROL
+            return 200, file_path, headers
+
+        stat = os.stat(file_path)
+        etag = self._etag(file_path, stat) + (f'-{encoding}' if encoding else '')
+        headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+        headers['ETag'] = quote_etag(etag)
+        if if_none_match and parse_etags(if_none_match).contains(etag):
+            return 304, file_path, headers
+        return 200, file_path, headers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pipeline dos arquivos estáticos do frontend')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--source', default=FRONTEND_DIR, help='Diretório do frontend')
+    parser.add_argument('--output', default=DIST_DIR, help='Diretório de saída')
+    args = parser.parse_args()
+
+    manifest = build(args.source, args.output)
+    print(f"✅ {len(manifest)} arquivos com hash gerados em {args.output}")
+    if brotli is None:
+        print("ℹ️ Pacote brotli não instalado: apenas variantes .gz foram geradas")
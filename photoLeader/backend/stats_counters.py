@@ -0,0 +1,135 @@
+"""Contadores incrementais para o endpoint /api/stats.
+
+Em vez de varrer a collection `files` a cada chamada, o upload e o delete
+atualizam com `$inc` a collection `stats`, na mesma transação que insere ou
+remove a foto (photo_commit.py):
+
+    {'_id': 'global:<slot>', 'photos': int, 'bytes': int}
+    {'_id': 'user:<nome>', 'kind': 'user', 'key': <nome>, 'count': int}
+    {'_id': 'tag:<tag>', 'kind': 'tag', 'key': <tag>, 'count': int}
+
+O total global fica dividido em STATS_GLOBAL_SLOTS documentos e cada foto
+incrementa um sorteado: com um documento só, toda transação de upload e
+delete escreveria no mesmo documento e elas se enfileirariam (ou abortariam
+com WriteConflict) umas atrás das outras. A leitura soma os slots numa
+consulta pelo intervalo de `_id`, que também cobre o `global` sem slot
+gravado pelo rebuild.
+
+O top-N usa o índice (kind, count), então o custo é O(N), não O(collection).
+
+Uso (reconstrução completa a partir de `files`, para reparo):
+  python stats_counters.py rebuild [--uri MONGO_URI]
+"""
+
+import argparse
+import os
+import random
+
+from pymongo import MongoClient, UpdateOne
+
+STATS_COLLECTION = 'stats'
+# Documentos em que o total global é dividido (escritas concorrentes em slots diferentes)
+STATS_GLOBAL_SLOTS = int(os.environ.get('STATS_GLOBAL_SLOTS', 16))
+# `global` e `global:<slot>` (':' < ';'), servido pelo índice de _id
+GLOBAL_RANGE = {'_id': {'$gte': 'global', '$lt': 'global;'}}
+
+# Índice do top-N: filtra pelo tipo e já entrega ordenado pela contagem
+STATS_INDEXES = [
+    [('kind', 1), ('count', -1)],
+]
+
+
+def photo_bytes(photo):
+    return int(round(photo.get('size_kb', 0) * 1024))
+
+
+def counter_updates(photo, sign=1, slot=None):
+    """Operações $inc que refletem a entrada (sign=1) ou saída (sign=-1) de uma foto"""
+    if slot is None:
+        slot = random.randrange(STATS_GLOBAL_SLOTS)
+    updates = [
+        UpdateOne({'_id': f'global:{slot}'},
+                  {'$inc': {'photos': sign, 'bytes': sign * photo_bytes(photo)}},
+                  upsert=True),
+        UpdateOne({'_id': f"user:{photo.get('user')}"},
+                  {'$inc': {'count': sign}, '$setOnInsert': {'kind': 'user', 'key': photo.get('user')}},
+                  upsert=True)
+    ]
+    for tag in photo.get('tags') or []:
+        updates.append(
+            UpdateOne({'_id': f'tag:{tag}'},
+                      {'$inc': {'count': sign}, '$setOnInsert': {'kind': 'tag', 'key': tag}},
+                      upsert=True)
+        )
+    return updates
+
+
+def apply_photo(stats, photo, sign=1):
+    """Aplica os contadores de uma foto numa única escrita em lote"""
+    stats.bulk_write(counter_updates(photo, sign), ordered=False)
+
+
+def top_cursor(stats, kind, limit):
+    """Cursor do top-N de um tipo (servido pelo índice (kind, count))"""
+    return (stats.find({'kind': kind, 'count': {'$gt': 0}}, {'key': 1, 'count': 1})
+            .sort('count', -1)
+            .limit(limit))
+
+
+def top(stats, kind, limit):
+    return [{'_id': doc['key'], 'count': doc['count']} for doc in top_cursor(stats, kind, limit)]
+
+
+def read_stats(stats, top_users=5, top_tags=10):
+    """Lê os totais e os rankings de usuários e tags"""
+    slots = list(stats.find(GLOBAL_RANGE, {'photos': 1, 'bytes': 1}))
+    return {
+        'total_photos': sum(slot.get('photos', 0) for slot in slots),
+        'total_bytes': sum(slot.get('bytes', 0) for slot in slots),
+        'top_users': top(stats, 'user', top_users),
+        'top_tags': top(stats, 'tag', top_tags)
+    }
+
+
+def rebuild(files, stats):
+    """Recalcula todos os contadores a partir da collection `files`.
+
+    Uploads e deletes concorrentes durante a reconstrução podem ser perdidos;
+    rode com a escrita pausada ou repita depois.
+    """
+    docs = []
+    totals = list(files.aggregate([
+        {'$group': {'_id': None, 'photos': {'$sum': 1},
+                    'bytes': {'$sum': {'$multiply': [{'$ifNull': ['$size_kb', 0]}, 1024]}}}}
+    ]))
+    if totals:
+        docs.append({'_id': 'global', 'photos': totals[0]['photos'],
+                     'bytes': int(round(totals[0]['bytes']))})
+    for group in files.aggregate([{'$group': {'_id': '$user', 'count': {'$sum': 1}}}]):
+        docs.append({'_id': f"user:{group['_id']}", 'kind': 'user', 'key': group['_id'],
+                     'count': group['count']})
+    for group in files.aggregate([{'$unwind': '$tags'},
+                                  {'$group': {'_id': '$tags', 'count': {'$sum': 1}}}]):
+        docs.append({'_id': f"tag:{group['_id']}", 'kind': 'tag', 'key': group['_id'],
+                     'count': group['count']})
+
+    stats.delete_many({})
+    if docs:
+        stats.insert_many(docs, ordered=False)
+    for keys in STATS_INDEXES:
+        stats.create_index(keys)
+    return len(docs)
+
+
+if __name__ == '__main__':
+    from api import COLLECTION, DB_NAME, REPLICA_URI
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--uri', type=str, default=REPLICA_URI, help='MongoDB URI do replica set')
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri, serverSelectionTimeoutMS=5000)
+    database = client[DB_NAME]
+    count = rebuild(database[COLLECTION], database[STATS_COLLECTION])
+    print(f'✅ {count} contadores reconstruídos em {DB_NAME}.{STATS_COLLECTION}')
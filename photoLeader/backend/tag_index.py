@@ -0,0 +1,218 @@
+"""
+Índice de tags em memória (autocomplete e facetas)
+
+`GET /api/tags/suggest?prefix=` e `GET /api/tags/facets?user=` são servidos
+daqui, sem consultar o MongoDB:
+
+- as tags com contagem positiva ficam num array ordenado; o prefixo vira um
+  intervalo do array com duas buscas binárias e as `limit` mais usadas do
+  intervalo são escolhidas por contagem (empate: ordem alfabética);
+- prefixos curtos cobrem intervalos grandes: acima de TAG_SCAN_LIMIT tags o
+  top-TAG_TOP_K do prefixo é calculado uma vez e guardado. Incrementos
+  atualizam esse top no lugar; um decremento de uma tag que está nele
+  descarta a entrada (a substituta pode estar fora do top);
+- as contagens por usuário ficam num dict por usuário (facetas), com o
+  mesmo top guardado para usuários com mais de TAG_SCAN_LIMIT tags.
+
+O índice é construído por uma varredura da collection (só `user` e `tags`)
+e mantido pelo upload/delete deste processo (`apply`). Com vários workers,
+cada processo só vê as próprias escritas: a thread TagIndexRefresher
+reconstrói o índice a cada TAG_INDEX_REFRESH segundos para convergir.
+
+Uso avulso (memória e latência com N tags distintas):
+  python backend/benchmarks/bench_tag_index.py --tags 1000000
+"""
+
+import bisect
+import heapq
+import os
+import sys
+import threading
+import time
+
+from logs import get_logger
+
+# Reconstrução periódica a partir da collection (0: só no startup)
+TAG_INDEX_REFRESH = int(os.environ.get('TAG_INDEX_REFRESH', 900))
+# Intervalos maiores que isso usam o top-K guardado por prefixo
+TAG_SCAN_LIMIT = int(os.environ.get('TAG_SCAN_LIMIT', 256))
+# Tags guardadas no top de cada prefixo (também o máximo de `limit`)
+TAG_TOP_K = 50
+DEFAULT_SUGGESTIONS = 10
+
+log = get_logger('tag_index')
+
+
+class InvalidLimit(ValueError):
+    """Parâmetro `limit` fora de 1..TAG_TOP_K"""
+
+
+def parse_limit(value, default=DEFAULT_SUGGESTIONS):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= TAG_TOP_K:
+        raise InvalidLimit(f'limit deve estar entre 1 e {TAG_TOP_K}')
+    return limit
+
+
+def _rank(item):
+    tag, count = item
+    return -count, tag
+
+
+class TagIndex:
+    """Contagens de tags (globais e por usuário) com busca por prefixo"""
+
+    def __init__(self, scan_limit=TAG_SCAN_LIMIT, top_k=TAG_TOP_K):
+        self.scan_limit = scan_limit
+        self.top_k = top_k
+        self.ready = False
+        self.built_at = None
+        self._counts = {}
+        self._sorted = []
+        self._by_user = {}
+        # (usuário ou None, prefixo) -> [(tag, contagem)] das TAG_TOP_K mais usadas
+        self._top = {}
+        self._lock = threading.Lock()
+
+    # ---------- construção e atualização ----------
+
+    def rebuild(self, photos):
+        """Reconstrói o índice a partir de documentos com `user` e `tags`; troca tudo de uma vez"""
+        counts = {}
+        by_user = {}
+        for photo in photos:
+            user_counts = by_user.setdefault(photo.get('user'), {})
+            for tag in photo.get('tags') or []:
+                counts[tag] = counts.get(tag, 0) + 1
+                user_counts[tag] = user_counts.get(tag, 0) + 1
+        ordered = sorted(counts)
+        with self._lock:
+            self._counts, self._sorted, self._by_user, self._top = counts, ordered, by_user, {}
+            self.ready = True
+            self.built_at = time.time()
+
+    def apply(self, photo, sign=1):
+        """Reflete a entrada (sign=1) ou saída (sign=-1) de uma foto"""
+        tags = photo.get('tags') or []
+        if not tags:
+            return
+        user = photo.get('user')
+        with self._lock:
+            user_counts = self._by_user.setdefault(user, {})
+            for tag in tags:
+                old = self._counts.get(tag, 0)
+                count = self._update(self._counts, tag, sign)
+                if count and not old:
+                    bisect.insort(self._sorted, tag)
+                elif old and not count:
+                    del self._sorted[bisect.bisect_left(self._sorted, tag)]
+                self._update_top(None, tag, count, sign)
+                self._update_top(user, tag, self._update(user_counts, tag, sign), sign)
+            if not user_counts:
+                del self._by_user[user]
+
+    @staticmethod
+    def _update(counts, tag, delta):
+        count = max(0, counts.get(tag, 0) + delta)
+        if count:
+            counts[tag] = count
+        else:
+            counts.pop(tag, None)
+        return count
+
+    def _update_top(self, user, tag, count, delta):
+        # Chamado com o lock adquirido: ajusta os tops guardados dos prefixos da tag
+        for end in range(len(tag) + 1):
+            key = (user, tag[:end])
+            top = self._top.get(key)
+            if top is None:
+                continue
+            if delta < 0:
+                if any(t == tag for t, _ in top):
+                    del self._top[key]
+            else:
+                top = [(t, c) for t, c in top if t != tag] + [(tag, count)]
+                top.sort(key=_rank)
+                self._top[key] = top[:self.top_k]
+
+    # ---------- consultas ----------
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self._sorted, prefix)
+        hi = bisect.bisect_left(self._sorted, prefix + '\U0010ffff') if prefix else len(self._sorted)
+        return lo, hi
+
+    def suggest(self, prefix='', limit=DEFAULT_SUGGESTIONS, user=None):
+        """[(tag, contagem)] das `limit` tags mais usadas que começam com `prefix`"""
+        with self._lock:
+            top = self._top.get((user, prefix))
+            if top is not None:
+                return top[:limit]
+            if user is None:
+                lo, hi = self._range(prefix)
+                items = [(tag, self._counts[tag]) for tag in self._sorted[lo:hi]]
+            else:
+                items = [(t, c) for t, c in self._by_user.get(user, {}).items() if t.startswith(prefix)]
+            if len(items) <= self.scan_limit:
+                return heapq.nsmallest(limit, items, key=_rank)
+            top = heapq.nsmallest(self.top_k, items, key=_rank)
+            self._top[(user, prefix)] = top
+            return top[:limit]
+
+    def facets(self, user=None, limit=DEFAULT_SUGGESTIONS):
+        """Tags mais usadas (de um usuário, ou de todos) com as contagens"""
+        return self.suggest('', limit, user)
+
+    def memory_bytes(self):
+        """Estimativa (sys.getsizeof) da memória das estruturas do índice, incluindo as strings"""
+        with self._lock:
+            size = sys.getsizeof(self._counts) + sys.getsizeof(self._sorted) + sys.getsizeof(self._by_user)
+            size += sum(sys.getsizeof(tag) + sys.getsizeof(count) for tag, count in self._counts.items())
+            for user, user_counts in self._by_user.items():
+                size += sys.getsizeof(user) + sys.getsizeof(user_counts)
+            size += sum(sys.getsizeof(top) + 64 * len(top) for top in self._top.values())
+            return size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'tags': len(self._sorted),
+                'users': len(self._by_user),
+                'cached_prefixes': len(self._top),
+                'built_at': self.built_at
+            }
+
+
+class TagIndexRefresher(threading.Thread):
+    """Constrói o índice no startup e o reconstrói a cada `interval` segundos (0: só uma vez)"""
+
+    def __init__(self, index, load, interval=TAG_INDEX_REFRESH, retry_seconds=5.0):
+        super().__init__(name='tag-index', daemon=True)
+        self.index = index
+        self.load = load
+        self.interval = interval
+        self.retry_seconds = retry_seconds
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            started = time.perf_counter()
+            try:
+                self.index.rebuild(self.load())
+            except Exception as e:
+                log.warning(f"Erro ao construir o índice de tags: {e}")
+                self._stop_event.wait(self.retry_seconds)
+                continue
+            log.info(f"Índice de tags construído em {time.perf_counter() - started:.1f}s")
+            if not self.interval:
+                break
+            self._stop_event.wait(self.interval)
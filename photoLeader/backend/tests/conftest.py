@@ -0,0 +1,113 @@
+"""Fixtures compartilhadas: replica set MongoDB local para testes de integração.
+
+Os testes que usam `mongo_replset` ou `mongo_replset3` são pulados quando o
+binário `mongod` não está no PATH.
+"""
+
+import shutil
+import socket
+import subprocess
+import time
+
+import pytest
+from pymongo import MongoClient
+
+MONGOD = shutil.which('mongod')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_primary(uri, timeout=30):
+    client = MongoClient(uri, serverSelectionTimeoutMS=1000)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if client.admin.command('hello').get('isWritablePrimary'):
+                return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('Replica set de teste não elegeu um PRIMARY a tempo')
+
+
+def _wait_for_secondaries(uri, members, timeout=60):
+    client = MongoClient(uri, serverSelectionTimeoutMS=1000)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            states = [m['stateStr'] for m in client.admin.command('replSetGetStatus')['members']]
+            if states.count('SECONDARY') == members - 1:
+                return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('Secondaries do replica set de teste não sincronizaram a tempo')
+
+
+def start_replica_set(tmp_path_factory, members=1, name='rs_test'):
+    """Sobe `members` processos mongod e inicia o replica set; retorna (uri, processos)"""
+    ports = [_free_port() for _ in range(members)]
+    processes = []
+    for port in ports:
+        dbpath = tmp_path_factory.mktemp(f'mongod-{port}')
+        processes.append(subprocess.Popen(
+            [MONGOD, '--replSet', name, '--port', str(port), '--bind_ip', '127.0.0.1',
+             '--dbpath', str(dbpath), '--quiet'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ))
+
+    seed = MongoClient(f'mongodb://127.0.0.1:{ports[0]}/?directConnection=true',
+                       serverSelectionTimeoutMS=10000)
+    config = {
+        '_id': name,
+        'members': [
+            # Só o primeiro membro pode virar PRIMARY (eleição determinística)
+            {'_id': i, 'host': f'127.0.0.1:{port}', 'priority': 1 if i == 0 else 0}
+            for i, port in enumerate(ports)
+        ]
+    }
+    for _ in range(20):
+        try:
+            seed.admin.command('replSetInitiate', config)
+            break
+        except Exception:
+            time.sleep(0.5)
+    seed.close()
+
+    hosts = ','.join(f'127.0.0.1:{port}' for port in ports)
+    uri = f'mongodb://{hosts}/?replicaSet={name}'
+    _wait_for_primary(uri)
+    if members > 1:
+        _wait_for_secondaries(uri, members)
+    return uri, processes
+
+
+def stop_replica_set(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait(timeout=30)
+
+
+@pytest.fixture(scope='session')
+def mongo_replset(tmp_path_factory):
+    """URI de um replica set local de um membro"""
+    if MONGOD is None:
+        pytest.skip('mongod não encontrado no PATH')
+    uri, processes = start_replica_set(tmp_path_factory, members=1)
+    yield uri
+    stop_replica_set(processes)
+
+
+@pytest.fixture(scope='session')
+def mongo_replset3(tmp_path_factory):
+    """URI de um replica set local de três membros (um PRIMARY e dois secondaries)"""
+    if MONGOD is None:
+        pytest.skip('mongod não encontrado no PATH')
+    uri, processes = start_replica_set(tmp_path_factory, members=3, name='rs_causal')
+    yield uri
+    stop_replica_set(processes)
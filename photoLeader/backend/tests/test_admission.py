@@ -0,0 +1,230 @@
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from bson import ObjectId
+
+import api
+from admission import AdmissionController, Overloaded, majority_lag
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeTopology:
+    def __init__(self, primary='a:27017', lags=(0.0, 0.0)):
+        self.primary = primary
+        self.lags = lags
+
+    def snapshot(self):
+        members = [{'name': 'a:27017', 'state': 'PRIMARY' if self.primary else 'SECONDARY', 'lagSeconds': 0.0}]
+        members += [{'name': f's{i}:27017', 'state': 'SECONDARY', 'lagSeconds': lag}
+                    for i, lag in enumerate(self.lags)]
+        return {'primary': self.primary, 'members': members}
+
+
+class FakeSession:
+    operation_time = None
+    cluster_time = None
+
+
+class FakeClient:
+    @contextmanager
+    def start_session(self, **kwargs):
+        yield FakeSession()
+
+
+def test_slow_majority_commits_tighten_the_limit_and_fast_ones_recover_it():
+    clock = FakeClock()
+    controller = AdmissionController(max_limit=16, target_seconds=0.5, clock=clock)
+
+    for _ in range(4):
+        controller.observe(5.0)
+        clock.now += 1
+    assert controller.limit == 1
+
+    for _ in range(50):
+        controller.observe(0.01)
+    assert controller.limit == 16
+
+
+def test_burst_of_slow_commits_halves_the_limit_once_per_interval():
+    controller = AdmissionController(max_limit=16, target_seconds=0.5, clock=FakeClock())
+
+    for _ in range(10):
+        controller.observe(5.0)
+
+    assert controller.limit == 8
+
+
+def test_full_queue_is_rejected_with_429_and_retry_after():
+    controller = AdmissionController(max_limit=1, queue_size=0)
+    controller.acquire()
+
+    with pytest.raises(Overloaded) as e:
+        controller.acquire()
+
+    assert e.value.status == 429
+    assert e.value.retry_after >= 1
+    assert controller.stats()['rejected'][429] == 1
+
+
+def test_queued_write_times_out_with_503():
+    controller = AdmissionController(max_limit=1, queue_size=4, queue_timeout=0.05)
+    controller.acquire()
+
+    with pytest.raises(Overloaded) as e:
+        controller.acquire()
+
+    assert e.value.status == 503
+    assert controller.stats()['queued'] == 0
+
+
+def test_released_slot_goes_to_the_oldest_waiter():
+    controller = AdmissionController(max_limit=1, queue_size=4, queue_timeout=5)
+    controller.acquire()
+    order = []
+
+    def write(name):
+        with controller.slot():
+            order.append(name)
+
+    threads = []
+    for name in ('first', 'second'):
+        threads.append(threading.Thread(target=write, args=(name,)))
+        threads[-1].start()
+        while controller.stats()['queued'] < len(threads):
+            time.sleep(0.01)
+    controller.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == ['first', 'second']
+    assert controller.stats()['active'] == 0
+
+
+def test_async_waiter_gets_the_slot_when_released():
+    controller = AdmissionController(max_limit=1, queue_size=4, queue_timeout=5)
+
+    async def scenario():
+        await controller.acquire_async()
+        waiting = asyncio.ensure_future(controller.acquire_async())
+        await asyncio.sleep(0.01)
+        assert controller.stats()['queued'] == 1
+        controller.release()
+        await waiting
+        return controller.stats()
+
+    assert asyncio.run(scenario())['active'] == 1
+
+
+def test_cancelled_async_waiters_do_not_leak_slots():
+    controller = AdmissionController(max_limit=1, queue_size=4, queue_timeout=5)
+
+    async def scenario():
+        await controller.acquire_async()
+        queued = asyncio.ensure_future(controller.acquire_async())
+        granted = asyncio.ensure_future(controller.acquire_async())
+        await asyncio.sleep(0.01)
+
+        # Cancelada ainda na fila
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert (controller.stats()['active'], controller.stats()['queued']) == (1, 1)
+
+        # Cancelada depois de a vaga ter sido passada para ela
+        controller.release()
+        granted.cancel()
+        await asyncio.gather(granted, return_exceptions=True)
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['active'] == 0
+    assert stats['queued'] == 0
+
+
+def test_majority_lag_uses_the_secondary_needed_for_the_majority():
+    assert majority_lag({'members': []}) is None
+    assert majority_lag(FakeTopology(lags=(1.0, 30.0)).snapshot()) == 1.0
+    assert majority_lag(FakeTopology(lags=(1.0, 30.0, 40.0, 2.0)).snapshot()) == 2.0
+    assert majority_lag({'members': [{'state': 'PRIMARY'}, {'state': 'ARBITER'}, {'state': 'SECONDARY',
+                                                                                   'health': 'Unhealthy'}]}) == math.inf
+
+
+def test_writes_are_refused_without_primary_or_majority():
+    with pytest.raises(Overloaded) as e:
+        AdmissionController(FakeTopology(primary=None)).acquire()
+    assert e.value.status == 503
+
+    topology = FakeTopology()
+    topology.snapshot = lambda: {'primary': 'a:27017', 'members': [
+        {'state': 'PRIMARY'}, {'state': 'SECONDARY', 'health': 'Unhealthy'}, {'state': 'RECOVERING'}]}
+    with pytest.raises(Overloaded):
+        AdmissionController(topology).acquire()
+
+
+def test_replication_lag_tightens_the_limit():
+    controller = AdmissionController(FakeTopology(lags=(60.0, 60.0)), max_limit=16, max_lag_seconds=10)
+
+    with controller.slot():
+        pass
+
+    assert controller.limit == 8
+
+
+@pytest.fixture
+def slow_writes(monkeypatch):
+    """Remoções cujo commit majority leva `delay` segundos (latência de escrita injetada)"""
+    photo_id = ObjectId()
+    monkeypatch.setattr(api, 'client', FakeClient())
+    monkeypatch.setattr(api, 'admission', AdmissionController(max_limit=1, queue_size=0, target_seconds=0.05))
+    monkeypatch.setattr(api, 'invalidate_photo', lambda *args: None)
+    started = threading.Event()
+    finish = threading.Event()
+
+    def remove_photo(session, collection, blobs, query, stats=None):
+        started.set()
+        finish.wait(5)
+        time.sleep(0.1)
+        return {'_id': photo_id}, None
+
+    monkeypatch.setattr(api, 'remove_photo', remove_photo)
+    return photo_id, started, finish
+
+
+def test_writes_are_shed_while_reads_stay_fast(monkeypatch, slow_writes):
+    photo_id, started, finish = slow_writes
+    reader = ObjectId()
+    monkeypatch.setattr(api, 'collection', type('Photos', (), {
+        'with_options': lambda self, **kwargs: self,
+        'find_one': lambda self, query, projection=None: {'_id': reader, 'filename': 'foto.jpg'},
+    })())
+    client = api.app.test_client()
+    stuck = threading.Thread(target=client.delete, args=(f'/api/photos/{photo_id}',))
+    stuck.start()
+    started.wait(5)
+
+    rejected = client.delete(f'/api/photos/{ObjectId()}')
+    began = time.perf_counter()
+    read = client.get(f'/api/photos/{reader}')
+    read_seconds = time.perf_counter() - began
+
+    finish.set()
+    stuck.join()
+
+    assert rejected.status_code == 429
+    assert int(rejected.headers['Retry-After']) >= 1
+    assert rejected.get_json()['success'] is False
+    assert read.status_code == 200
+    assert read_seconds < 1
+    # O commit lento entrou na média e apertou o limite
+    assert api.admission.latency > 0.05
+    assert api.admission.stats()['active'] == 0
@@ -0,0 +1,150 @@
+import types
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+import api
+
+
+class FakeGridOut:
+    """Emula um GridOut servindo `data` em chunks de `chunk_size` bytes"""
+
+    def __init__(self, data, chunk_size=4, filename='foto.jpg', content_type='image/jpeg'):
+        self._data = data
+        self._id = ObjectId()
+        self.length = len(data)
+        self.chunk_size = chunk_size
+        self.filename = filename
+        self.metadata = {'contentType': content_type}
+        self.upload_date = datetime(2025, 10, 28, 10, 0, 0)
+        self.position = 0
+        self.chunks_read = []
+        self.closed = False
+
+    def seek(self, pos):
+        self.position = pos
+
+    def readchunk(self):
+        offset = self.position % self.chunk_size
+        chunk = self._data[self.position:self.position - offset + self.chunk_size]
+        self.position += len(chunk)
+        self.chunks_read.append(chunk)
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBucket:
+    def __init__(self, grid_out):
+        self.grid_out = grid_out
+
+    def open_download_stream(self, file_id):
+        return self.grid_out
+
+
+class FakePhotoCollection:
+    def __init__(self, docs):
+        self._docs = {d['_id']: d for d in docs}
+
+    def with_options(self, **kwargs):
+        return self
+
+    def find_one(self, query, projection=None):
+        return self._docs.get(query['_id'])
+
+    def find(self, query, projection=None):
+        return [self._docs[i] for i in query['_id']['$in'] if i in self._docs]
+
+
+@pytest.fixture
+def client():
+    return api.app.test_client()
+
+
+@pytest.fixture
+def stored_photo(monkeypatch):
+    grid_out = FakeGridOut(b'0123456789abcdef')
+    photo_id = ObjectId()
+    monkeypatch.setattr(api, 'collection', FakePhotoCollection([{'_id': photo_id, 'gridfs_id': grid_out._id}]))
+    monkeypatch.setattr(api, 'get_gridfs_bucket', lambda: FakeBucket(grid_out))
+    monkeypatch.setattr(api, 'get_read_bucket', lambda: FakeBucket(grid_out))
+    return types.SimpleNamespace(id=str(photo_id), grid_out=grid_out)
+
+
+def test_get_photo_file_streams_chunks_with_cache_headers(client, stored_photo):
+    response = client.get(f'/api/photos/{stored_photo.id}/file')
+
+    assert response.status_code == 200
+    assert response.data == b'0123456789abcdef'
+    assert response.mimetype == 'image/jpeg'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['ETag'] == f'"{stored_photo.grid_out._id}-16"'
+    # Cada pedaço enviado não passa do tamanho do chunk
+    assert all(len(c) <= 4 for c in stored_photo.grid_out.chunks_read)
+    assert stored_photo.grid_out.closed
+
+
+def test_get_photo_file_answers_range_with_partial_content(client, stored_photo):
+    response = client.get(f'/api/photos/{stored_photo.id}/file', headers={'Range': 'bytes=5-9'})
+
+    assert response.status_code == 206
+    assert response.data == b'56789'
+    assert response.headers['Content-Range'] == 'bytes 5-9/16'
+    assert response.headers['Content-Length'] == '5'
+
+
+def test_get_photo_file_rejects_unsatisfiable_range(client, stored_photo):
+    response = client.get(f'/api/photos/{stored_photo.id}/file', headers={'Range': 'bytes=100-200'})
+
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == 'bytes */16'
+
+
+def test_get_photo_file_sends_everything_for_a_multi_range_request(client, stored_photo):
+    response = client.get(f'/api/photos/{stored_photo.id}/file', headers={'Range': 'bytes=0-1,5-9'})
+
+    assert response.status_code == 200
+    assert response.data == b'0123456789abcdef'
+    assert 'Content-Range' not in response.headers
+
+
+def test_get_photo_file_returns_304_for_matching_etag(client, stored_photo):
+    etag = f'"{stored_photo.grid_out._id}-16"'
+    response = client.get(f'/api/photos/{stored_photo.id}/file', headers={'If-None-Match': etag})
+
+    assert response.status_code == 304
+    assert response.data == b''
+    assert stored_photo.grid_out.chunks_read == []
+
+
+def test_batch_lookup_returns_photos_in_requested_order(client, monkeypatch):
+    docs = [{'_id': ObjectId(), 'filename': f'{i}.jpg', 'gridfs_id': ObjectId(),
+             'upload_date': datetime(2025, 10, 28, 10, 0, i)} for i in range(3)]
+    monkeypatch.setattr(api, 'collection', FakePhotoCollection(docs))
+    unknown = ObjectId()
+
+    response = client.get(f"/api/photos/batch?ids={docs[2]['_id']},{unknown},{docs[0]['_id']}")
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert [p['filename'] for p in body['photos']] == ['2.jpg', '0.jpg']
+    assert body['missing'] == [str(unknown)]
+
+
+def test_batch_lookup_rejects_malformed_ids(client):
+    response = client.get('/api/photos/batch?ids=abc')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+@pytest.mark.parametrize('url', ['/api/photos?limit=abc', '/api/photos/user/ana?limit=1.5',
+                                 '/api/photos/tag/praia?limit=x', '/api/search?q=praia&limit=abc'])
+def test_listing_rejects_non_numeric_limit(client, url):
+    response = client.get(url)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
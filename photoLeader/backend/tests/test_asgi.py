@@ -0,0 +1,121 @@
+import types
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from starlette.testclient import TestClient
+
+import api
+import asgi
+import static_assets
+
+
+class FakeAsyncGridOut:
+    def __init__(self, data, chunk_size=4):
+        self._data = data
+        self._id = ObjectId()
+        self.length = len(data)
+        self.filename = 'foto.jpg'
+        self.metadata = {'contentType': 'image/png'}
+        self.upload_date = datetime(2025, 10, 28, 10, 0, 0)
+        self.chunk_size = chunk_size
+        self.position = 0
+        self.closed = False
+
+    async def seek(self, pos):
+        self.position = pos
+
+    async def readchunk(self):
+        offset = self.position % self.chunk_size
+        chunk = self._data[self.position:self.position - offset + self.chunk_size]
+        self.position += len(chunk)
+        return chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeAsyncCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, keys):
+        return self
+
+    def limit(self, n):
+        self._docs = self._docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._docs)
+
+
+class FakeAsyncCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def find_one(self, query, projection=None):
+        return next((d for d in self.docs if d['_id'] == query['_id']), None)
+
+    def find(self, query, projection=None):
+        return FakeAsyncCursor([d for d in self.docs if all(d.get(k) == v for k, v in query.items())])
+
+
+@pytest.fixture
+def client(monkeypatch):
+    grid_out = FakeAsyncGridOut(b'0123456789')
+    docs = [{'_id': ObjectId(), 'gridfs_id': grid_out._id, 'filename': f'{i}.jpg', 'user': 'ana',
+             'upload_date': datetime(2025, 10, 28, 10, 0, i)} for i in range(3)]
+
+    async def open_download_stream(file_id):
+        return grid_out
+
+    monkeypatch.setattr(api, 'metadata_cache', api.MetadataCache())
+    asgi.app.state.mongo = types.SimpleNamespace(
+        collection=FakeAsyncCollection(docs),
+        bucket=types.SimpleNamespace(open_download_stream=open_download_stream),
+        read_bucket=types.SimpleNamespace(open_download_stream=open_download_stream)
+    )
+    # Sem `with`: o lifespan (conexão real com o Mongo) não é executado
+    return types.SimpleNamespace(http=TestClient(asgi.app), docs=docs, grid_out=grid_out)
+
+
+def test_async_listing_returns_page_and_cursor(client):
+    response = client.http.get('/api/photos/user/ana?limit=2')
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body['count'] == 2
+    assert body['next_cursor']
+    assert body['photos'][0]['photo_url'] == f"/api/photos/{client.docs[0]['_id']}/file"
+
+
+def test_async_file_download_streams_range(client):
+    photo_id = client.docs[0]['_id']
+
+    response = client.http.get(f'/api/photos/{photo_id}/file', headers={'Range': 'bytes=2-6'})
+
+    assert response.status_code == 206
+    assert response.content == b'23456'
+    assert response.headers['content-range'] == 'bytes 2-6/10'
+    assert response.headers['content-type'] == 'image/png'
+    assert client.grid_out.closed
+
+
+def test_async_static_asset_is_immutable(client, tmp_path, monkeypatch):
+    source = tmp_path / 'frontend'
+    source.mkdir()
+    (source / 'app.js').write_text("console.log('ok');")
+    manifest = static_assets.build(str(source), str(tmp_path / 'dist'))
+    monkeypatch.setattr(api, 'static_store', static_assets.AssetStore(str(tmp_path / 'dist'), str(source)))
+
+    response = client.http.get('/' + manifest['app.js'], headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.text == "console.log('ok');"
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['cache-control'] == static_assets.HASHED_CACHE_CONTROL
+    assert client.http.get('/static/nao-existe.js').status_code == 404
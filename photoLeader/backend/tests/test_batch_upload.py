@@ -0,0 +1,26 @@
+import io
+import types
+
+import batch_upload
+from blob_store import GridFSStore
+from tests.test_dedup import FakeBlobs, FakeBucket
+
+
+def make_file(name, data):
+    return types.SimpleNamespace(filename=name, stream=io.BytesIO(data), mimetype='image/jpeg')
+
+
+def test_store_files_keeps_order_and_reports_failures():
+    files = [make_file('a.jpg', b'aaaa'), make_file('b.jpg', b'bbbb'), make_file('c.jpg', b'aaaa')]
+
+    def broken_stream():
+        raise OSError('leitura falhou')
+
+    files[1].stream = types.SimpleNamespace(read=lambda size=-1: broken_stream(),
+                                            seekable=lambda: False)
+
+    results = batch_upload.store_files(GridFSStore(FakeBucket), FakeBlobs(), files, workers=3)
+
+    assert isinstance(results[1], OSError)
+    assert results[0]['sha256'] == results[2]['sha256']
+    assert not results[0]['deduplicated'] and not results[2]['deduplicated']
@@ -0,0 +1,139 @@
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+import api
+import blob_store
+import migrate_blobs
+from tests.test_admission import FakeClock
+from tests.test_api import FakePhotoCollection
+from upload_stream import UploadTooLarge
+
+
+@pytest.fixture
+def store(tmp_path):
+    return blob_store.FileSystemStore(str(tmp_path / 'blobs'), fsync=False)
+
+
+def test_filesystem_write_is_sharded_by_hash_and_leaves_no_temp_file(store):
+    stored = store.write(io.BytesIO(b'\x89PNG\r\n\x1a\nconteudo'), 'a.png')
+
+    sha256 = stored['sha256']
+    assert stored['file_id'].startswith(f'{sha256[:2]}/{sha256[2:4]}/{sha256}-')
+    assert stored['store'] == 'fs' and stored['content_type'] == 'image/png'
+    with store.open(stored['file_id']) as f:
+        assert f.read() == b'\x89PNG\r\n\x1a\nconteudo'
+    assert os.listdir(os.path.join(store.root, blob_store.TMP_DIR)) == []
+
+
+def test_same_content_gets_a_separate_file_per_write(store):
+    first = store.write(io.BytesIO(b'igual'), 'a.jpg')
+    second = store.write(io.BytesIO(b'igual'), 'b.jpg')
+
+    assert first['sha256'] == second['sha256']
+    assert first['file_id'] != second['file_id']
+    store.delete(first['file_id'])
+    assert os.path.isfile(store.path(second['file_id']))
+
+
+def test_aborted_write_removes_partial_file(store):
+    with pytest.raises(UploadTooLarge):
+        store.write(io.BytesIO(b'x' * 100), 'a.jpg', max_bytes=10, block_size=8)
+
+    assert os.listdir(os.path.join(store.root, blob_store.TMP_DIR)) == []
+
+
+def test_paths_outside_the_store_are_rejected(store):
+    with pytest.raises(ValueError):
+        store.path('../fora')
+
+
+def test_old_keys_only_lists_files_older_than_cutoff(store):
+    stored = store.write(io.BytesIO(b'foto'), 'a.jpg')
+    future = ObjectId.from_datetime(datetime.now(timezone.utc) + timedelta(minutes=1))
+    past = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(minutes=1))
+
+    assert list(store.old_keys(future)) == [stored['file_id']]
+    assert list(store.old_keys(past)) == []
+
+
+def test_copy_blob_checks_sha256(store, tmp_path):
+    target = blob_store.FileSystemStore(str(tmp_path / 'destino'), fsync=False)
+    stored = store.write(io.BytesIO(b'foto'), 'a.jpg')
+
+    copied = migrate_blobs.copy_blob(store, target, stored['file_id'], 'a.jpg', stored['sha256'])
+    assert copied['sha256'] == stored['sha256']
+
+    with pytest.raises(migrate_blobs.ChecksumMismatch):
+        migrate_blobs.copy_blob(store, target, stored['file_id'], 'a.jpg', '0' * 64)
+    assert len(list(target.old_keys(ObjectId.from_datetime(datetime.now(timezone.utc) + timedelta(1))))) == 1
+
+
+class RecordingStore:
+    def __init__(self, name, clock):
+        self.name = name
+        self.clock = clock
+        self.deleted = []
+
+    def delete(self, file_id):
+        self.deleted.append((file_id, self.clock.now))
+
+    def delete_derivatives(self, sha256):
+        pass
+
+
+class FindAll:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        field = next(iter(k for k in query if k != 'sha256'))
+        return [doc for doc in self.docs if field in doc]
+
+
+def test_migration_deletes_the_source_only_after_the_staleness_window(monkeypatch):
+    clock = FakeClock()
+
+    def migrate_blob(*args):
+        clock.now += 50  # cada blob leva 50 s para copiar
+        return True
+
+    def sleep(seconds):
+        clock.now += seconds
+
+    monkeypatch.setattr(migrate_blobs, 'migrate_blob', migrate_blob)
+    source, target = RecordingStore('gridfs', clock), RecordingStore('fs', clock)
+    blobs = FindAll([{'_id': f'sha{i}', 'gridfs_id': f'g{i}'} for i in range(3)])
+
+    totals = migrate_blobs.migrate(None, FindAll([]), blobs, {'gridfs': source, 'fs': target}, 'fs',
+                                   delete_delay=120, clock=clock, sleep=sleep)
+
+    assert totals['blobs'] == 3
+    # Commits em 50, 100 e 150 s: cada origem some 120 s depois do próprio commit
+    assert source.deleted == [('g0', 170.0), ('g1', 220.0), ('g2', 270.0)]
+
+
+def test_photo_file_is_served_from_disk_with_range(store, monkeypatch):
+    stored = store.write(io.BytesIO(b'\xff\xd8\xff0123456789'), 'a.jpg')
+    photo_id = ObjectId()
+    monkeypatch.setattr(api, 'blob_stores', dict(api.blob_stores, fs=store))
+    monkeypatch.setattr(api, 'collection', FakePhotoCollection([{
+        '_id': photo_id, 'storage_path': stored['file_id'], 'filename': 'a.jpg',
+        'content_type': 'image/jpeg', 'upload_date': datetime(2025, 10, 28, 10, 0, 0)
+    }]))
+    client = api.app.test_client()
+
+    response = client.get(f'/api/photos/{photo_id}/file')
+    assert response.status_code == 200
+    assert response.data == b'\xff\xd8\xff0123456789'
+    assert response.headers['Content-Type'] == 'image/jpeg'
+
+    partial = client.get(f'/api/photos/{photo_id}/file', headers={'Range': 'bytes=3-5'})
+    assert partial.status_code == 206
+    assert partial.data == b'012'
+
+    cached = client.get(f'/api/photos/{photo_id}/file', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
@@ -0,0 +1,159 @@
+import io
+
+import pytest
+from bson import Timestamp
+from pymongo import MongoClient, monitoring
+
+import api
+import causal
+import read_routing
+
+
+class FakeSession:
+    def __init__(self, operation_time=None, cluster_time=None):
+        self.operation_time = operation_time
+        self.cluster_time = cluster_time
+        self.advanced = []
+
+    def advance_cluster_time(self, cluster_time):
+        self.advanced.append(('cluster', cluster_time))
+
+    def advance_operation_time(self, operation_time):
+        self.advanced.append(('operation', operation_time))
+
+
+class FakeClient:
+    def __init__(self):
+        self.sessions = []
+
+    def start_session(self, causal_consistency=None):
+        session = FakeSession()
+        session.causal_consistency = causal_consistency
+        self.sessions.append(session)
+        return session
+
+
+WRITE = FakeSession(Timestamp(1700000000, 3), {'clusterTime': Timestamp(1700000000, 3)})
+
+
+def test_token_round_trip_advances_a_causal_session():
+    token = causal.encode_token(WRITE)
+    client = FakeClient()
+
+    session = causal.start_causal_session(client, token)
+
+    assert session.causal_consistency is True
+    assert session.advanced == [('cluster', WRITE.cluster_time), ('operation', WRITE.operation_time)]
+
+
+@pytest.mark.parametrize('mangle', [
+    lambda t: t.replace('.', '.A', 1),
+    lambda t: 'x' + t,
+    lambda t: 'sem-ponto',
+])
+def test_tampered_tokens_are_ignored(mangle):
+    client = FakeClient()
+    assert causal.start_causal_session(client, mangle(causal.encode_token(WRITE))) is None
+    assert client.sessions == []
+
+
+def test_expired_token_is_rejected():
+    token = causal.encode_token(WRITE, now=1000)
+    with pytest.raises(causal.InvalidCausalToken):
+        causal.decode_token(token, now=1000 + causal.CAUSAL_TOKEN_TTL + 1)
+
+
+def test_several_workers_require_a_shared_secret():
+    assert causal.load_secret({'CAUSAL_TOKEN_SECRET': 'segredo', 'WEB_CONCURRENCY': '4'}) == b'segredo'
+    assert len(causal.load_secret({})) == 32
+    assert len(causal.load_secret({'WEB_CONCURRENCY': '1'})) == 32
+    with pytest.raises(causal.MissingCausalSecret):
+        causal.load_secret({'WEB_CONCURRENCY': '4'})
+
+
+def test_header_wins_over_cookie():
+    assert causal.request_token({causal.CAUSAL_HEADER: 'h'}, {causal.CAUSAL_COOKIE: 'c'}) == 'h'
+    assert causal.request_token({}, {causal.CAUSAL_COOKIE: 'c'}) == 'c'
+    assert causal.request_token({}, {}) is None
+
+
+class FindServers(monitoring.CommandListener):
+    """Membros que atenderam cada find"""
+
+    def __init__(self):
+        self.servers = []
+
+    def started(self, event):
+        if event.command_name == 'find':
+            self.servers.append(event.connection_id)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def test_upload_token_reads_own_write_from_secondary(mongo_replset3, monkeypatch):
+    listener = FindServers()
+    client = MongoClient(mongo_replset3, event_listeners=[listener])
+    db = client.test_causal
+    primary = client.primary
+    router = read_routing.ReadRouter(read_routing.load_policies('{"detail": "secondary"}'))
+    monkeypatch.setattr(api, 'client', client)
+    monkeypatch.setattr(api, 'db', db)
+    monkeypatch.setattr(api, 'collection', db.files)
+    monkeypatch.setattr(api, 'blobs', db.blobs)
+    monkeypatch.setattr(api, 'stats', db.stats)
+    monkeypatch.setattr(api, 'fs', None)
+    monkeypatch.setattr(api, 'fs_bucket', None)
+    monkeypatch.setattr(api, 'read_router', router)
+    monkeypatch.setattr(api, 'metadata_cache', api.MetadataCache())
+    http = api.app.test_client()
+    try:
+        response = http.post('/api/photos', data={'file': (io.BytesIO(b'\xff\xd8\xff' + b'0' * 64), 'a.jpg')},
+                             content_type='multipart/form-data')
+        assert response.status_code == 201
+        token = response.headers[causal.CAUSAL_HEADER]
+        photo_id = response.get_json()['data']['_id']
+
+        listener.servers.clear()
+        response = http.get(f'/api/photos/{photo_id}', headers={causal.CAUSAL_HEADER: token})
+
+        assert response.status_code == 200
+        # Lido no secondary (que esperou o token), sem recorrer ao PRIMARY
+        assert listener.servers and primary not in listener.servers
+    finally:
+        client.drop_database('test_causal')
+        client.close()
+
+
+class FakeGridBucket:
+    def __init__(self, name, opened, files=()):
+        self.name = name
+        self.opened = opened
+        self.files = set(files)
+
+    def open_download_stream(self, file_id):
+        self.opened.append(self.name)
+        if file_id not in self.files:
+            raise api.gridfs.errors.NoFile(file_id)
+        return io.BytesIO(b'bytes')
+
+
+def test_causal_file_reads_go_to_the_primary_without_waiting_on_a_secondary(monkeypatch):
+    opened = []
+    monkeypatch.setattr(api, 'get_gridfs_bucket', lambda: FakeGridBucket('primary', opened, {1, 2}))
+    monkeypatch.setattr(api, 'get_read_bucket', lambda: FakeGridBucket('secondary', opened, {1}))
+
+    api.open_grid_file(1, causal=True)
+    assert opened == ['primary']
+
+    opened.clear()
+    api.open_grid_file(1)
+    api.open_grid_file(2)
+    assert opened == ['secondary', 'secondary', 'primary']
+
+    opened.clear()
+    api.open_export_file({'_id': 1, 'gridfs_id': 1}, causal=True)
+    assert opened == ['primary']
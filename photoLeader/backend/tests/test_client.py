@@ -3,7 +3,7 @@ import types
 import pytest
 
 # Import os.path to ensure relative imports work when running pytest from repo root
-from client import upload_sim, read_sim
+from client import load_stats, upload_sim, read_sim
 
 
 class FakeCollection:
@@ -110,3 +110,63 @@ def test_list_gallery_filters_by_tag(monkeypatch, capsys):
     assert '_id=3' in output
     assert '_id=1' in output
     assert '_id=2' not in output
+
+
+def test_run_load_against_mongo_reports_latencies(monkeypatch):
+    fake_client = FakeMongoClient()
+    monkeypatch.setattr(upload_sim, 'MongoClient', lambda *args, **kwargs: fake_client)
+
+    report = upload_sim.run_load('mongo', count=20, workers=4, write_concern='1')
+
+    assert report['requests'] == 20
+    assert report['succeeded'] == 20
+    assert report['errors'] == {}
+    assert len(fake_client._docs) == 20
+    assert sum(b['count'] for b in report['histogram']) == 20
+    assert report['latency_ms']['p50'] <= report['latency_ms']['p99'] <= report['latency_ms']['max']
+
+
+def test_run_workers_open_loop_rate_and_errors():
+    calls = []
+
+    def operation():
+        calls.append(1)
+        if len(calls) % 5 == 0:
+            raise TimeoutError('lento')
+        return 1
+
+    recorder = load_stats.run_workers(operation, workers=2, total=10, rate=100)
+    report = recorder.report()
+
+    assert report['requests'] == 10
+    assert report['errors'] == {'TimeoutError': 2}
+    # 10 requisições a 100/s levam pelo menos ~90 ms
+    assert report['duration_s'] >= 0.09
+
+
+def test_synthetic_images_are_unique_jpegs():
+    filler = b'\0' * 4096
+    a = upload_sim.synthetic_image(4, filler)
+    b = upload_sim.synthetic_image(4, filler)
+    assert len(a) == 4096 and a.startswith(b'\xff\xd8\xff')
+    assert a != b
+
+
+def test_member_listener_groups_find_latency_by_member():
+    listener = read_sim.MemberLatencyListener()
+
+    def event(host, micros, command='find'):
+        return types.SimpleNamespace(connection_id=(host, 27017), duration_micros=micros,
+                                     command_name=command, failure={'errmsg': 'x'})
+
+    listener.succeeded(event('sec1', 2000))
+    listener.succeeded(event('sec1', 4000))
+    listener.succeeded(event('sec2', 1000))
+    listener.succeeded(event('sec2', 1000, command='insert'))
+    listener.failed(event('prim', 1000))
+
+    report = listener.report()
+    assert report['sec1:27017']['requests'] == 2
+    assert report['sec1:27017']['latency_ms']['max'] == 4.0
+    assert report['sec2:27017']['requests'] == 1
+    assert report['prim:27017']['errors'] == {'RuntimeError': 1}
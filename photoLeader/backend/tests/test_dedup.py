@@ -0,0 +1,132 @@
+import io
+import types
+
+import dedup
+import photo_commit
+from blob_store import GridFSStore
+
+
+class FakeBlobs:
+    """Collection `blobs` em memória com o subconjunto de operadores usado pelo dedup"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find_one(self, query):
+        doc = self.docs.get(query['_id'])
+        return dict(doc) if doc else None
+
+    def find(self, query, projection=None, session=None):
+        return [dict(self.docs[sha]) for sha in query['_id']['$in'] if sha in self.docs]
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=None, session=None):
+        doc = self.docs.get(query['_id'])
+        if doc is None:
+            if not upsert:
+                return None
+            doc = dict(update.get('$setOnInsert', {}), _id=query['_id'])
+            self.docs[query['_id']] = doc
+        for field, amount in update.get('$inc', {}).items():
+            doc[field] = doc.get(field, 0) + amount
+        return dict(doc)
+
+    def bulk_write(self, requests, ordered=True, session=None):
+        for op in requests:
+            self.find_one_and_update(op._filter, op._doc, upsert=op._upsert)
+
+    def delete_one(self, query, session=None):
+        doc = self.docs.get(query['_id'])
+        if doc and doc['refcount'] <= query['refcount']['$lte']:
+            del self.docs[query['_id']]
+            return types.SimpleNamespace(deleted_count=1)
+        return types.SimpleNamespace(deleted_count=0)
+
+
+class FakeGridIn:
+    def __init__(self, file_id):
+        self._id = file_id
+
+    def write(self, data):
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class FakeBucket:
+    def __init__(self):
+        self.uploads = 0
+        self.deleted = []
+
+    def open_upload_stream(self, filename, chunk_size_bytes=None, metadata=None):
+        self.uploads += 1
+        return FakeGridIn(f'grid-{self.uploads}')
+
+    def delete(self, file_id):
+        self.deleted.append(file_id)
+
+
+class FakeSession:
+    """Sessão cuja transação só executa o callback (sem commit real)"""
+
+    def __init__(self):
+        self.transactions = 0
+
+    def with_transaction(self, callback):
+        self.transactions += 1
+        return callback(self)
+
+
+class FakePhotos:
+    def __init__(self):
+        self.docs = {}
+
+    def insert_many(self, docs, session=None):
+        for doc in docs:
+            doc.setdefault('_id', f'photo-{len(self.docs)}')
+            self.docs[doc['_id']] = doc
+
+    def find_one_and_delete(self, query, session=None):
+        return self.docs.pop(query['_id'], None)
+
+
+def upload(bucket, blobs, photos, data, filename='a.jpg'):
+    """Grava e faz o commit de uma foto como o api.upload_photo"""
+    stored = dedup.store_deduplicated(GridFSStore(lambda: bucket), blobs, io.BytesIO(data), filename)
+    doc = {'filename': filename, 'sha256': stored['sha256']}
+    surplus = photo_commit.commit_photos(FakeSession(), photos, blobs, [(doc, stored)])
+    return doc, stored, surplus
+
+
+def test_identical_uploads_share_one_gridfs_file():
+    bucket, blobs, photos = FakeBucket(), FakeBlobs(), FakePhotos()
+
+    first, first_stored, _ = upload(bucket, blobs, photos, b'\xff\xd8\xffmesma foto', 'a.jpg')
+    second, second_stored, _ = upload(bucket, blobs, photos, b'\xff\xd8\xffmesma foto', 'b.jpg')
+
+    assert bucket.uploads == 1
+    assert not first_stored['deduplicated']
+    assert second_stored['deduplicated']
+    assert second['gridfs_id'] == first['gridfs_id']
+    assert blobs.docs[first['sha256']]['refcount'] == 2
+
+
+def test_store_does_not_count_references_before_commit():
+    bucket, blobs = FakeBucket(), FakeBlobs()
+
+    dedup.store_deduplicated(GridFSStore(lambda: bucket), blobs, io.BytesIO(b'foto'), 'a.jpg')
+
+    assert blobs.docs == {}
+
+
+def test_release_blob_only_frees_file_on_last_reference():
+    bucket, blobs, photos = FakeBucket(), FakeBlobs(), FakePhotos()
+    doc, _, _ = upload(bucket, blobs, photos, b'foto')
+    upload(bucket, blobs, photos, b'foto', 'b.jpg')
+
+    assert dedup.release_blob(blobs, doc['sha256']) is None
+    assert dedup.release_blob(blobs, doc['sha256']) == ('gridfs', doc['gridfs_id'])
+    assert doc['sha256'] not in blobs.docs
@@ -0,0 +1,183 @@
+import io
+from datetime import datetime, timedelta
+
+import gridfs
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+
+import indexes
+from dedup import BLOBS_COLLECTION
+from pagination import LISTING_SORT, after_cursor, encode_cursor, neighbor_queries
+from search_index import GramSample, document_grams, search_query
+from serialization import parse_fields
+from stats_counters import GLOBAL_RANGE, STATS_COLLECTION, counter_updates, top_cursor
+
+
+class FakeIndexCollection:
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.created = []
+
+    def create_indexes(self, models):
+        if self.fail:
+            raise RuntimeError('IndexOptionsConflict')
+        self.created.extend(model.document for model in models)
+
+    def index_information(self):
+        return {index['name']: {'key': list(index['key'].items())} for index in self.created}
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        self[name] = FakeIndexCollection(name, fail=name == 'stats')
+        return self[name]
+
+
+def test_registry_covers_every_collection_the_api_queries():
+    assert {indexes.PHOTOS_COLLECTION, BLOBS_COLLECTION, STATS_COLLECTION, 'fs.files', 'fs.chunks',
+            'thumbs.files', 'thumbs.chunks'} <= set(indexes.INDEXES)
+    assert indexes.GRIDFS_CHUNKS_INDEX.document['unique']
+
+
+def test_ensure_indexes_keeps_going_after_a_failing_collection():
+    db = FakeDb()
+
+    failed = indexes.ensure_indexes(db)
+
+    assert list(failed) == [STATS_COLLECTION]
+    assert indexes.missing_indexes(db) == {STATS_COLLECTION: ['kind_1_count_-1']}
+
+
+def test_plan_problems_flags_collscan_sort_and_examined_ratio():
+    good = {
+        'queryPlanner': {'winningPlan': {'stage': 'LIMIT', 'inputStage': {
+            'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'upload_date_-1__id_-1'}}}},
+        'executionStats': {'nReturned': 50, 'totalDocsExamined': 50}
+    }
+    bad = {
+        'queryPlanner': {'winningPlan': {'queryPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}}},
+        'executionStats': {'nReturned': 10, 'totalDocsExamined': 1000}
+    }
+
+    assert indexes.plan_problems(good) == []
+    problems = indexes.plan_problems(bad)
+    assert problems[:2] == ['COLLSCAN', 'SORT em memória']
+    assert '100.0 documentos examinados' in problems[2]
+
+
+# ---------- Regressão dos planos (mongod local) ----------
+
+USERS = [f'u{i}' for i in range(8)]
+TAGS = ['natureza', 'praia', 'cidade', 'macro', 'retrato', 'noite', 'viagem', 'comida', 'animais', 'ceu']
+WORDS = ['sol', 'mar', 'montanha', 'rua', 'flor', 'gato', 'cachorro', 'lua', 'rio', 'ponte']
+
+
+def seed(db, count=600):
+    base = datetime(2025, 1, 1)
+    photos = []
+    for i in range(count):
+        sha256 = f'{i:064x}'
+        photo = {
+            '_id': ObjectId(),
+            # Pares com o mesmo upload_date exercitam o desempate pelo _id
+            'upload_date': base + timedelta(minutes=i // 2),
+            'user': USERS[i % len(USERS)],
+            'tags': [TAGS[i % len(TAGS)], TAGS[(i * 7) % len(TAGS)]],
+            'filename': f'IMG_{i:05d}.jpg',
+            'description': f'{WORDS[i % len(WORDS)]} e {WORDS[(i * 3) % len(WORDS)]} numero {i}',
+            'size_kb': 100 + i,
+            'sha256': sha256,
+        }
+        if i % 2:
+            photo['storage_path'] = f'{sha256[:2]}/{sha256[2:4]}/{sha256}-{ObjectId()}'
+        else:
+            photo['gridfs_id'] = ObjectId()
+        photo['search_grams'] = document_grams(photo)
+        photos.append(photo)
+    db[indexes.PHOTOS_COLLECTION].insert_many(photos)
+    db[BLOBS_COLLECTION].insert_many([
+        {'_id': p['sha256'], 'refcount': 1,
+         **{field: p[field] for field in ('gridfs_id', 'storage_path') if field in p}}
+        for p in photos
+    ])
+    db[STATS_COLLECTION].bulk_write([op for p in photos for op in counter_updates(p, 1)], ordered=False)
+
+    bucket = gridfs.GridFSBucket(db)
+    thumbs = gridfs.GridFSBucket(db, bucket_name='thumbs')
+    for p in photos[:40]:
+        bucket.upload_from_stream(p['filename'], io.BytesIO(b'x' * 10), chunk_size_bytes=4)
+        thumbs.upload_from_stream(f"{p['sha256']}/320.webp", io.BytesIO(b'w'))
+    return photos
+
+
+@pytest.fixture(scope='module')
+def seeded(mongo_replset):
+    client = MongoClient(mongo_replset)
+    db = client.test_query_plans
+    assert indexes.ensure_indexes(db) == {}
+    photos = seed(db)
+    yield db, photos
+    client.drop_database('test_query_plans')
+    client.close()
+
+
+def listing(db, query, cursor=None, limit=51):
+    return (db[indexes.PHOTOS_COLLECTION].find(after_cursor(query, cursor), parse_fields(None))
+            .sort(LISTING_SORT).limit(limit))
+
+
+def neighbors(db, anchor, query, which):
+    where, sort = neighbor_queries(query, anchor)[which]
+    return db[indexes.PHOTOS_COLLECTION].find(where, parse_fields(None)).sort(sort).limit(3)
+
+
+# (nome, consulta, limite de documentos examinados por devolvido); cada consulta
+# reproduz uma que a API (api.py, dedup.py, stats_counters.py, GridFS) faz
+QUERY_SHAPES = [
+    ('listing', lambda db, p: listing(db, {}), None),
+    ('listing_cursor', lambda db, p: listing(db, {}, encode_cursor(p[300])), None),
+    ('user', lambda db, p: listing(db, {'user': 'u3'}), None),
+    ('user_cursor', lambda db, p: listing(db, {'user': 'u3'}, encode_cursor(p[400])), None),
+    ('tag', lambda db, p: listing(db, {'tags': 'praia'}), None),
+    ('tag_cursor', lambda db, p: listing(db, {'tags': 'praia'}, encode_cursor(p[400])), None),
+    ('detail', lambda db, p: db[indexes.PHOTOS_COLLECTION].find({'_id': p[10]['_id']}).limit(1), None),
+    ('batch', lambda db, p: db[indexes.PHOTOS_COLLECTION].find(
+        {'_id': {'$in': [d['_id'] for d in p[:20]]}}, parse_fields(None)), None),
+    ('neighbors_previous', lambda db, p: neighbors(db, p[300], {}, 0), None),
+    ('neighbors_next', lambda db, p: neighbors(db, p[300], {}, 1), None),
+    ('neighbors_tag', lambda db, p: neighbors(db, p[300], {'tags': p[300]['tags'][0]}, 1), None),
+    ('search', lambda db, p: db[indexes.PHOTOS_COLLECTION].find(search_query('montanha'), parse_fields(None))
+        .sort(LISTING_SORT).limit(51), 5.0),
+    # ' e ' está em toda descrição: com o trigrama mais raro ('lua') primeiro o índice só percorre candidatas
+    ('search_common_gram', lambda db, p: db[indexes.PHOTOS_COLLECTION].find(
+        search_query('lua e', GramSample(db[indexes.PHOTOS_COLLECTION])), parse_fields(None))
+        .sort(LISTING_SORT).limit(51), 3.0),
+    ('photo_by_gridfs_id', lambda db, p: db[indexes.PHOTOS_COLLECTION].find({'gridfs_id': p[0]['gridfs_id']}),
+     None),
+    ('photo_by_storage_path', lambda db, p: db[indexes.PHOTOS_COLLECTION].find(
+        {'storage_path': p[1]['storage_path']}), None),
+    ('blob', lambda db, p: db[BLOBS_COLLECTION].find({'_id': p[5]['sha256']}).limit(1), None),
+    ('blobs_commit', lambda db, p: db[BLOBS_COLLECTION].find({'_id': {'$in': [d['sha256'] for d in p[:10]]}}),
+     None),
+    ('blob_by_gridfs_id', lambda db, p: db[BLOBS_COLLECTION].find({'gridfs_id': p[0]['gridfs_id']}), None),
+    ('stats_global', lambda db, p: db[STATS_COLLECTION].find(GLOBAL_RANGE, {'photos': 1, 'bytes': 1}), None),
+    ('stats_top_users', lambda db, p: top_cursor(db[STATS_COLLECTION], 'user', 5), None),
+    ('stats_top_tags', lambda db, p: top_cursor(db[STATS_COLLECTION], 'tag', 10), None),
+    ('gridfs_by_name', lambda db, p: db['fs.files'].find({'filename': p[3]['filename']})
+        .sort('uploadDate', -1).limit(1), None),
+    ('gridfs_chunks', lambda db, p: db['fs.chunks'].find(
+        {'files_id': db['fs.files'].find_one()['_id'], 'n': {'$gte': 0}}).sort('n', 1), None),
+    ('thumbs_by_sha256', lambda db, p: db['thumbs.files'].find({'filename': {'$regex': f"^{p[7]['sha256']}/"}}),
+     None),
+]
+
+
+@pytest.mark.parametrize('name,build,max_ratio', QUERY_SHAPES, ids=[shape[0] for shape in QUERY_SHAPES])
+def test_query_plan_uses_an_index(seeded, name, build, max_ratio):
+    db, photos = seeded
+
+    explain = build(db, photos).explain()
+
+    assert indexes.plan_problems(explain, max_ratio or indexes.MAX_EXAMINED_RATIO) == [], name
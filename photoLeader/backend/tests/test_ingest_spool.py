@@ -0,0 +1,300 @@
+import io
+import os
+import zlib
+from contextlib import contextmanager
+
+from unittest.mock import ANY
+
+import pytest
+from bson import ObjectId
+
+import api
+import ingest_spool
+from admission import AdmissionController
+from blob_store import FileSystemStore, GridFSStore
+from ingest_spool import (_HEADER, QUARANTINE_NAME, SPOOL_SUFFIX, IngestSpool, SpoolFull, encode_record,
+                          pending_files, read_records)
+from orphan_sweeper import OrphanSweeper
+from tests.test_admission import FakeTopology
+
+
+def entry(n):
+    doc = {'_id': ObjectId(), 'filename': f'{n}.jpg', 'tags': ['a']}
+    stored = {'store': 'fs', 'file_id': f'ab/cd/{n}', 'sha256': f'{n:064x}', 'length': n, 'deduplicated': False}
+    return doc, stored
+
+
+class RecordingCommit:
+    """commit(entries) que anota os lotes e falha nas primeiras `failures` chamadas"""
+
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def __call__(self, entries):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('sem PRIMARY')
+        self.batches.append([doc['filename'] for doc, _ in entries])
+
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    return str(tmp_path / 'spool')
+
+
+def test_records_round_trip_and_a_torn_tail_is_ignored(spool_dir):
+    spool = IngestSpool(RecordingCommit(), spool_dir, fsync=False).open()
+    first, second = entry(1), entry(2)
+    spool.append([first])
+    spool.append([second])
+    spool.close()
+    with open(spool.path, 'r+b') as f:
+        f.truncate(os.path.getsize(spool.path) - 3)
+
+    with open(spool.path, 'rb') as f:
+        records = list(read_records(f))
+
+    assert [[doc['_id'] for doc, _ in batch] for _, batch in records] == [[first[0]['_id']]]
+    assert records[0][1][0][1] == first[1]
+
+
+def test_drain_commits_in_order_in_batches_and_retries_failures(spool_dir):
+    commit = RecordingCommit(failures=2)
+    spool = IngestSpool(commit, spool_dir, batch=2, retry_seconds=0, fsync=False)
+    for n in range(5):
+        spool.append([entry(n)])
+    assert spool.stats()['pending'] == 5
+    assert spool.stats()['lag_seconds'] >= 0
+
+    while spool.drain():
+        pass
+
+    assert commit.batches == [['0.jpg', '1.jpg'], ['2.jpg', '3.jpg'], ['4.jpg']]
+    assert spool.stats()['errors'] == 2
+    assert spool.stats()['pending'] == 0
+    assert spool.stats()['pending_bytes'] == 0
+
+
+def test_segment_is_reset_once_everything_is_committed(spool_dir):
+    spool = IngestSpool(RecordingCommit(), spool_dir, rotate_bytes=1, fsync=False)
+    spool.append([entry(1)])
+    spool.drain()
+    spool.append([entry(2)])
+    spool.drain()
+
+    assert os.path.getsize(spool.path) == 0
+    assert spool.totals['committed'] == 2
+
+
+def test_full_spool_refuses_appends(spool_dir):
+    spool = IngestSpool(RecordingCommit(), spool_dir, max_bytes=300, fsync=False)
+    spool.append([entry(1)])
+
+    with pytest.raises(SpoolFull):
+        spool.append([entry(2)])
+
+
+def test_segments_of_dead_processes_are_replayed_and_removed(spool_dir):
+    crashed = IngestSpool(RecordingCommit(), spool_dir, fsync=False)
+    for n in range(3):
+        crashed.append([entry(n)])
+    commit = RecordingCommit()
+    restarted = IngestSpool(commit, spool_dir, fsync=False).open()
+
+    # Segmento ainda travado pelo processo dono: não é tocado
+    assert restarted.replay_orphans() == 0
+
+    crashed.close()
+    assert restarted.replay_orphans() == 3
+    assert commit.batches == [['0.jpg', '1.jpg', '2.jpg']]
+    assert not os.path.exists(crashed.path)
+
+
+class FakeSession:
+    pass
+
+
+class FakeClient:
+    @contextmanager
+    def start_session(self, **kwargs):
+        yield FakeSession()
+
+
+class FakeCommitted:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def find(self, query, projection=None):
+        return [{'_id': i} for i in query['_id']['$in'] if i in self.ids]
+
+
+class FakeStore:
+    """Backend em que só os arquivos de `file_ids` existem"""
+
+    def __init__(self, file_ids):
+        self.file_ids = set(file_ids)
+
+    def existing(self, file_ids):
+        return self.file_ids.intersection(file_ids)
+
+
+def test_commit_spooled_skips_photos_already_committed_or_without_bytes(monkeypatch):
+    done, new, vanished = entry(1), entry(2), entry(3)
+    committed = []
+
+    def commit_photos(session, collection, blobs, entries, stats=None):
+        assert stats is api.stats
+        committed.extend(doc['_id'] for doc, _ in entries)
+        return []
+
+    monkeypatch.setattr(api, 'client', FakeClient())
+    monkeypatch.setattr(api, 'collection', FakeCommitted({done[0]['_id']}))
+    monkeypatch.setattr(api, 'stats', object())
+    monkeypatch.setattr(api, 'commit_photos', commit_photos)
+    monkeypatch.setattr(api, 'enqueue_thumbnails', lambda docs: None)
+    monkeypatch.setattr(api, 'blob_stores', {'fs': FakeStore([done[1]['file_id'], new[1]['file_id']])})
+
+    api.commit_spooled([done, new, vanished])
+    api.commit_spooled([done])
+
+    assert committed == [new[0]['_id']]
+
+
+def test_upload_in_spool_mode_answers_202_before_the_commit(monkeypatch, tmp_path, spool_dir):
+    commit = RecordingCommit()
+    spool = IngestSpool(commit, spool_dir, fsync=False)
+    monkeypatch.setattr(api, 'ingest_spool', spool)
+    monkeypatch.setattr(api, 'blob_store', FileSystemStore(str(tmp_path / 'blobs'), fsync=False))
+    monkeypatch.setattr(api, 'admission', AdmissionController())
+
+    response = api.app.test_client().post('/api/photos', data={
+        'file': (io.BytesIO(b'conteudo da foto'), 'foto.jpg'),
+        'user': 'ana',
+    }, content_type='multipart/form-data')
+
+    body = response.get_json()
+    assert response.status_code == 202
+    assert body['data']['status'] == 'queued'
+    assert commit.batches == []
+
+    spool.drain()
+    with open(spool.path, 'rb') as f:
+        [(_, [(doc, stored)])] = read_records(f)
+    assert commit.batches == [['foto.jpg']]
+    assert str(doc['_id']) == body['data']['_id']
+    assert doc['user'] == 'ana'
+    assert os.path.exists(api.blob_store.path(stored['file_id']))
+
+
+def test_spool_skips_the_topology_check_only_when_the_bytes_go_to_disk(monkeypatch, tmp_path, spool_dir):
+    monkeypatch.setattr(api, 'ingest_spool', IngestSpool(RecordingCommit(), spool_dir, fsync=False))
+    monkeypatch.setattr(api, 'admission', AdmissionController(FakeTopology(primary=None)))
+    client = api.app.test_client()
+
+    def upload():
+        return client.post('/api/photos', data={'file': (io.BytesIO(b'foto'), 'foto.jpg')},
+                           content_type='multipart/form-data')
+
+    # GridFS: os bytes ainda são uma escrita majority, então sem PRIMARY a resposta é 503
+    monkeypatch.setattr(api, 'blob_store', GridFSStore(lambda: None))
+    assert upload().status_code == 503
+
+    monkeypatch.setattr(api, 'blob_store', FileSystemStore(str(tmp_path / 'blobs'), fsync=False))
+    assert upload().status_code == 202
+
+
+class PoisonCommit(RecordingCommit):
+    """Recusa sempre os lotes com a foto `poison.jpg`, como um documento que o MongoDB rejeita"""
+
+    def __call__(self, entries):
+        if any(doc['filename'] == 'poison.jpg' for doc, _ in entries):
+            raise ValueError('documento inválido')
+        super().__call__(entries)
+
+
+def test_replay_skips_vanished_segments_and_quarantines_poison_records(monkeypatch, spool_dir):
+    crashed = IngestSpool(RecordingCommit(), spool_dir, fsync=False)
+    poison = entry(9)
+    poison[0]['filename'] = 'poison.jpg'
+    crashed.append([entry(1)])
+    crashed.append([poison])
+    crashed._file.write(_HEADER.pack(len(b'x' * 8), zlib.crc32(b'x' * 8)) + b'x' * 8)  # crc ok, BSON inválido
+    crashed._written += _HEADER.size + 8
+    crashed.append([entry(2)])
+    crashed.close()
+    # Segmento que outro processo drenou e apagou entre o glob e o open
+    gone = os.path.join(spool_dir, f'0-0{SPOOL_SUFFIX}')
+    real_glob = ingest_spool.glob.glob
+    monkeypatch.setattr(ingest_spool.glob, 'glob', lambda pattern: [gone] + real_glob(pattern))
+    commit = PoisonCommit()
+    restarted = IngestSpool(commit, spool_dir, retry_seconds=0, max_attempts=2, fsync=False).open()
+
+    assert restarted.replay_orphans() == 4
+
+    assert commit.batches == [['1.jpg'], ['2.jpg']]
+    assert not os.path.exists(crashed.path)
+    with open(os.path.join(spool_dir, QUARANTINE_NAME), 'rb') as f:
+        quarantined = f.read()
+    undecodable = []
+    records = list(read_records(io.BytesIO(quarantined), quarantine=lambda record, e: undecodable.append(record)))
+    assert [[doc['_id'] for doc, _ in batch] for _, batch in records] == [[], [poison[0]['_id']]]
+    assert undecodable[0].endswith(b'x' * 8)
+    assert restarted.stats()['quarantined'] == 2
+
+
+def test_drain_keeps_retrying_transient_failures_past_max_attempts(spool_dir):
+    commit = RecordingCommit(failures=4)
+    spool = IngestSpool(commit, spool_dir, retry_seconds=0, max_attempts=2, fsync=False)
+    spool.append([entry(1)])
+
+    assert spool.drain() == 1
+    assert commit.batches == [['1.jpg']]
+    assert spool.stats()['quarantined'] == 0
+
+
+def test_pending_files_lists_every_segment_and_the_quarantine(spool_dir):
+    live = IngestSpool(RecordingCommit(), spool_dir, fsync=False)
+    first, second = entry(1), entry(2)
+    live.append([first])
+    live._quarantine(encode_record([second]), ValueError('documento inválido'))
+
+    assert pending_files(spool_dir) == {('fs', first[1]['file_id']), ('fs', second[1]['file_id'])}
+    assert pending_files(os.path.join(spool_dir, 'nada')) == set()
+
+
+class FakeGridFSCollection:
+    """fs.files/fs.chunks/blobs/fotos vazios que anotam os pipelines recebidos"""
+
+    def __init__(self, name='fs.files'):
+        self.name = name
+        self.pipelines = []
+
+    def __getitem__(self, name):
+        return self
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return []
+
+    def find(self, query, projection=None):
+        return []
+
+
+def test_orphan_sweeper_keeps_files_still_in_the_spool(tmp_path, spool_dir):
+    store = FileSystemStore(str(tmp_path / 'blobs'), fsync=False)
+    spooled, orphan = (store.write(io.BytesIO(data), 'foto.jpg')['file_id'] for data in (b'a', b'b'))
+    in_gridfs = ObjectId()
+    spool = IngestSpool(RecordingCommit(), spool_dir, fsync=False)
+    spool.append([({'_id': ObjectId()}, {'store': 'fs', 'file_id': spooled}),
+                  ({'_id': ObjectId()}, {'store': 'gridfs', 'file_id': in_gridfs})])
+    db = FakeGridFSCollection()
+    # Carência negativa: todo arquivo já é "antigo", como num spool parado há horas
+    sweeper = OrphanSweeper(db, db, db, fs_store=store, grace_seconds=-60,
+                            protected=lambda: pending_files(spool_dir))
+
+    assert sweeper.sweep_once()['local_files'] == 1
+
+    assert os.path.exists(store.path(spooled))
+    assert not os.path.exists(store.path(orphan))
+    assert db.pipelines[0][0] == {'$match': {'_id': {'$lt': ANY, '$nin': [in_gridfs]}}}
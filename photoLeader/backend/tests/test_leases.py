@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from leases import Lease
+from orphan_sweeper import OrphanSweeper
+
+
+class FakeLeases:
+    """Collection `leases` em memória: o filtro do acquire() e o upsert com _id único"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def _matches(self, doc, query):
+        return any(doc.get('owner') == cond.get('owner') if 'owner' in cond
+                   else doc['expires_at'] <= cond['expires_at']['$lte'] for cond in query['$or'])
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        doc = self.docs.get(query['_id'])
+        if doc is not None and not self._matches(doc, query):
+            if upsert:
+                raise DuplicateKeyError('E11000')
+            return None
+        doc = self.docs.setdefault(query['_id'], {'_id': query['_id']})
+        doc.update(update['$set'])
+        return dict(doc)
+
+    def delete_one(self, query):
+        if self.docs.get(query['_id'], {}).get('owner') == query['owner']:
+            del self.docs[query['_id']]
+
+
+def test_one_owner_at_a_time_until_the_lease_expires():
+    now = [datetime(2025, 10, 28, 12, 0)]
+    leases = FakeLeases()
+    first, second = (Lease(leases, 'job', 60, owner=name, clock=lambda: now[0]) for name in ('a', 'b'))
+
+    assert first.acquire()
+    assert not second.acquire()
+    now[0] += timedelta(seconds=30)
+    assert first.acquire()  # Renovação
+    now[0] += timedelta(seconds=61)
+    assert second.acquire()
+    assert not first.acquire()
+
+    second.release()
+    assert first.acquire()
+
+
+class CountingSweeper(OrphanSweeper):
+    """Sweeper que só conta as passadas; run() dá `loops` voltas sem esperar o intervalo"""
+
+    def __init__(self, lease):
+        super().__init__({'fs.files': None, 'fs.chunks': None}, None, None, lease=lease)
+        self.passes = 0
+        self.loops = 0
+        self._stop_event.wait = self._tick
+
+    def _tick(self, timeout):
+        self.loops -= 1
+        return self.loops < 0
+
+    def sweep_once(self):
+        self.passes += 1
+
+
+def test_sweeper_skips_passes_without_the_lease():
+    leases = FakeLeases()
+    holder = Lease(leases, 'orphan_sweeper', 600, owner='outro worker')
+    assert holder.acquire()
+    sweeper = CountingSweeper(Lease(leases, 'orphan_sweeper', 600, owner='este worker'))
+
+    sweeper.loops = 3
+    sweeper.run()
+    assert sweeper.passes == 0
+
+    holder.release()
+    sweeper.loops = 3
+    sweeper.run()
+    assert sweeper.passes == 3
+    assert leases.docs['orphan_sweeper']['owner'] == 'este worker'
@@ -0,0 +1,133 @@
+import time
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+import api
+import metadata_cache
+from tests.test_pagination import FakeCursor, make_docs
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_evicts_least_recently_used_and_counts():
+    cache = metadata_cache.MetadataCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+
+
+def test_cache_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = metadata_cache.MetadataCache(ttl=10, clock=clock)
+    cache.set('a', 1)
+
+    clock.now = 9
+    assert cache.get('a') == 1
+    clock.now = 11
+    assert cache.get('a') is None
+
+
+def test_value_loaded_before_an_invalidation_is_not_stored():
+    cache = metadata_cache.MetadataCache()
+
+    def stale_loader():
+        # Uma escrita chega enquanto o valor antigo ainda está sendo lido
+        metadata_cache.invalidate_photo(cache, 'x')
+        return 'antigo'
+
+    assert cache.get_or_load(metadata_cache.photo_key('x'), stale_loader) == 'antigo'
+    assert cache.get(metadata_cache.photo_key('x')) is None
+
+
+def test_misses_are_not_cached():
+    cache = metadata_cache.MetadataCache()
+    key = metadata_cache.photo_key('x')
+
+    assert cache.get_or_load(key, lambda: None) is None
+    assert cache.get_or_load(key, lambda: {'_id': 'x'}) == {'_id': 'x'}
+    assert cache.get(key) == {'_id': 'x'}
+
+
+class LaggingCollection:
+    """Secondary atrasado: vê `stale`; o PRIMARY vê `docs`"""
+
+    def __init__(self, docs, stale, read_preference=None):
+        self.docs = docs
+        self.stale = stale
+        self.read_preference = read_preference
+
+    def with_options(self, read_preference=None):
+        return LaggingCollection(self.docs, self.stale, read_preference)
+
+    def find(self, query, projection=None, **kwargs):
+        primary = self.read_preference is not None and self.read_preference.mongos_mode == 'primary'
+        return FakeCursor(list(self.docs if primary else self.stale))
+
+
+def test_invalidated_listing_is_not_refilled_from_a_lagging_secondary(monkeypatch):
+    old, new = make_docs(2)
+    monkeypatch.setattr(api, 'metadata_cache', metadata_cache.MetadataCache())
+    monkeypatch.setattr(api, 'collection', LaggingCollection([old], [old]))
+    key = metadata_cache.listing_key('all')
+    assert len(api.load_listing(key, {}, 10, None, None)[0]) == 1
+
+    # Upload chega ao PRIMARY, o change stream invalida, o secondary ainda não aplicou
+    api.collection = LaggingCollection([new, old], [old])
+    metadata_cache.invalidate_photo(api.metadata_cache, new['_id'])
+
+    for _ in range(2):
+        photos, _ = api.load_listing(key, {}, 10, None, None)
+        assert [p['_id'] for p in photos] == [str(new['_id']), str(old['_id'])]
+
+
+def test_change_event_invalidates_photo_and_listings():
+    cache = metadata_cache.MetadataCache()
+    invalidator = metadata_cache.ChangeStreamInvalidator(collection=None, cache=cache)
+    photo_id = ObjectId()
+    cache.set(metadata_cache.photo_key(photo_id), {'_id': str(photo_id)})
+    cache.set(metadata_cache.listing_key('user', 'u1', 50, None), ([], None))
+    cache.set(metadata_cache.photo_key(ObjectId()), {})
+
+    invalidator.handle_change({'_id': {'_data': 'token'}, 'documentKey': {'_id': photo_id}})
+
+    assert cache.stats()['entries'] == 1
+    # Sem o change stream ativo, o cache usa o TTL curto
+    assert cache.ttl == metadata_cache.CACHE_FALLBACK_TTL
+
+
+def test_change_stream_invalidates_on_local_replica_set(mongo_replset):
+    client = MongoClient(mongo_replset)
+    collection = client.test_cache.files
+    cache = metadata_cache.MetadataCache()
+    invalidator = metadata_cache.ChangeStreamInvalidator(collection, cache, retry_seconds=0.1)
+    invalidator.start()
+    try:
+        deadline = time.time() + 10
+        while not invalidator.healthy and time.time() < deadline:
+            time.sleep(0.05)
+
+        photo_id = collection.insert_one({'filename': 'a.jpg'}).inserted_id
+        cache.set(metadata_cache.photo_key(photo_id), {'filename': 'a.jpg'})
+        collection.delete_one({'_id': photo_id})
+
+        while cache.stats()['entries'] and time.time() < deadline:
+            time.sleep(0.05)
+        assert cache.get(metadata_cache.photo_key(photo_id)) is None
+    finally:
+        invalidator.stop()
+        client.close()
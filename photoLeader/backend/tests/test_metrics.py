@@ -0,0 +1,68 @@
+import io
+import json
+import logging
+import types
+
+import api
+import logs
+import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram('t_seconds', 'teste', ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, '/a')
+
+    lines = histogram.render()
+
+    assert 't_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{route="/a",le="1"} 3' in lines
+    assert 't_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 't_seconds_count{route="/a"} 4' in lines
+    assert 't_seconds_sum{route="/a"} 4.05' in lines
+
+
+def test_command_listener_times_commands_per_server():
+    before = metrics.mongo_commands.count('find', 'db1:27017')
+    event = types.SimpleNamespace(duration_micros=1500, command_name='find', connection_id=('db1', 27017))
+
+    metrics.CommandMetrics().succeeded(event)
+    metrics.CommandMetrics().failed(event)
+
+    assert metrics.mongo_commands.count('find', 'db1:27017') == before + 2
+    assert metrics.mongo_failures.value('find', 'db1:27017') >= 1
+
+
+def test_metrics_endpoint_reports_route_templates():
+    client = api.app.test_client()
+    client.get('/api/photos/not-an-id/file')
+
+    body = client.get('/api/metrics').get_data(as_text=True)
+
+    assert 'photoleader_http_requests_total{route="/api/photos/<photo_id>/file",method="GET",status="500"}' in body
+    assert 'photoleader_http_request_duration_seconds_bucket{route="/api/photos/<photo_id>/file"' in body
+    assert 'photoleader_cache_hit_ratio' in body
+
+
+def capture(level=logging.INFO):
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logs.JsonFormatter())
+    logs.request_logger.addHandler(handler)
+    logs.request_logger.setLevel(level)
+    return stream, handler
+
+
+def test_request_logging_is_sampled_but_errors_and_slow_requests_always_logged():
+    stream, handler = capture()
+    try:
+        for _ in range(100):
+            logs.log_request('/api/photos', 'GET', 200, 0.01, sample_rate=0, slow_ms=1000)
+        logs.log_request('/api/photos', 'GET', 500, 0.01, sample_rate=0)
+        logs.log_request('/api/photos', 'GET', 200, 2.0, sample_rate=0, slow_ms=1000)
+    finally:
+        logs.request_logger.removeHandler(handler)
+
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(e['level'], e['status']) for e in entries] == [('error', 500), ('warning', 200)]
+    assert entries[1]['duration_ms'] == 2000.0
@@ -0,0 +1,44 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+import gridfs
+from bson import ObjectId
+from pymongo import MongoClient
+
+import orphan_sweeper
+
+
+def test_grace_cutoff_is_an_objectid_in_the_past():
+    now = datetime(2025, 10, 28, 12, 0, tzinfo=timezone.utc)
+
+    cutoff = orphan_sweeper.grace_cutoff(3600, now=now)
+
+    assert cutoff.generation_time == now - timedelta(hours=1)
+    assert ObjectId.from_datetime(now - timedelta(hours=2)) < cutoff
+
+
+def test_sweeper_removes_unreferenced_files_and_chunks(mongo_replset):
+    client = MongoClient(mongo_replset)
+    db = client.test_sweeper
+    bucket = gridfs.GridFSBucket(db)
+    old = datetime.now(timezone.utc) - timedelta(hours=2)
+    try:
+        referenced = ObjectId.from_datetime(old)
+        bucket.upload_from_stream_with_id(referenced, 'a.jpg', io.BytesIO(b'a'))
+        db.blobs.insert_one({'_id': 'sha-a', 'gridfs_id': referenced, 'refcount': 1})
+        orphan_id = ObjectId.from_datetime(old + timedelta(seconds=1))
+        bucket.upload_from_stream_with_id(orphan_id, 'b.jpg', io.BytesIO(b'b'))
+        # Chunks sem fs.files (upload interrompido) e um upload recente ainda sem commit
+        db.fs.chunks.insert_one({'files_id': ObjectId.from_datetime(old + timedelta(seconds=2)), 'n': 0, 'data': b'c'})
+        recent_id = bucket.upload_from_stream('c.jpg', io.BytesIO(b'c'))
+
+        sweeper = orphan_sweeper.OrphanSweeper(db, db.files, db.blobs)
+        result = sweeper.sweep_once()
+
+        assert result == {'files': 1, 'chunk_groups': 1, 'local_files': 0}
+        assert {doc['_id'] for doc in db.fs.files.find()} == {referenced, recent_id}
+        assert db.fs.chunks.count_documents({'files_id': orphan_id}) == 0
+        assert not any(sweeper.sweep_once().values())
+    finally:
+        client.drop_database('test_sweeper')
+        client.close()
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import pagination
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, keys):
+        self._docs = sorted(self._docs, key=lambda d: (d['upload_date'], d['_id']), reverse=keys[0][1] == -1)
+        return self
+
+    def skip(self, n):
+        self._docs = self._docs[n:]
+        return self
+
+    def limit(self, n):
+        self._docs = self._docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self._docs)
+
+
+class FakeCollection:
+    """Avalia apenas o formato de query gerado por after_cursor/neighbor_queries"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.docs if self._matches(d, query)])
+
+    def _matches(self, doc, query):
+        if '$and' in query:
+            return all(self._matches(doc, q) for q in query['$and'])
+        if '$or' in query:
+            return any(self._matches(doc, q) for q in query['$or'])
+        for field, cond in query.items():
+            value = doc.get(field)
+            if isinstance(cond, dict):
+                if '$lt' in cond and not value < cond['$lt']:
+                    return False
+                if '$gt' in cond and not value > cond['$gt']:
+                    return False
+            elif isinstance(value, list):
+                if cond not in value:
+                    return False
+            elif value != cond:
+                return False
+        return True
+
+
+def make_docs(count):
+    base = datetime(2025, 10, 28, 10, 0, 0)
+    # Pares de fotos com o mesmo upload_date exercitam o desempate pelo _id
+    return [{'_id': ObjectId(), 'upload_date': base + timedelta(seconds=i // 2), 'user': f'u{i % 2}'}
+            for i in range(count)]
+
+
+def test_cursor_round_trip():
+    doc = {'_id': ObjectId(), 'upload_date': datetime(2025, 10, 28, 10, 0, 0, 123000)}
+    assert pagination.decode_cursor(pagination.encode_cursor(doc)) == (doc['upload_date'], doc['_id'])
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(pagination.InvalidCursor):
+        pagination.decode_cursor('nao-e-um-cursor')
+
+
+def test_fetch_page_walks_every_document_once():
+    docs = make_docs(11)
+    collection = FakeCollection(docs)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = pagination.fetch_page(collection, {'user': 'u1'}, 2, cursor)
+        seen.extend(d['_id'] for d in page)
+        if cursor is None:
+            break
+
+    expected = sorted((d for d in docs if d['user'] == 'u1'),
+                      key=lambda d: (d['upload_date'], d['_id']), reverse=True)
+    assert seen == [d['_id'] for d in expected]
+
+
+def test_iter_oldest_first_walks_from_an_offset_in_short_pages():
+    docs = make_docs(11)
+    collection = FakeCollection(docs)
+    oldest_first = sorted(docs, key=lambda d: (d['upload_date'], d['_id']))
+
+    assert list(pagination.iter_oldest_first(collection, {}, page_size=4)) == oldest_first
+    assert list(pagination.iter_oldest_first(collection, {}, offset=5, page_size=2)) == oldest_first[5:]
+    assert list(pagination.iter_oldest_first(collection, {'user': 'u1'}, page_size=2)) == \
+        [d for d in oldest_first if d['user'] == 'u1']
+
+
+def test_neighbors_match_the_listing_order():
+    docs = make_docs(9)
+    collection = FakeCollection(docs)
+    listing, _ = pagination.fetch_page(collection, {}, 9)
+
+    previous, following = pagination.fetch_neighbors(collection, listing[4], 2)
+
+    assert [d['_id'] for d in previous] == [listing[3]['_id'], listing[2]['_id']]
+    assert [d['_id'] for d in following] == [listing[5]['_id'], listing[6]['_id']]
+
+
+def test_neighbors_respect_filter_and_ends():
+    docs = make_docs(8)
+    collection = FakeCollection(docs)
+    listing, _ = pagination.fetch_page(collection, {'user': 'u0'}, 8)
+
+    previous, following = pagination.fetch_neighbors(collection, listing[0], 3, {'user': 'u0'})
+
+    assert previous == []
+    assert [d['_id'] for d in following] == [d['_id'] for d in listing[1:4]]
+
+
+def test_parse_ids_keeps_order_and_drops_repeats():
+    a, b = ObjectId(), ObjectId()
+    assert pagination.parse_ids(f'{a}, {b},{a}') == [a, b]
+    for value in (None, '', 'nao-e-id', ','.join(str(ObjectId()) for _ in range(3))):
+        with pytest.raises(pagination.InvalidIds):
+            pagination.parse_ids(value, limit=2)
+
+
+def test_parse_page_size_clamps_and_rejects_non_numbers():
+    assert pagination.parse_page_size(None) == pagination.DEFAULT_PAGE_SIZE
+    assert pagination.parse_page_size('0') == 1
+    assert pagination.parse_page_size('100000') == pagination.MAX_PAGE_SIZE
+    with pytest.raises(pagination.InvalidPageSize):
+        pagination.parse_page_size('abc')
@@ -0,0 +1,79 @@
+import io
+
+import pytest
+
+import dedup
+import photo_commit
+import stats_counters
+from blob_store import GridFSStore
+from tests.test_dedup import FakeBlobs, FakeBucket, FakePhotos, FakeSession
+from tests.test_stats_counters import FakeStatsCollection
+
+
+def stored_entry(bucket, blobs, data, filename):
+    stored = dedup.store_deduplicated(GridFSStore(lambda: bucket), blobs, io.BytesIO(data), filename)
+    return {'filename': filename, 'sha256': stored['sha256']}, stored
+
+
+def test_batch_commit_is_one_transaction_and_reports_surplus_copies():
+    bucket, blobs, photos, session = FakeBucket(), FakeBlobs(), FakePhotos(), FakeSession()
+    # Mesmo conteúdo duas vezes no lote: os dois arquivos são gravados antes do commit
+    entries = [stored_entry(bucket, blobs, b'igual', 'a.jpg'),
+               stored_entry(bucket, blobs, b'outra', 'b.jpg'),
+               stored_entry(bucket, blobs, b'igual', 'c.jpg')]
+
+    surplus = photo_commit.commit_photos(session, photos, blobs, entries)
+
+    assert session.transactions == 1
+    assert len(photos.docs) == 3
+    a, _, c = (doc for doc, _ in entries)
+    assert a['gridfs_id'] == c['gridfs_id']
+    assert blobs.docs[a['sha256']]['refcount'] == 2
+    assert surplus == [('gridfs', entries[2][1]['file_id'])]
+
+
+def test_commit_fails_when_reused_blob_disappeared():
+    bucket, blobs, photos = FakeBucket(), FakeBlobs(), FakePhotos()
+    photo_commit.commit_photos(FakeSession(), photos, blobs, [stored_entry(bucket, blobs, b'foto', 'a.jpg')])
+    doc, stored = stored_entry(bucket, blobs, b'foto', 'b.jpg')
+    assert stored['deduplicated']
+    blobs.docs.clear()
+
+    with pytest.raises(photo_commit.BlobGone) as error:
+        photo_commit.commit_photos(FakeSession(), photos, blobs, [(doc, stored)])
+
+    assert error.value.sha256s == {stored['sha256']}
+    assert len(photos.docs) == 1
+    assert stored['sha256'] not in blobs.docs
+
+
+def test_remove_photo_releases_blob_in_the_same_transaction():
+    bucket, blobs, photos, session = FakeBucket(), FakeBlobs(), FakePhotos(), FakeSession()
+    entries = [stored_entry(bucket, blobs, b'foto', 'a.jpg'), stored_entry(bucket, blobs, b'foto', 'b.jpg')]
+    photo_commit.commit_photos(FakeSession(), photos, blobs, entries)
+    (first, _), (second, _) = entries
+
+    photo, gridfs_id = photo_commit.remove_photo(session, photos, blobs, {'_id': first['_id']})
+    assert photo is first and gridfs_id is None
+
+    photo, gridfs_id = photo_commit.remove_photo(session, photos, blobs, {'_id': second['_id']})
+    assert gridfs_id == ('gridfs', second['gridfs_id'])
+    assert blobs.docs == {}
+    assert session.transactions == 2
+    assert photo_commit.remove_photo(session, photos, blobs, {'_id': second['_id']}) == (None, None)
+
+
+def test_counters_change_inside_the_commit_and_remove_transactions():
+    bucket, blobs, photos, session = FakeBucket(), FakeBlobs(), FakePhotos(), FakeSession()
+    stats = FakeStatsCollection()
+    entries = [stored_entry(bucket, blobs, b'foto', 'a.jpg'), stored_entry(bucket, blobs, b'outra', 'b.jpg')]
+    for doc, _ in entries:
+        doc.update(user='ana', tags=['praia'], size_kb=1)
+
+    photo_commit.commit_photos(session, photos, blobs, entries, stats)
+    photo_commit.remove_photo(session, photos, blobs, {'_id': entries[0][0]['_id']}, stats)
+
+    assert stats.sessions == [session, session]
+    assert stats_counters.read_stats(stats)['total_photos'] == 1
+    assert stats.docs['user:ana']['count'] == 1
+    assert stats.docs['tag:praia']['count'] == 1
@@ -0,0 +1,78 @@
+import pytest
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+import read_routing
+
+
+class FakeCollection:
+    """Collection que responde conforme a read preference em uso"""
+
+    def __init__(self, docs_by_mode, read_preference=None, calls=None):
+        self.docs_by_mode = docs_by_mode
+        self.read_preference = read_preference
+        self.calls = calls if calls is not None else []
+
+    def with_options(self, read_preference=None):
+        return FakeCollection(self.docs_by_mode, read_preference, self.calls)
+
+    def find_one(self, query, projection=None):
+        mode = self.read_preference.mongos_mode
+        self.calls.append(mode)
+        return self.docs_by_mode.get(mode)
+
+
+def test_default_policy_reads_from_secondaries_with_bounded_staleness():
+    router = read_routing.ReadRouter()
+    preference = router.preference('listing')
+    assert isinstance(preference, SecondaryPreferred)
+    assert preference.max_staleness == 90
+    assert set(router.describe()) == set(read_routing.READ_CLASSES)
+
+
+def test_policies_are_overridden_per_endpoint_class():
+    policies = read_routing.load_policies(
+        '{"detail": "primary", "search": {"mode": "nearest", "tags": [{"dc": "lab"}, {}], "max_staleness": 120}}'
+    )
+    router = read_routing.ReadRouter(policies)
+
+    assert isinstance(router.preference('detail'), Primary)
+    assert router.describe()['search'] == {'mode': 'nearest', 'tags': [{'dc': 'lab'}, {}],
+                                           'maxStalenessSeconds': 120}
+    assert isinstance(router.preference('listing'), SecondaryPreferred)
+
+
+@pytest.mark.parametrize('raw', [
+    '{"listing": {"mode": "secondary", "max_staleness": 10}}',
+    '{"detail": {"mode": "primary", "tags": [{"dc": "lab"}]}}',
+    '{"thumbnails": "nearest"}',
+    '{"listing": "fastest"}',
+    'not json'
+])
+def test_invalid_policies_are_rejected(raw):
+    with pytest.raises(read_routing.InvalidReadPolicy):
+        read_routing.ReadRouter(read_routing.load_policies(raw))
+
+
+def test_point_read_missing_on_secondary_is_retried_on_primary():
+    doc = {'_id': 1}
+    coll = FakeCollection({'primary': doc})
+    router = read_routing.ReadRouter()
+
+    assert router.find_one(coll, 'detail', {'_id': 1}) == doc
+    assert coll.calls == ['secondaryPreferred', 'primary']
+
+
+def test_point_read_found_on_secondary_does_not_touch_primary():
+    coll = FakeCollection({'secondaryPreferred': {'_id': 1}})
+    router = read_routing.ReadRouter()
+
+    router.find_one(coll, 'detail', {'_id': 1})
+    assert coll.calls == ['secondaryPreferred']
+
+
+def test_cache_fill_reads_on_primary_even_without_session():
+    coll = FakeCollection({'primary': {'_id': 1}, 'secondaryPreferred': None})
+    router = read_routing.ReadRouter()
+
+    assert router.find_one(coll, 'detail', {'_id': 1}, primary=True) == {'_id': 1}
+    assert coll.calls == ['primary']
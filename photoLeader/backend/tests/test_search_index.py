@@ -0,0 +1,57 @@
+import pytest
+
+import search_index
+
+
+def test_normalize_strips_accents_and_case():
+    assert search_index.normalize('  Pôr do   SOL ') == 'por do sol'
+
+
+def test_document_grams_cover_every_substring_of_the_fields():
+    doc = {'filename': 'IMG_01.jpg', 'description': 'Pôr do sol na praia'}
+    grams = set(search_index.document_grams(doc))
+
+    query = search_index.search_query('DO SOL')
+    assert set(query['search_grams']['$all']) <= grams
+    assert search_index.matches(doc, 'do sol')
+
+
+def test_matches_discards_trigram_false_positives():
+    # 'abcab' contém os trigramas de 'cabc' ('cab', 'abc'), mas não a substring
+    doc = {'filename': 'abcab', 'description': ''}
+    query = search_index.search_query('cabc')
+
+    assert set(query['search_grams']['$all']) <= set(search_index.document_grams(doc))
+    assert not search_index.matches(doc, 'cabc')
+
+
+def test_search_query_treats_input_literally_and_requires_min_length():
+    assert search_index.search_query('.*(')['search_grams']['$all'] == ['.*(']
+    with pytest.raises(search_index.InvalidSearch):
+        search_index.search_query('ab')
+
+
+class FakeSampleCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.samples = 0
+
+    def aggregate(self, pipeline):
+        self.samples += 1
+        return [{'search_grams': doc['search_grams']} for doc in self.docs[:pipeline[0]['$sample']['size']]]
+
+
+def test_search_query_puts_the_rarest_gram_first():
+    docs = [{'search_grams': search_index.document_grams({'description': f'{word} e sol'})}
+            for word in ['lua'] + ['mar'] * 9]
+    now = [0]
+    sample = search_index.GramSample(FakeSampleCollection(docs), size=100, ttl=60, clock=lambda: now[0])
+
+    assert search_index.search_query('lua e', sample)['search_grams']['$all'][0] == 'lua'
+    # Sem amostra, os trigramas com espaço e os de STOP_GRAMS vão para o fim
+    assert search_index.search_query('img lua')['search_grams']['$all'] == ['lua', ' lu', 'g l', 'img', 'mg ']
+
+    sample('lua')
+    now[0] = 61
+    sample('lua')
+    assert sample.collection.samples == 2
@@ -0,0 +1,45 @@
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+import serialization
+
+
+def test_parse_fields_defaults_to_card_projection():
+    projection = serialization.parse_fields(None)
+    assert set(projection) == set(serialization.CARD_FIELDS) | {'storage_path'}
+    assert 'sha256' not in projection
+
+
+def test_parse_fields_always_keeps_cursor_and_url_fields():
+    projection = serialization.parse_fields('filename, tags')
+    assert set(projection) == {'filename', 'tags', 'upload_date', 'gridfs_id', 'storage_path'}
+    assert serialization.parse_fields('all') is serialization.FULL_DOCUMENT
+    assert serialization.parse_fields(None, default=None) is serialization.FULL_DOCUMENT
+
+
+def test_parse_fields_rejects_unknown_fields():
+    with pytest.raises(serialization.InvalidFields):
+        serialization.parse_fields('filename,senha')
+
+
+def test_serialize_photo_converts_in_a_single_pass_without_mutating():
+    doc = {
+        '_id': ObjectId(),
+        'gridfs_id': ObjectId(),
+        'upload_date': datetime(2025, 10, 28, 10, 0, 0),
+        'tags': ['natureza']
+    }
+    original = dict(doc)
+
+    out = serialization.serialize_photo(doc)
+
+    assert doc == original
+    assert out['_id'] == str(doc['_id'])
+    assert out['gridfs_id'] == str(doc['gridfs_id'])
+    assert out['upload_date'] == '2025-10-28T10:00:00'
+    assert out['photo_url'] == f"/api/photos/{doc['_id']}/file"
+    assert out['thumb_url'] == f"{out['photo_url']}?w={serialization.THUMB_DEFAULT_WIDTH}"
+    assert json.loads(serialization.dumps({'photo': out}))['photo'] == out
@@ -0,0 +1,122 @@
+import gzip
+import json
+import re
+
+import pytest
+
+import api
+import static_assets
+
+
+@pytest.fixture
+def frontend(tmp_path):
+    source = tmp_path / 'frontend'
+    (source / 'img').mkdir(parents=True)
+    (source / 'img' / 'fundo.png').write_bytes(b'\x89PNG fake')
+    (source / 'estilo.css').write_text("body { background: url('img/fundo.png'); }")
+    (source / 'app.js').write_text("console.log('ok');")
+    (source / 'login.html').write_text(
+        '<link rel="icon" href = "img/fundo.png">'
+        '<link rel="stylesheet" href="estilo.css"><script src="app.js"></script><a href="inicial.html">x</a>'
+    )
+    return source
+
+
+def test_build_fingerprints_and_rewrites_references(frontend, tmp_path):
+    dist = tmp_path / 'dist'
+
+    manifest = static_assets.build(str(frontend), str(dist))
+
+    css = manifest['estilo.css']
+    assert css.startswith('static/estilo.') and css.endswith('.css')
+    assert f"url('/{manifest['img/fundo.png']}')" in (dist / css).read_text()
+    html = (dist / 'login.html').read_text()
+    assert f'href="/{css}"' in html and f'src="/{manifest["app.js"]}"' in html
+    assert f'href = "/{manifest["img/fundo.png"]}"' in html
+    assert 'href="inicial.html"' in html  # páginas mantêm o nome
+    assert gzip.decompress((dist / (css + '.gz')).read_bytes()) == (dist / css).read_bytes()
+    assert not (dist / (manifest['img/fundo.png'] + '.gz')).exists()
+    assert json.loads((dist / 'manifest.json').read_text()) == manifest
+
+
+# Qualquer referência a arquivo nos HTML/CSS, escrita como for
+LOOSE_REFERENCE = re.compile(r'''(?:href|src)\s*=\s*["']([^"']+)["']|url\(\s*["']?([^"')]+)''')
+
+
+def test_build_of_the_real_frontend_leaves_no_local_reference_behind(tmp_path):
+    dist = tmp_path / 'dist'
+    manifest = static_assets.build(static_assets.FRONTEND_DIR, str(dist))
+
+    leftovers = []
+    for page in [p for p in dist.rglob('*') if p.suffix in ('.html', '.css')]:
+        for match in LOOSE_REFERENCE.finditer(page.read_text()):
+            path = (match.group(1) or match.group(2)).strip()
+            if (path[2:] if path.startswith('./') else path) in manifest:
+                leftovers.append((page.name, path))
+
+    assert manifest and leftovers == []
+
+
+def test_hash_changes_only_with_content(frontend, tmp_path):
+    first = static_assets.build(str(frontend), str(tmp_path / 'a'))
+    (frontend / 'app.js').write_text("console.log('novo');")
+    second = static_assets.build(str(frontend), str(tmp_path / 'b'))
+
+    assert first['estilo.css'] == second['estilo.css']
+    assert first['app.js'] != second['app.js']
+
+
+def test_plan_marks_hashed_assets_immutable_and_picks_encoding(frontend, tmp_path):
+    manifest = static_assets.build(str(frontend), str(tmp_path / 'dist'))
+    store = static_assets.AssetStore(str(tmp_path / 'dist'), str(frontend))
+
+    status, file_path, headers = store.plan(manifest['estilo.css'], 'gzip, deflate')
+    assert status == 200 and file_path.endswith('.css.gz')
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Cache-Control'] == static_assets.HASHED_CACHE_CONTROL
+
+    _, file_path, headers = store.plan(manifest['estilo.css'], 'identity')
+    assert file_path.endswith('.css') and 'Content-Encoding' not in headers
+
+    _, _, headers = store.plan(manifest['img/fundo.png'], 'gzip')
+    assert 'Content-Encoding' not in headers and headers['Content-Type'] == 'image/png'
+
+
+def test_plan_revalidates_html_with_etag(frontend, tmp_path):
+    static_assets.build(str(frontend), str(tmp_path / 'dist'))
+    store = static_assets.AssetStore(str(tmp_path / 'dist'), str(frontend))
+
+    status, _, headers = store.plan('login.html')
+    assert status == 200 and headers['Cache-Control'] == 'no-cache'
+
+    status, _, _ = store.plan('login.html', if_none_match=headers['ETag'])
+    assert status == 304
+    assert store.plan('manifest.json') is None
+    assert store.plan('../frontend/login.html') is None
+
+
+def test_plan_serves_source_tree_without_build(frontend, tmp_path):
+    store = static_assets.AssetStore(str(tmp_path / 'sem-dist'), str(frontend))
+
+    status, file_path, headers = store.plan('estilo.css', 'gzip')
+    assert not store.built
+    assert status == 200 and file_path == str(frontend / 'estilo.css')
+    assert headers['Cache-Control'] == 'no-cache'
+
+
+def test_flask_routes_serve_built_assets(frontend, tmp_path, monkeypatch):
+    manifest = static_assets.build(str(frontend), str(tmp_path / 'dist'))
+    monkeypatch.setattr(api, 'static_store', static_assets.AssetStore(str(tmp_path / 'dist'), str(frontend)))
+    client = api.app.test_client()
+
+    response = client.get('/' + manifest['estilo.css'], headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == static_assets.HASHED_CACHE_CONTROL
+    assert gzip.decompress(response.data).startswith(b'body')
+
+    index = client.get('/')
+    assert index.status_code == 200 and b'/static/estilo.' in index.data
+    assert client.get('/', headers={'If-None-Match': index.headers['ETag']}).status_code == 304
+    assert client.get('/nao-existe.js').status_code == 404
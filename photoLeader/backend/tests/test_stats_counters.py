@@ -0,0 +1,78 @@
+from pymongo import UpdateOne
+
+import stats_counters
+
+
+class FakeStatsCollection:
+    """Collection `stats` em memória: aplica $inc/$setOnInsert e o top-N ordenado"""
+
+    def __init__(self):
+        self.docs = {}
+        self.sessions = []
+
+    def bulk_write(self, requests, ordered=True, session=None):
+        self.sessions.append(session)
+        for request in requests:
+            doc_id = request._filter['_id']
+            doc = self.docs.setdefault(doc_id, dict(request._doc.get('$setOnInsert', {}), _id=doc_id))
+            for field, amount in request._doc['$inc'].items():
+                doc[field] = doc.get(field, 0) + amount
+
+    def find(self, query, projection=None):
+        if '_id' in query:
+            bounds = query['_id']
+            return [d for i, d in self.docs.items() if bounds['$gte'] <= i < bounds['$lt']]
+        docs = [d for d in self.docs.values()
+                if d.get('kind') == query['kind'] and d['count'] > query['count']['$gt']]
+        return FakeCursor(docs)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    def sort(self, field, direction):
+        self._docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        return iter(self._docs[:n])
+
+
+def test_counter_updates_increment_global_user_and_tags():
+    photo = {'user': 'ana', 'tags': ['praia', 'sol'], 'size_kb': 2.0}
+
+    updates = stats_counters.counter_updates(photo, slot=3)
+
+    assert updates[0] == UpdateOne({'_id': 'global:3'}, {'$inc': {'photos': 1, 'bytes': 2048}}, upsert=True)
+    assert [u._filter['_id'] for u in updates] == ['global:3', 'user:ana', 'tag:praia', 'tag:sol']
+
+
+def test_global_total_is_spread_over_slots_and_summed_on_read():
+    stats = FakeStatsCollection()
+    # Total antigo (rebuild) num documento sem slot
+    stats.docs['global'] = {'_id': 'global', 'photos': 5, 'bytes': 5120}
+    for _ in range(50):
+        stats_counters.apply_photo(stats, {'user': 'ana', 'size_kb': 1.0}, 1)
+
+    slots = [i for i in stats.docs if i.startswith('global:')]
+    assert 1 < len(slots) <= stats_counters.STATS_GLOBAL_SLOTS
+    assert stats_counters.read_stats(stats)['total_photos'] == 55
+    assert stats_counters.read_stats(stats)['total_bytes'] == 55 * 1024
+
+
+def test_read_stats_reflects_uploads_and_deletes():
+    stats = FakeStatsCollection()
+    first = {'user': 'ana', 'tags': ['praia'], 'size_kb': 1.0}
+    second = {'user': 'ana', 'tags': ['praia', 'sol'], 'size_kb': 1.0}
+    third = {'user': 'bia', 'tags': ['sol'], 'size_kb': 1.0}
+    for photo in (first, second, third):
+        stats_counters.apply_photo(stats, photo, 1)
+    stats_counters.apply_photo(stats, second, -1)
+
+    summary = stats_counters.read_stats(stats)
+
+    assert summary['total_photos'] == 2
+    assert summary['total_bytes'] == 2048
+    assert summary['top_users'] == [{'_id': 'ana', 'count': 1}, {'_id': 'bia', 'count': 1}]
+    assert {'_id': 'praia', 'count': 1} in summary['top_tags']
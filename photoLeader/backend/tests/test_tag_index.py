@@ -0,0 +1,120 @@
+import pytest
+
+import api
+from tag_index import TAG_TOP_K, InvalidLimit, TagIndex, parse_limit
+
+PHOTOS = [
+    {'user': 'ana', 'tags': ['praia', 'por', 'praça']},
+    {'user': 'ana', 'tags': ['praia', 'noite']},
+    {'user': 'bia', 'tags': ['praia', 'praça', 'montanha']},
+    {'user': 'bia', 'tags': ['prato']},
+]
+
+
+@pytest.fixture
+def index():
+    index = TagIndex()
+    index.rebuild(PHOTOS)
+    return index
+
+
+def test_suggest_orders_by_count_then_alphabetically(index):
+    assert index.suggest('pr') == [('praia', 3), ('praça', 2), ('prato', 1)]
+    assert index.suggest('pr', limit=1) == [('praia', 3)]
+    assert index.suggest('x') == []
+
+
+def test_suggest_and_facets_by_user(index):
+    assert index.suggest('pr', user='bia') == [('praia', 1), ('prato', 1), ('praça', 1)]
+    assert index.facets('ana') == [('praia', 2), ('noite', 1), ('por', 1), ('praça', 1)]
+    assert index.facets() == index.suggest('')
+    assert index.facets('ninguem') == []
+
+
+def test_apply_keeps_counts_and_sorted_tags_current(index):
+    index.apply({'user': 'caio', 'tags': ['prato', 'prato novo']})
+    index.apply({'user': 'bia', 'tags': ['montanha', 'praia', 'praça']}, -1)
+
+    assert index.suggest('pr') == [('praia', 2), ('prato', 2), ('prato novo', 1), ('praça', 1)]
+    assert index.suggest('mon') == []
+    assert index.facets('caio') == [('prato', 1), ('prato novo', 1)]
+    assert index.stats()['tags'] == 6
+
+
+def test_cached_top_follows_increments_and_is_dropped_on_decrements():
+    index = TagIndex(scan_limit=2, top_k=3)
+    index.rebuild([{'user': 'ana', 'tags': [f'tag{i}']} for i in range(5)]
+                  + [{'user': 'bia', 'tags': ['tag4']}])
+
+    assert index.suggest('t', limit=2) == [('tag4', 2), ('tag0', 1)]
+    assert index.stats()['cached_prefixes'] == 1
+
+    for _ in range(3):
+        index.apply({'user': 'bia', 'tags': ['tag3']})
+    assert index.suggest('t', limit=2) == [('tag3', 4), ('tag4', 2)]
+
+    for _ in range(3):
+        index.apply({'user': 'bia', 'tags': ['tag3']}, -1)
+    assert index.stats()['cached_prefixes'] == 0
+    assert index.suggest('t', limit=2) == [('tag4', 2), ('tag0', 1)]
+
+
+def test_cached_top_matches_a_full_scan_after_many_updates():
+    cached = TagIndex(scan_limit=1, top_k=5)
+    scanned = TagIndex(scan_limit=10 ** 6)
+    photos = [{'user': f'u{i % 3}', 'tags': [f'a{i % 7}', f'b{i % 5}']} for i in range(40)]
+    for index in (cached, scanned):
+        index.rebuild(photos[:20])
+    cached.suggest('a')
+    cached.suggest('', user='u1')
+
+    for i, photo in enumerate(photos[20:]):
+        for index in (cached, scanned):
+            index.apply(photo)
+            index.apply(photos[i], -1)
+
+    assert cached.suggest('a', limit=5) == scanned.suggest('a', limit=5)
+    assert cached.facets('u1', limit=5) == scanned.facets('u1', limit=5)
+
+
+def test_parse_limit():
+    assert parse_limit(None) == 10
+    assert parse_limit('5') == 5
+    for value in ('0', 'abc', str(TAG_TOP_K + 1)):
+        with pytest.raises(InvalidLimit):
+            parse_limit(value)
+
+
+def test_memory_estimate_grows_with_the_tags(index):
+    small = index.memory_bytes()
+    index.apply({'user': 'caio', 'tags': [f'tag{i}' for i in range(1000)]})
+
+    assert index.memory_bytes() > small + 1000 * 50
+
+
+@pytest.fixture
+def client(monkeypatch, index):
+    monkeypatch.setattr(api, 'tag_index', index)
+    return api.app.test_client()
+
+
+def test_suggest_endpoint(client):
+    response = client.get('/api/tags/suggest?prefix=pra&limit=2')
+
+    assert response.status_code == 200
+    assert response.get_json()['tags'] == [{'tag': 'praia', 'count': 3}, {'tag': 'praça', 'count': 2}]
+
+
+def test_facets_endpoint_filters_by_user(client):
+    response = client.get('/api/tags/facets?user=bia&limit=1')
+
+    assert response.get_json()['tags'] == [{'tag': 'montanha', 'count': 1}]
+
+
+def test_tag_endpoints_validate_limit_and_wait_for_the_index(client, monkeypatch):
+    assert client.get('/api/tags/suggest?limit=0').status_code == 400
+
+    monkeypatch.setattr(api, 'tag_index', TagIndex())
+    response = client.get('/api/tags/facets')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
@@ -0,0 +1,192 @@
+import io
+import pickle
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+import api
+import blob_store
+import thumbnails
+from tests.test_api import FakePhotoCollection
+
+
+def fake_render(data, targets):
+    return [f'{width}.{fmt}:'.encode() + data for width, fmt in targets]
+
+
+class FakeBlobs:
+    def __init__(self, sha256s):
+        self.sha256s = set(sha256s)
+
+    def find_one(self, query, projection=None):
+        return {'_id': query['_id']} if query['_id'] in self.sha256s else None
+
+
+@pytest.fixture
+def store(tmp_path):
+    return blob_store.FileSystemStore(str(tmp_path / 'blobs'), fsync=False)
+
+
+def make_thumbnailer(store, blobs):
+    return thumbnails.Thumbnailer({'fs': store}, blobs, widths=(160, 320), formats=('jpeg', 'webp'),
+                                  workers=0, render=fake_render)
+
+
+def test_pick_width_uses_smallest_width_that_covers_request():
+    assert thumbnails.pick_width(100, (160, 320, 640)) == 160
+    assert thumbnails.pick_width(320, (160, 320, 640)) == 320
+    assert thumbnails.pick_width(321, (160, 320, 640)) == 640
+    assert thumbnails.pick_width(5000, (160, 320, 640)) == 640
+
+
+def test_pick_format_needs_explicit_webp_in_accept():
+    assert thumbnails.pick_format('image/avif,image/webp,*/*;q=0.8') == 'webp'
+    assert thumbnails.pick_format('*/*') == 'jpeg'
+    assert thumbnails.pick_format(None) == 'jpeg'
+
+
+def test_parse_width_rejects_non_positive_values():
+    assert thumbnails.parse_width(None) is None
+    assert thumbnails.parse_width('320') == 320
+    for value in ('0', '-5', 'grande'):
+        with pytest.raises(thumbnails.InvalidWidth):
+            thumbnails.parse_width(value)
+
+
+def test_generate_writes_every_derivative_next_to_the_original(store):
+    stored = store.write(io.BytesIO(b'foto'), 'a.jpg')
+    thumbnailer = make_thumbnailer(store, FakeBlobs([stored['sha256']]))
+
+    thumbnailer.generate(stored['sha256'], 'fs', stored['file_id'])
+
+    derivative = store.open_derivative(stored['sha256'], '320.webp')
+    assert derivative.metadata['contentType'] == 'image/webp'
+    with open(derivative.path, 'rb') as f:
+        assert f.read() == b'320.webp:foto'
+    # Derivados não contam como arquivos órfãos do backend
+    assert list(store.old_keys(ObjectId())) == [stored['file_id']]
+
+
+def test_generate_drops_derivatives_of_removed_blob(store):
+    stored = store.write(io.BytesIO(b'foto'), 'a.jpg')
+    thumbnailer = make_thumbnailer(store, FakeBlobs([]))
+
+    thumbnailer.generate(stored['sha256'], 'fs', stored['file_id'])
+
+    assert store.open_derivative(stored['sha256'], '160.jpg') is None
+
+
+def test_derivative_is_generated_on_demand_and_then_reused(store):
+    stored = store.write(io.BytesIO(b'foto'), 'a.jpg')
+    thumbnailer = make_thumbnailer(store, FakeBlobs([stored['sha256']]))
+
+    first = thumbnailer.derivative(stored['sha256'], 'fs', stored['file_id'], 160, 'jpeg')
+    again = thumbnailer.derivative(stored['sha256'], 'fs', stored['file_id'], 160, 'jpeg')
+
+    assert first.path == again.path
+    assert thumbnailer.totals['on_demand'] == 1
+    thumbnailer.discard(stored['sha256'], 'fs')
+    assert store.open_derivative(stored['sha256'], '160.jpg') is None
+
+
+def test_submit_queues_each_content_once(store):
+    thumbnailer = make_thumbnailer(store, FakeBlobs([]))
+
+    assert thumbnailer.submit('a' * 64, 'fs', 'x')
+    assert thumbnailer.submit('a' * 64, 'fs', 'x')
+    assert thumbnailer._queue.qsize() == 1
+
+
+@pytest.fixture
+def disk_photo(store, monkeypatch):
+    stored = store.write(io.BytesIO(b'\xff\xd8\xfforiginal'), 'a.jpg')
+    photo_id = ObjectId()
+    monkeypatch.setattr(api, 'blob_stores', dict(api.blob_stores, fs=store))
+    monkeypatch.setattr(api, 'thumbnailer', make_thumbnailer(store, FakeBlobs([stored['sha256']])))
+    monkeypatch.setattr(api, 'collection', FakePhotoCollection([{
+        '_id': photo_id, 'storage_path': stored['file_id'], 'sha256': stored['sha256'], 'filename': 'a.jpg',
+        'content_type': 'image/jpeg', 'upload_date': datetime(2025, 10, 28, 10, 0, 0)
+    }]))
+    return photo_id
+
+
+def test_file_endpoint_serves_closest_thumbnail(disk_photo):
+    client = api.app.test_client()
+
+    response = client.get(f'/api/photos/{disk_photo}/file?w=200', headers={'Accept': 'image/webp,*/*'})
+
+    assert response.status_code == 200
+    assert response.data == b'320.webp:\xff\xd8\xfforiginal'
+    assert response.headers['Content-Type'] == 'image/webp'
+    assert response.headers['Vary'] == 'Accept'
+
+    original = client.get(f'/api/photos/{disk_photo}/file')
+    assert original.data == b'\xff\xd8\xfforiginal'
+
+
+def test_file_endpoint_rejects_invalid_width(disk_photo):
+    response = api.app.test_client().get(f'/api/photos/{disk_photo}/file?w=abc')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_render_resizes_to_requested_widths():
+    Image = pytest.importorskip('PIL.Image')
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 600), 'red').save(buffer, 'JPEG')
+
+    small, webp = thumbnails.render(buffer.getvalue(), [(160, 'jpeg'), (320, 'webp')])
+
+    assert Image.open(io.BytesIO(small)).size == (160, 120)
+    assert Image.open(io.BytesIO(webp)).format == 'WEBP'
+
+
+def test_concurrent_misses_render_each_derivative_once(store):
+    stored = store.write(io.BytesIO(b'foto'), 'a.jpg')
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_render(data, targets):
+        calls.append(targets)
+        started.set()
+        release.wait(5)
+        return fake_render(data, targets)
+
+    thumbnailer = thumbnails.Thumbnailer({'fs': store}, FakeBlobs([stored['sha256']]), workers=0,
+                                         render=slow_render)
+    results = []
+
+    def request():
+        results.append(thumbnailer.derivative(stored['sha256'], 'fs', stored['file_id'], 160, 'jpeg'))
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Espera as outras três requisições ficarem paradas no Future da primeira
+    flight = thumbnailer._inflight[(stored['sha256'], 160, 'jpeg')]
+    while len(flight._condition._waiters) < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [[(160, 'jpeg')]]
+    assert len(results) == 4 and len({r.path for r in results}) == 1
+    assert thumbnailer._inflight == {}
+
+
+def test_pool_workers_read_the_original_from_the_store(store):
+    stored = store.write(io.BytesIO(b'foto'), 'a.jpg')
+
+    rendered = thumbnails.render_stored(fake_render, pickle.loads(pickle.dumps(store)), stored['file_id'],
+                                        [(160, 'jpeg')])
+
+    assert rendered == [b'160.jpeg:foto']
+    reader = pickle.loads(pickle.dumps(blob_store.GridFSReader('mongodb://x', 'db')))
+    assert (reader.uri, reader.db_name, reader.bucket_name) == ('mongodb://x', 'db', 'fs')
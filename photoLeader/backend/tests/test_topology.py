@@ -0,0 +1,66 @@
+import types
+from datetime import datetime, timedelta
+
+import topology
+
+
+def server(type_name, rtt=0.002):
+    return types.SimpleNamespace(server_type_name=type_name, round_trip_time=rtt, replica_set_name='rs0')
+
+
+def topology_event(servers):
+    description = types.SimpleNamespace(server_descriptions=lambda: servers)
+    return types.SimpleNamespace(new_description=description)
+
+
+def test_sdam_events_track_primary_and_elections():
+    monitor = topology.TopologyMonitor()
+    monitor.description_changed(topology_event({
+        ('10.0.0.1', 27017): server('RSPrimary'),
+        ('10.0.0.2', 27017): server('RSSecondary', rtt=0.0105),
+    }))
+    first = monitor.snapshot()
+    monitor.description_changed(topology_event({
+        ('10.0.0.1', 27017): server('Unknown', rtt=None),
+        ('10.0.0.2', 27017): server('RSPrimary'),
+    }))
+
+    snapshot = monitor.snapshot()
+    assert first['primary'] == '10.0.0.1:27017'
+    assert first['secondaries'] == ['10.0.0.2:27017']
+    assert first['members'][1]['pingMs'] == 10.5
+    assert snapshot['primary'] == '10.0.0.2:27017'
+    assert [e['primary'] for e in snapshot['elections']] == ['10.0.0.1:27017', '10.0.0.2:27017']
+    # Snapshots publicados não mudam depois
+    assert first['primary'] == '10.0.0.1:27017'
+
+
+def test_repl_set_status_adds_uptime_and_replication_lag():
+    monitor = topology.TopologyMonitor()
+    now = datetime(2025, 10, 28, 10, 0, 0)
+    monitor.apply_status({
+        'set': 'rs0',
+        'members': [
+            {'name': 'a:27017', 'stateStr': 'PRIMARY', 'health': 1, 'uptime': 100, 'optimeDate': now},
+            {'name': 'b:27017', 'stateStr': 'SECONDARY', 'health': 1, 'uptime': 90, 'pingMs': 3,
+             'optimeDate': now - timedelta(seconds=4)},
+            {'name': 'c:27017', 'stateStr': '(not reachable/healthy)', 'health': 0},
+        ]
+    })
+
+    members = {m['name']: m for m in monitor.snapshot()['members']}
+    assert monitor.snapshot()['replica_set'] == 'rs0'
+    assert members['b:27017']['lagSeconds'] == 4.0
+    assert members['b:27017']['pingMs'] == 3
+    assert members['c:27017']['health'] == 'Unhealthy'
+
+
+def test_refresh_status_failure_is_reported_in_snapshot():
+    class BrokenAdmin:
+        def command(self, name):
+            raise RuntimeError('sem PRIMARY')
+
+    monitor = topology.TopologyMonitor()
+    monitor.refresh_status(types.SimpleNamespace(admin=BrokenAdmin()))
+
+    assert monitor.snapshot()['status_error'] == 'sem PRIMARY'
@@ -0,0 +1,106 @@
+import hashlib
+import io
+import tracemalloc
+
+import pytest
+
+import upload_stream
+
+
+class SyntheticImage(io.RawIOBase):
+    """Stream de `size` bytes gerado sob demanda (nunca inteiro em memória)"""
+
+    HEADER = b'\xff\xd8\xff\xe0'
+
+    def __init__(self, size):
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def read(self, n=-1):
+        if n < 0:
+            n = self.size - self.position
+        n = min(n, self.size - self.position)
+        if n <= 0:
+            return b''
+        start = self.position
+        self.position += n
+        block = bytes((start + i) % 251 for i in range(min(n, 251))) * (n // 251 + 1)
+        block = block[:n]
+        if start == 0:
+            block = self.HEADER + block[len(self.HEADER):]
+        return block
+
+
+class FakeGridIn:
+    """Descarta os bytes escritos, registrando apenas tamanho e hash"""
+
+    def __init__(self, filename, metadata):
+        self._id = 'grid-id'
+        self.filename = filename
+        self.metadata = metadata
+        self.digest = hashlib.sha256()
+        self.written = 0
+        self.largest_write = 0
+        self.closed = False
+        self.aborted = False
+
+    def write(self, data):
+        self.digest.update(data)
+        self.written += len(data)
+        self.largest_write = max(self.largest_write, len(data))
+
+    def close(self):
+        self.closed = True
+
+    def abort(self):
+        self.aborted = True
+
+
+class FakeBucket:
+    def __init__(self):
+        self.grid_in = None
+
+    def open_upload_stream(self, filename, chunk_size_bytes=None, metadata=None):
+        self.grid_in = FakeGridIn(filename, metadata)
+        return self.grid_in
+
+
+def test_sniff_mime_detects_common_formats():
+    assert upload_stream.sniff_mime(b'\x89PNG\r\n\x1a\n....') == 'image/png'
+    assert upload_stream.sniff_mime(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'image/webp'
+    assert upload_stream.sniff_mime(b'????', 'image/jpeg') == 'image/jpeg'
+
+
+def test_stream_to_gridfs_large_file_uses_bounded_memory():
+    size = 64 * 1024 * 1024
+    bucket = FakeBucket()
+
+    tracemalloc.start()
+    stored = upload_stream.stream_to_gridfs(bucket, SyntheticImage(size), 'grande.jpg',
+                                            max_bytes=size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert stored['length'] == size
+    assert stored['content_type'] == 'image/jpeg'
+    assert stored['sha256'] == bucket.grid_in.digest.hexdigest()
+    assert bucket.grid_in.written == size
+    assert bucket.grid_in.largest_write <= upload_stream.UPLOAD_BLOCK_SIZE
+    assert bucket.grid_in.closed
+    # Pico de memória proporcional ao bloco, não aos 64 MB do arquivo
+    assert peak < 8 * upload_stream.UPLOAD_BLOCK_SIZE
+
+
+def test_stream_to_gridfs_aborts_when_over_limit():
+    bucket = FakeBucket()
+
+    with pytest.raises(upload_stream.UploadTooLarge):
+        upload_stream.stream_to_gridfs(bucket, SyntheticImage(10 * 1024 * 1024), 'grande.jpg',
+                                       max_bytes=1024 * 1024)
+
+    assert bucket.grid_in.aborted
+    assert not bucket.grid_in.closed
+    assert bucket.grid_in.written <= 1024 * 1024
@@ -0,0 +1,129 @@
+import io
+import json
+import zipfile
+
+import pytest
+from gridfs.errors import NoFile
+
+import api
+from blob_store import FileSystemStore
+from tests.test_pagination import FakeCollection, make_docs
+from zip_export import MANIFEST_NAME, InvalidOffset, export_user, parse_offset, stream_zip
+
+
+class FakeGridOut(io.BytesIO):
+    """GridOut mínimo: read() em blocos e o tamanho em `length`"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.length = len(data)
+
+
+def content(doc):
+    return f"foto {doc['_id']}".encode() * 1000
+
+
+@pytest.fixture
+def docs():
+    docs = make_docs(7)
+    for n, doc in enumerate(docs):
+        doc.update(filename=f'../{n}.jpg', gridfs_id=doc['_id'], tags=['praia'])
+    return docs
+
+
+def open_grid(photo):
+    return FakeGridOut(content(photo))
+
+
+def read_zip(chunks):
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+def oldest_first(docs):
+    return sorted(docs, key=lambda d: (d['upload_date'], d['_id']))
+
+
+def test_archive_has_every_photo_and_the_manifest(docs):
+    archive = read_zip(export_user(FakeCollection(docs), open_grid, 'u0', page_size=2))
+    expected = [d for d in oldest_first(docs) if d['user'] == 'u0']
+
+    assert archive.testzip() is None
+    manifest = json.loads(archive.read(MANIFEST_NAME))
+    assert [p['_id'] for p in manifest['photos']] == [str(d['_id']) for d in expected]
+    assert manifest['count'] == len(expected)
+    assert manifest['next_offset'] == len(expected)
+    for entry, doc in zip(manifest['photos'], expected):
+        assert '/' not in entry['path'] and entry['path'].endswith('.jpg')
+        assert archive.getinfo(entry['path']).compress_type == zipfile.ZIP_STORED
+        assert archive.read(entry['path']) == content(doc)
+        assert entry['size'] == len(content(doc))
+
+
+def test_export_resumes_from_an_offset(docs):
+    full = json.loads(read_zip(export_user(FakeCollection(docs), open_grid, 'u1')).read(MANIFEST_NAME))
+    resumed = json.loads(read_zip(export_user(FakeCollection(docs), open_grid, 'u1', offset=2))
+                         .read(MANIFEST_NAME))
+
+    assert resumed['offset'] == 2
+    assert resumed['photos'] == full['photos'][2:]
+    assert resumed['next_offset'] == full['next_offset']
+
+
+def test_missing_files_are_listed_in_the_manifest(docs):
+    gone = oldest_first(docs)[1]
+
+    def open_photo(photo):
+        if photo is gone:
+            raise NoFile('sem chunks')
+        return open_grid(photo)
+
+    archive = read_zip(stream_zip(oldest_first(docs), open_photo))
+    manifest = json.loads(archive.read(MANIFEST_NAME))
+
+    assert manifest['missing'] == [{'position': 1, '_id': str(gone['_id'])}]
+    assert manifest['count'] == len(docs) - 1
+    assert manifest['next_offset'] == len(docs)
+
+
+def test_chunks_stay_bounded_by_the_block_size():
+    big = {'_id': 'grande', 'filename': 'grande.raw', 'upload_date': None}
+    data = bytes(range(256)) * 4096
+
+    chunks = list(stream_zip([big], lambda photo: FakeGridOut(data), block_size=4096))
+
+    assert max(len(chunk) for chunk in chunks) < 4096 + 200
+    assert read_zip(chunks).read('000000-grande-grande.raw') == data
+
+
+def test_parse_offset():
+    assert parse_offset(None) == 0
+    assert parse_offset('12') == 12
+    for value in ('-1', 'abc'):
+        with pytest.raises(InvalidOffset):
+            parse_offset(value)
+
+
+class FakeExportCollection(FakeCollection):
+    def with_options(self, **kwargs):
+        return self
+
+
+def test_export_endpoint_streams_files_from_disk(monkeypatch, tmp_path, docs):
+    store = FileSystemStore(str(tmp_path / 'blobs'), fsync=False)
+    for doc in docs:
+        del doc['gridfs_id']
+        doc['storage_path'] = store.write(io.BytesIO(content(doc)), doc['filename'])['file_id']
+    monkeypatch.setattr(api, 'collection', FakeExportCollection(docs))
+    monkeypatch.setattr(api, 'blob_stores', dict(api.blob_stores, fs=store))
+    client = api.app.test_client()
+
+    response = client.get('/api/photos/user/u0/export.zip?offset=1')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    assert 'attachment' in response.headers['Content-Disposition']
+    archive = read_zip([response.data])
+    manifest = json.loads(archive.read(MANIFEST_NAME))
+    expected = [d for d in oldest_first(docs) if d['user'] == 'u0'][1:]
+    assert [archive.read(p['path']) for p in manifest['photos']] == [content(d) for d in expected]
+    assert client.get('/api/photos/user/u0/export.zip?offset=x').status_code == 400
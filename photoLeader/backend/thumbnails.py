@@ -0,0 +1,250 @@
+"""
+Miniaturas das fotos (derivados) geradas fora da requisição
+
+A galeria pedia `/api/photos/<id>/file` para cada card e baixava o original
+inteiro. Agora:
+
+- cada upload novo entra numa fila; uma thread despacha os jobs para um
+  ProcessPoolExecutor (o redimensionamento usa CPU e não disputa o GIL com
+  as requisições), que gera as larguras THUMB_WIDTHS em JPEG e em WebP;
+- os derivados ficam no mesmo backend do original (blob_store.py),
+  endereçados pelo SHA-256 do conteúdo, então fotos deduplicadas
+  compartilham as miniaturas;
+- `GET /api/photos/<id>/file?w=<largura>` serve a menor largura pré-calculada
+  que cobre o pedido (WebP quando o navegador aceita), gerando e guardando
+  na hora se ela ainda não existir. As listagens trazem `thumb_url`;
+- a geração sob demanda é single-flight por (sha256, largura, formato):
+  requisições simultâneas pela mesma miniatura esperam a primeira em vez
+  de gerá-la de novo;
+- com o pool, o original é lido pelo próprio processo do pool (`sources`:
+  FileSystemStore ou blob_store.GridFSReader), e não carregado na thread
+  da requisição para ser serializado até ele.
+
+O Pillow é opcional: sem ele nada é enfileirado e `?w=` devolve o original.
+Os processos do pool são iniciados com `spawn` (sem herdar as threads e
+sockets do MongoClient).
+"""
+
+import io
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from werkzeug.http import parse_accept_header
+
+from logs import get_logger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow não instalado: sem miniaturas
+    Image = None
+
+THUMB_WIDTHS = tuple(sorted({int(w) for w in os.environ.get('THUMB_WIDTHS', '160,320,640,1280').split(',')
+                             if w.strip()}))
+# Largura usada no `thumb_url` das listagens
+THUMB_DEFAULT_WIDTH = int(os.environ.get('THUMB_DEFAULT_WIDTH', 320))
+# Processos do pool (0: gera na própria thread da fila)
+THUMB_WORKERS = int(os.environ.get('THUMB_WORKERS', min(4, os.cpu_count() or 1)))
+# Jobs aguardando na fila; além disso o job é descartado (o ?w= gera sob demanda)
+THUMB_QUEUE_SIZE = int(os.environ.get('THUMB_QUEUE_SIZE', 1000))
+THUMB_QUALITY = int(os.environ.get('THUMB_QUALITY', 80))
+
+# Formato -> (tipo MIME, extensão, formato do Pillow)
+FORMATS = {'jpeg': ('image/jpeg', 'jpg', 'JPEG'), 'webp': ('image/webp', 'webp', 'WEBP')}
+
+log = get_logger('thumbnails')
+
+
+class InvalidWidth(ValueError):
+    """Parâmetro `w` que não é uma largura positiva"""
+
+
+def parse_width(value):
+    """Largura pedida em `?w=` (None quando ausente)"""
+    if value is None:
+        return None
+    try:
+        width = int(value)
+    except ValueError:
+        width = 0
+    if width <= 0:
+        raise InvalidWidth(f"Largura inválida: {value}")
+    return width
+
+
+def pick_width(requested, widths=THUMB_WIDTHS):
+    """Menor largura pré-calculada que cobre `requested` (a maior, se nenhuma cobrir)"""
+    for width in widths:
+        if width >= requested:
+            return width
+    return widths[-1]
+
+
+def pick_format(accept):
+    """'webp' quando o cabeçalho Accept lista image/webp, senão 'jpeg'"""
+    return 'webp' if parse_accept_header(accept)['image/webp'] > 0 else 'jpeg'
+
+
+def derivative_name(width, fmt):
+    return f'{width}.{FORMATS[fmt][1]}'
+
+
+def render(data, targets, quality=THUMB_QUALITY):
+    """Gera os derivados [(largura, formato), ...] de uma imagem; retorna os bytes na mesma ordem.
+
+    Executado nos processos do pool. As larguras são geradas da maior para a
+    menor, cada uma a partir da anterior, e o JPEG é decodificado já reduzido
+    (draft) quando o original é bem maior que a maior largura pedida.
+    """
+    largest = max(width for width, _ in targets)
+    with Image.open(io.BytesIO(data)) as original:
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        resized = {}
+        for width in sorted({width for width, _ in targets}, reverse=True):
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))),
+                                     Image.LANCZOS)
+            resized[width] = image
+
+        out = []
+        for width, fmt in targets:
+            frame = resized[width]
+            if fmt == 'jpeg' and frame.mode != 'RGB':
+                frame = frame.convert('RGB')
+            buffer = io.BytesIO()
+            frame.save(buffer, FORMATS[fmt][2], quality=quality, optimize=True)
+            out.append(buffer.getvalue())
+        return out
+
+
+def render_stored(render, source, file_id, targets):
+    """render() lendo o original de `source` (executado nos processos do pool)"""
+    with source.open(file_id) as f:
+        return render(f.read(), targets)
+
+
+class Thumbnailer(threading.Thread):
+    """Fila de geração dos derivados.
+
+    `stores` são os backends do blob_store por nome; `sources`, por nome do
+    backend, objetos picklable com open(file_id) que os processos do pool
+    usam para ler o original (sem entrada, a thread que pede lê e envia os bytes).
+    """
+
+    def __init__(self, stores, blobs, widths=THUMB_WIDTHS, formats=tuple(FORMATS), workers=THUMB_WORKERS,
+                 queue_size=THUMB_QUEUE_SIZE, render=render if Image is not None else None, sources=None):
+        super().__init__(name='thumbnailer', daemon=True)
+        self.stores = stores
+        self.sources = sources or {}
+        self.blobs = blobs
+        self.widths = widths
+        self.formats = formats
+        self.workers = workers
+        self.render = render
+        self.enabled = render is not None
+        self.totals = {'generated': 0, 'on_demand': 0, 'dropped': 0, 'errors': 0}
+        self._queue = queue.Queue(queue_size)
+        self._pending = set()
+        # (sha256, largura, formato) -> Future da geração sob demanda em andamento
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _run_render(self, store, file_id, targets):
+        if not self.workers:
+            return self.render(self._read_original(store, file_id), targets)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        source = self.sources.get(store)
+        if source is None:
+            return self._pool.submit(self.render, self._read_original(store, file_id), targets).result()
+        return self._pool.submit(render_stored, self.render, source, file_id, targets).result()
+
+    def _read_original(self, store, file_id):
+        with self.stores[store].open(file_id) as f:
+            return f.read()
+
+    def submit(self, sha256, store, file_id):
+        """Enfileira a geração de todos os derivados de um conteúdo; False se descartado"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if sha256 in self._pending:
+                return True
+            try:
+                self._queue.put_nowait((sha256, store, file_id))
+            except queue.Full:
+                self.totals['dropped'] += 1
+                return False
+            self._pending.add(sha256)
+        return True
+
+    def generate(self, sha256, store, file_id):
+        """Gera e grava todos os derivados (executado pela thread da fila)"""
+        targets = [(width, fmt) for width in self.widths for fmt in self.formats]
+        rendered = self._run_render(store, file_id, targets)
+        for (width, fmt), data in zip(targets, rendered):
+            self.stores[store].write_derivative(sha256, derivative_name(width, fmt), data, FORMATS[fmt][0])
+        # A foto pode ter sido removida enquanto o job rodava: não deixa derivados sem blob
+        if self.blobs.find_one({'_id': sha256}, {'_id': 1}) is None:
+            self.stores[store].delete_derivatives(sha256)
+        self.totals['generated'] += 1
+
+    def derivative(self, sha256, store, file_id, width, fmt):
+        """Derivado pronto para download (GridOut ou StoredFile), gerado agora se ainda não existir"""
+        name = derivative_name(width, fmt)
+        found = self.stores[store].open_derivative(sha256, name)
+        if found is not None:
+            return found
+        key = (sha256, width, fmt)
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = Future()
+        if not leader:
+            flight.result()  # Levanta o mesmo erro da geração que estava em andamento
+            return self.stores[store].open_derivative(sha256, name)
+        try:
+            [data] = self._run_render(store, file_id, [(width, fmt)])
+            self.stores[store].write_derivative(sha256, name, data, FORMATS[fmt][0])
+            self.totals['on_demand'] += 1
+            flight.set_result(None)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return self.stores[store].open_derivative(sha256, name)
+
+    def discard(self, sha256, store):
+        """Remove os derivados de um conteúdo que não tem mais blob"""
+        self.stores[store].delete_derivatives(sha256)
+
+    def stop(self):
+        self._queue.put(None)
+
+    def run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                self.generate(*job)
+            except Exception as e:
+                self.totals['errors'] += 1
+                log.warning(f"Erro ao gerar miniaturas de {job[0]}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(job[0])
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
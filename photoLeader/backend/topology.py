@@ -0,0 +1,194 @@
+"""
+Monitor da topologia do Replica Set
+
+Mantém um snapshot sempre atualizado dos membros (estado, ping, lag de
+replicação e histórico de eleições) a partir de duas fontes:
+
+- Eventos SDAM do pymongo (TopologyListener / ServerHeartbeatListener): o
+  driver já faz heartbeats em todos os membros, então estado e RTT chegam
+  de graça, sem comandos extras.
+- Um `replSetGetStatus` com taxa limitada (no máximo um a cada
+  TOPOLOGY_STATUS_INTERVAL segundos), para uptime, health e optimes.
+
+/api/health e /api/replicaset/status só leem o snapshot, então a carga de
+monitoramento no PRIMARY é constante, independente de quantos dashboards
+estão abertos.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from pymongo import monitoring
+
+TOPOLOGY_STATUS_INTERVAL = float(os.environ.get('TOPOLOGY_STATUS_INTERVAL', 10))
+ELECTION_HISTORY_SIZE = 20
+
+# server_type_name do pymongo -> stateStr do replSetGetStatus
+_STATE_NAMES = {
+    'RSPrimary': 'PRIMARY',
+    'RSSecondary': 'SECONDARY',
+    'RSArbiter': 'ARBITER',
+    'RSOther': 'OTHER',
+    'RSGhost': 'GHOST',
+    'Unknown': 'UNKNOWN'
+}
+
+
+def _address(server_address):
+    host, port = server_address
+    return f'{host}:{port}'
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class TopologyMonitor(monitoring.TopologyListener, monitoring.ServerHeartbeatListener):
+    """Listener SDAM + atualização periódica do replSetGetStatus.
+
+    Registre no MongoClient com `event_listeners=[monitor]` e chame
+    `start(client)` para iniciar a thread do replSetGetStatus.
+    """
+
+    def __init__(self, status_interval=TOPOLOGY_STATUS_INTERVAL):
+        self.status_interval = status_interval
+        self._lock = threading.Lock()
+        self._members = {}
+        self._set_name = None
+        self._primary = None
+        self._elections = deque(maxlen=ELECTION_HISTORY_SIZE)
+        self._status_error = None
+        self._status_at = None
+        self._snapshot = self._build_snapshot()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    # ---------- eventos SDAM ----------
+
+    def opened(self, event):
+        pass
+
+    def closed(self, event):
+        pass
+
+    def description_changed(self, event):
+        with self._lock:
+            servers = event.new_description.server_descriptions()
+            for server_address, description in servers.items():
+                member = self._members.setdefault(_address(server_address), {})
+                member['state'] = _STATE_NAMES.get(description.server_type_name, description.server_type_name)
+                if description.round_trip_time is not None:
+                    member['pingMs'] = round(description.round_trip_time * 1000, 2)
+                if description.replica_set_name:
+                    self._set_name = description.replica_set_name
+            # Membros removidos da configuração saem do snapshot
+            current = {_address(a) for a in servers}
+            for name in list(self._members):
+                if name not in current:
+                    del self._members[name]
+
+            primary = next((name for name, m in self._members.items() if m.get('state') == 'PRIMARY'), None)
+            self._record_primary(primary)
+            self._snapshot = self._build_snapshot()
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        with self._lock:
+            member = self._members.setdefault(_address(event.connection_id), {})
+            member['lastHeartbeat'] = _now().isoformat()
+            member['heartbeatMs'] = round(event.duration * 1000, 2)
+            member['health'] = 'Healthy'
+            self._snapshot = self._build_snapshot()
+
+    def failed(self, event):
+        with self._lock:
+            member = self._members.setdefault(_address(event.connection_id), {})
+            member['health'] = 'Unhealthy'
+            member['lastError'] = str(event.reply)
+            self._snapshot = self._build_snapshot()
+
+    # ---------- replSetGetStatus com taxa limitada ----------
+
+    def apply_status(self, status):
+        """Incorpora uma resposta do replSetGetStatus ao snapshot"""
+        with self._lock:
+            self._set_name = status.get('set', self._set_name)
+            members = status.get('members', [])
+            primary_optime = next((m.get('optimeDate') for m in members
+                                   if m.get('stateStr') == 'PRIMARY'), None)
+            for raw in members:
+                member = self._members.setdefault(raw.get('name'), {})
+                member['state'] = raw.get('stateStr')
+                member['health'] = 'Healthy' if raw.get('health') == 1 else 'Unhealthy'
+                member['uptime'] = raw.get('uptime')
+                if 'pingMs' in raw:
+                    member['pingMs'] = raw['pingMs']
+                optime = raw.get('optimeDate')
+                if primary_optime and optime:
+                    member['lagSeconds'] = max(0.0, (primary_optime - optime).total_seconds())
+            primary = next((m.get('name') for m in members if m.get('stateStr') == 'PRIMARY'), None)
+            self._record_primary(primary)
+            self._status_error = None
+            self._status_at = _now().isoformat()
+            self._snapshot = self._build_snapshot()
+
+    def refresh_status(self, client):
+        try:
+            self.apply_status(client.admin.command('replSetGetStatus'))
+        except Exception as e:
+            with self._lock:
+                self._status_error = str(e)
+                self._snapshot = self._build_snapshot()
+
+    def start(self, client):
+        """Inicia a thread que roda o replSetGetStatus a cada status_interval segundos"""
+        if self._thread is None:
+            def loop():
+                while not self._stop_event.is_set():
+                    self.refresh_status(client)
+                    self._stop_event.wait(self.status_interval)
+
+            self._thread = threading.Thread(target=loop, name='topology-status', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+    # ---------- snapshot ----------
+
+    def _record_primary(self, primary):
+        # Chamado com o lock adquirido
+        if primary and primary != self._primary:
+            self._elections.append({
+                'at': _now().isoformat(),
+                'primary': primary,
+                'previous': self._primary
+            })
+        if primary:
+            self._primary = primary
+        elif self._primary and self._members.get(self._primary, {}).get('state') != 'PRIMARY':
+            self._primary = None
+
+    def _build_snapshot(self):
+        # Chamado com o lock adquirido; o snapshot nunca é alterado depois de publicado
+        members = [dict(member, name=name) for name, member in sorted(self._members.items())]
+        return {
+            'replica_set': self._set_name,
+            'primary': self._primary,
+            'secondaries': [m['name'] for m in members if m.get('state') == 'SECONDARY'],
+            'members': members,
+            'elections': list(self._elections),
+            'status_refreshed_at': self._status_at,
+            'status_error': self._status_error,
+            'updated_at': time.time()
+        }
+
+    def snapshot(self):
+        """Snapshot atual (leitura sem lock: a referência é trocada atomicamente)"""
+        return self._snapshot
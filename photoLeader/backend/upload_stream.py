@@ -0,0 +1,175 @@
+"""
+Pipeline de upload em streaming para o GridFS (ou para um arquivo local)
+
+Lê o arquivo enviado em blocos de tamanho fixo e grava direto num
+GridFSBucket.open_upload_stream (ou num arquivo, ver blob_store.py), calculando tamanho, hash SHA-256 e tipo
+MIME durante a leitura. A memória usada por upload fica limitada ao tamanho
+do bloco, independente do tamanho da foto.
+"""
+
+import hashlib
+import os
+
+# Mesmo tamanho de chunk padrão do GridFS (255 KB)
+UPLOAD_BLOCK_SIZE = 255 * 1024
+
+# Limite de tamanho por upload (padrão: 50 MB)
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 50 * 1024 * 1024))
+
+# Assinaturas (magic bytes) dos formatos de imagem aceitos
+_MAGIC_NUMBERS = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+]
+
+
+class UploadTooLarge(Exception):
+    """Upload ultrapassou o limite configurado em MAX_UPLOAD_BYTES"""
+
+    def __init__(self, max_bytes):
+        super().__init__(f'Arquivo excede o limite de {max_bytes} bytes')
+        self.max_bytes = max_bytes
+
+
+def sniff_mime(head, fallback=None):
+    """Detecta o tipo MIME pelos primeiros bytes do arquivo"""
+    for magic, mime in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:12] in (b'ftypheic', b'ftypheix', b'ftypmif1'):
+        return 'image/heic'
+    return fallback or 'application/octet-stream'
+
+
+def hash_stream(stream, max_bytes=MAX_UPLOAD_BYTES, block_size=UPLOAD_BLOCK_SIZE):
+    """Calcula SHA-256 e tamanho lendo `stream` em blocos, sem gravar nada.
+
+    Retorna (sha256, length). Lança UploadTooLarge se passar de `max_bytes`.
+    """
+    digest = hashlib.sha256()
+    length = 0
+    block = stream.read(block_size)
+    while block:
+        length += len(block)
+        if length > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        digest.update(block)
+        block = stream.read(block_size)
+    return digest.hexdigest(), length
+
+
+def stream_to_gridfs(bucket, stream, filename, metadata=None,
+                     max_bytes=MAX_UPLOAD_BYTES, block_size=UPLOAD_BLOCK_SIZE,
+                     declared_type=None):
+    """Copia `stream` para o GridFS em blocos de `block_size` bytes.
+
+    Retorna um dict com file_id, length, sha256 e content_type. Se o arquivo
+    passar de `max_bytes`, o upload é abortado (chunks parciais removidos) e
+    UploadTooLarge é lançada.
+    """
+    head = stream.read(block_size)
+    content_type = sniff_mime(head, declared_type)
+    metadata = dict(metadata or {}, contentType=content_type)
+
+    digest = hashlib.sha256()
+    length = 0
+    grid_in = bucket.open_upload_stream(filename, chunk_size_bytes=block_size, metadata=metadata)
+    try:
+        block = head
+        while block:
+            length += len(block)
+            if length > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            digest.update(block)
+            grid_in.write(block)
+            block = stream.read(block_size)
+
+        # Atributos extras vão para o documento fs.files quando o stream é fechado
+        grid_in.sha256 = digest.hexdigest()
+        grid_in.close()
+    except BaseException:
+        grid_in.abort()
+        raise
+
+    return {
+        'file_id': grid_in._id,
+        'length': length,
+        'sha256': grid_in.sha256,
+        'content_type': content_type
+    }
+
+
+def stream_to_file(stream, out, max_bytes=MAX_UPLOAD_BYTES, block_size=UPLOAD_BLOCK_SIZE,
+                   declared_type=None):
+    """Copia `stream` para o arquivo aberto `out` em blocos (mesmas regras de stream_to_gridfs).
+
+    Retorna um dict com length, sha256 e content_type.
+    """
+    block = stream.read(block_size)
+    content_type = sniff_mime(block, declared_type)
+    digest = hashlib.sha256()
+    length = 0
+    while block:
+        length += len(block)
+        if length > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        digest.update(block)
+        out.write(block)
+        block = stream.read(block_size)
+    return {'length': length, 'sha256': digest.hexdigest(), 'content_type': content_type}
+
+
+async def hash_stream_async(stream, max_bytes=MAX_UPLOAD_BYTES, block_size=UPLOAD_BLOCK_SIZE):
+    """Versão assíncrona de hash_stream (stream com `await read(n)`)"""
+    digest = hashlib.sha256()
+    length = 0
+    block = await stream.read(block_size)
+    while block:
+        length += len(block)
+        if length > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        digest.update(block)
+        block = await stream.read(block_size)
+    return digest.hexdigest(), length
+
+
+async def stream_to_gridfs_async(bucket, stream, filename, metadata=None,
+                                 max_bytes=MAX_UPLOAD_BYTES, block_size=UPLOAD_BLOCK_SIZE,
+                                 declared_type=None):
+    """Versão assíncrona de stream_to_gridfs (AsyncGridFSBucket e `await read(n)`)"""
+    head = await stream.read(block_size)
+    content_type = sniff_mime(head, declared_type)
+    metadata = dict(metadata or {}, contentType=content_type)
+
+    digest = hashlib.sha256()
+    length = 0
+    grid_in = bucket.open_upload_stream(filename, chunk_size_bytes=block_size, metadata=metadata)
+    try:
+        block = head
+        while block:
+            length += len(block)
+            if length > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            digest.update(block)
+            await grid_in.write(block)
+            block = await stream.read(block_size)
+
+        await grid_in.set('sha256', digest.hexdigest())
+        await grid_in.close()
+    except BaseException:
+        await grid_in.abort()
+        raise
+
+    return {
+        'file_id': grid_in._id,
+        'length': length,
+        'sha256': digest.hexdigest(),
+        'content_type': content_type
+    }
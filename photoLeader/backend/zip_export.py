@@ -0,0 +1,190 @@
+"""
+Export da biblioteca de um usuário em ZIP, gerado durante o envio
+
+`GET /api/photos/user/<username>/export.zip` (e `python backend/zip_export.py`)
+devolve um ZIP com as fotos do usuário, da mais antiga para a mais nova, e
+um `manifest.json` no fim com os metadados de cada uma:
+
+- os metadados são lidos em páginas pelo keyset (pagination.iter_oldest_first),
+  sem cursor aberto durante o envio;
+- cada arquivo é lido do backend (GridFS ou disco) em blocos de
+  EXPORT_BLOCK_SIZE e gravado numa entrada sem compressão (ZIP_STORED:
+  fotos já são comprimidas). O ZipFile escreve num destino sem seek, então
+  cada entrada leva um data descriptor e os bytes saem assim que escritos:
+  a memória não cresce com o tamanho dos arquivos;
+- o ZIP64 é habilitado por entrada conforme o tamanho do arquivo, então
+  bibliotecas de vários GB funcionam;
+- o nome de cada entrada começa pela posição da foto (`000042-<id>-<nome>`).
+  Um download interrompido é retomado com `?offset=<última posição + 1>`:
+  fotos novas entram no fim da ordenação, então as posições anteriores não
+  mudam (remoções no meio do caminho deslocam as seguintes).
+
+Só o diretório central do ZIP e o manifest (alguns campos por foto)
+crescem com o número de fotos.
+
+Uso avulso:
+  python backend/zip_export.py ana --out ana.zip [--offset 100]
+"""
+
+import argparse
+import json
+import os
+import sys
+import zipfile
+from contextlib import closing
+from datetime import datetime
+
+from gridfs.errors import NoFile
+
+from blob_store import STORE_FIELDS
+from pagination import iter_oldest_first
+
+EXPORT_PAGE_SIZE = 100
+EXPORT_BLOCK_SIZE = 256 * 1024
+MANIFEST_NAME = 'manifest.json'
+# Campos da foto lidos para o export, mais os que dizem onde estão os bytes
+EXPORT_PROJECTION = ['filename', 'user', 'description', 'tags', 'upload_date', 'size_kb',
+                     'content_type', 'sha256', *STORE_FIELDS.values()]
+# O formato ZIP não representa datas anteriores a 1980
+MIN_ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+class InvalidOffset(ValueError):
+    """Parâmetro `offset` que não é um inteiro >= 0"""
+
+
+def parse_offset(value):
+    if value is None:
+        return 0
+    try:
+        offset = int(value)
+    except ValueError:
+        offset = -1
+    if offset < 0:
+        raise InvalidOffset('offset deve ser um inteiro >= 0')
+    return offset
+
+
+class _Sink:
+    """Destino do ZipFile: acumula o que foi escrito até o próximo drain(); sem seek"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def entry_name(position, photo):
+    """Nome da entrada no ZIP: posição, _id e o nome original sem separadores de diretório"""
+    filename = os.path.basename(str(photo.get('filename') or '').replace('\\', '/')) or 'foto'
+    return f"{position:06d}-{photo['_id']}-{filename}"
+
+
+def _zip_date(upload_date):
+    if not isinstance(upload_date, datetime):
+        return MIN_ZIP_DATE
+    return max(MIN_ZIP_DATE, upload_date.timetuple()[:6])
+
+
+def _length(handle, photo):
+    # GridOut tem `length`; arquivo local, o tamanho no disco
+    length = getattr(handle, 'length', None)
+    if length is None and hasattr(handle, 'fileno'):
+        length = os.fstat(handle.fileno()).st_size
+    if length is None:
+        length = int((photo.get('size_kb') or 0) * 1024)
+    return length
+
+
+def _manifest_entry(position, name, photo, length):
+    upload_date = photo.get('upload_date')
+    return {
+        'position': position,
+        'path': name,
+        '_id': str(photo['_id']),
+        'filename': photo.get('filename'),
+        'description': photo.get('description'),
+        'tags': photo.get('tags') or [],
+        'upload_date': upload_date.isoformat() if isinstance(upload_date, datetime) else upload_date,
+        'content_type': photo.get('content_type'),
+        'size': length,
+        'sha256': photo.get('sha256')
+    }
+
+
+def stream_zip(photos, open_photo, user=None, offset=0, block_size=EXPORT_BLOCK_SIZE):
+    """Gera os bytes do ZIP com as fotos de `photos` e o manifest.
+
+    `photos` são os documentos na ordem do export, já a partir de `offset`;
+    `open_photo(photo)` devolve um objeto com read() (GridOut ou arquivo) e
+    levanta FileNotFoundError/NoFile se os bytes não existirem mais; essas
+    fotos ficam em `missing` no manifest, sem entrada no ZIP.
+    """
+    sink = _Sink()
+    manifest = {'user': user, 'offset': offset, 'photos': [], 'missing': []}
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for position, photo in enumerate(photos, offset):
+            try:
+                handle = open_photo(photo)
+            except (FileNotFoundError, NoFile):
+                manifest['missing'].append({'position': position, '_id': str(photo['_id'])})
+                continue
+            with closing(handle):
+                name = entry_name(position, photo)
+                info = zipfile.ZipInfo(name, _zip_date(photo.get('upload_date')))
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = length = _length(handle, photo)
+                with archive.open(info, 'w') as entry:
+                    while True:
+                        block = handle.read(block_size)
+                        if not block:
+                            break
+                        entry.write(block)
+                        yield sink.drain()
+            manifest['photos'].append(_manifest_entry(position, name, photo, length))
+            data = sink.drain()
+            if data:
+                yield data
+
+        seen = len(manifest['photos']) + len(manifest['missing'])
+        manifest.update(count=len(manifest['photos']), next_offset=offset + seen,
+                        generated_at=datetime.utcnow().isoformat())
+        archive.writestr(zipfile.ZipInfo(MANIFEST_NAME, _zip_date(datetime.utcnow())),
+                         json.dumps(manifest, ensure_ascii=False, indent=2))
+    yield sink.drain()
+
+
+def export_user(collection, open_photo, user, offset=0, page_size=EXPORT_PAGE_SIZE):
+    """Bytes do ZIP das fotos de `user` a partir da posição `offset` (mais antigas primeiro)"""
+    photos = iter_oldest_first(collection, {'user': user}, EXPORT_PROJECTION, offset, page_size)
+    return stream_zip(photos, open_photo, user, offset)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exporta as fotos de um usuário num ZIP')
+    parser.add_argument('user')
+    parser.add_argument('--out', default='-', help='Arquivo de saída (padrão: stdout)')
+    parser.add_argument('--offset', type=int, default=0, help='Posição da primeira foto (retomada)')
+    args = parser.parse_args()
+
+    import api
+
+    out = sys.stdout.buffer if args.out == '-' else open(args.out, 'wb')
+    with out:
+        for chunk in api.export_photos(args.user, max(0, args.offset)):
+            out.write(chunk)
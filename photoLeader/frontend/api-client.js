@@ -30,7 +30,7 @@ async function checkAPIHealth() {
 
 /**
  * Busca todas as fotos
- * @param {Object} params - Parâmetros de query (limit, skip, tag, user)
+ * @param {Object} params - Parâmetros de query (limit, cursor, tag, user)
  */
 async function getPhotos(params = {}) {
     try {
@@ -71,6 +71,52 @@ async function getPhoto(photoId) {
     }
 }
 
+/**
+ * Busca os metadados de várias fotos numa requisição
+ * @param {Array<string>} photoIds - IDs das fotos
+ */
+async function getPhotosBatch(photoIds) {
+    try {
+        const ids = encodeURIComponent(photoIds.join(','));
+        const response = await fetch(`${API_BASE_URL}/photos/batch?ids=${ids}`);
+        const data = await response.json();
+        
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        
+        return data.photos;
+    } catch (error) {
+        console.error('Erro ao buscar fotos:', error);
+        throw error;
+    }
+}
+
+/**
+ * Busca uma foto e as vizinhas dela na listagem
+ * @param {string} photoId - ID da foto
+ * @param {Object} params - Parâmetros de query (n, tag, user)
+ * @returns {Object} { photo, previous, next } (vizinhas da mais próxima para a mais distante)
+ */
+async function getPhotoNeighbors(photoId, params = {}) {
+    try {
+        const queryString = new URLSearchParams(params).toString();
+        const url = `${API_BASE_URL}/photos/${photoId}/neighbors${queryString ? '?' + queryString : ''}`;
+        
+        const response = await fetch(url);
+        const data = await response.json();
+        
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        
+        return { photo: data.photo, previous: data.previous, next: data.next };
+    } catch (error) {
+        console.error('Erro ao buscar fotos vizinhas:', error);
+        throw error;
+    }
+}
+
 /**
  * Upload de nova foto (metadados)
  * @param {Object} photoData - Dados da foto
@@ -139,6 +185,16 @@ async function getPhotosByUser(username) {
     }
 }
 
+/**
+ * URL do ZIP com todas as fotos de um usuário (gerado durante o download)
+ * @param {string} username - Nome do usuário
+ * @param {number} offset - Posição da primeira foto, para retomar um download interrompido
+ */
+function getUserExportUrl(username, offset = 0) {
+    const params = offset ? `?offset=${offset}` : '';
+    return `${API_BASE_URL}/photos/user/${encodeURIComponent(username)}/export.zip${params}`;
+}
+
 /**
  * Busca fotos por tag
  * @param {string} tag - Tag para buscar
@@ -159,6 +215,55 @@ async function getPhotosByTag(tag) {
     }
 }
 
+/**
+ * Sugestões de tags (autocomplete), das mais usadas para as menos usadas
+ * @param {string} prefix - Início da tag
+ * @param {number} limit - Máximo de sugestões (1 a 50)
+ * @returns {Promise<Array<{tag: string, count: number}>>}
+ */
+async function getTagSuggestions(prefix, limit = 10) {
+    try {
+        const params = new URLSearchParams({ prefix, limit });
+        const response = await fetch(`${API_BASE_URL}/tags/suggest?${params}`);
+        const data = await response.json();
+        
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        
+        return data.tags;
+    } catch (error) {
+        console.error('Erro ao buscar sugestões de tags:', error);
+        throw error;
+    }
+}
+
+/**
+ * Contagem das tags mais usadas (de todos ou de um usuário)
+ * @param {string} [user] - Usuário (opcional)
+ * @param {number} limit - Máximo de tags (1 a 50)
+ * @returns {Promise<Array<{tag: string, count: number}>>}
+ */
+async function getTagFacets(user, limit = 10) {
+    try {
+        const params = new URLSearchParams({ limit });
+        if (user) {
+            params.set('user', user);
+        }
+        const response = await fetch(`${API_BASE_URL}/tags/facets?${params}`);
+        const data = await response.json();
+        
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        
+        return data.tags;
+    } catch (error) {
+        console.error('Erro ao buscar facetas de tags:', error);
+        throw error;
+    }
+}
+
 /**
  * Busca fotos por texto
  * @param {string} query - Texto para buscar
@@ -338,10 +443,15 @@ window.PhotoLeaderAPI = {
     checkAPIHealth,
     getPhotos,
     getPhoto,
+    getPhotosBatch,
+    getPhotoNeighbors,
     uploadPhoto,
     deletePhoto,
     getPhotosByUser,
+    getUserExportUrl,
     getPhotosByTag,
+    getTagSuggestions,
+    getTagFacets,
     searchPhotos,
     getStats,
     formatDate,
@@ -21,6 +21,32 @@ document.addEventListener("DOMContentLoaded", async () => {
     formUpload.reset();
   });
 
+  // Autocomplete da última palavra da descrição com as tags já usadas
+  const inputDescricao = document.getElementById("descricao");
+  const sugestoesTags = document.getElementById("sugestoesTags");
+  inputDescricao.addEventListener("input", async () => {
+    const palavras = inputDescricao.value.split(" ");
+    const prefixo = palavras.pop();
+    if (prefixo.length < 2) {
+      sugestoesTags.innerHTML = "";
+      return;
+    }
+    try {
+      const tags = await PhotoLeaderAPI.getTagSuggestions(prefixo);
+      // A descrição pode ter mudado enquanto a resposta chegava
+      if (inputDescricao.value.split(" ").pop() !== prefixo) return;
+      const inicio = palavras.length ? palavras.join(" ") + " " : "";
+      sugestoesTags.innerHTML = "";
+      tags.forEach(({ tag }) => {
+        const opcao = document.createElement("option");
+        opcao.value = inicio + tag;
+        sugestoesTags.appendChild(opcao);
+      });
+    } catch (error) {
+      sugestoesTags.innerHTML = "";
+    }
+  });
+
   //sair da conta
   botaoSair.addEventListener("click", () => {
     alert("Logout realizado!");
@@ -30,7 +56,8 @@ document.addEventListener("DOMContentLoaded", async () => {
   //enviar formulário
   formUpload.addEventListener("submit", async (e) => {
     e.preventDefault();
-    const arquivo = inputArquivo.files[0];
+    const arquivos = Array.from(inputArquivo.files);
+    const arquivo = arquivos[0];
     const descricao = document.getElementById("descricao").value.trim();
 
     if (!arquivo) {
@@ -40,8 +67,14 @@ document.addEventListener("DOMContentLoaded", async () => {
 
     try {
       // Criar FormData para enviar arquivo + metadados
+      // Vários arquivos vão numa única requisição para /photos/batch
+      const emLote = arquivos.length > 1;
       const formData = new FormData();
-      formData.append('file', arquivo);
+      if (emLote) {
+        arquivos.forEach(a => formData.append('files', a));
+      } else {
+        formData.append('file', arquivo);
+      }
       formData.append('user', localStorage.getItem("usuarioLogado") || "usuario_padrao");
       formData.append('description', descricao || "Sem descrição");
       
@@ -53,7 +86,7 @@ document.addEventListener("DOMContentLoaded", async () => {
 
       // Upload usando fetch diretamente (não usar PhotoLeaderAPI pois precisa de FormData)
       const API_BASE_URL = `${window.location.protocol}//${window.location.hostname}:5000/api`;
-      const response = await fetch(`${API_BASE_URL}/photos`, {
+      const response = await fetch(`${API_BASE_URL}/photos${emLote ? '/batch' : ''}`, {
         method: 'POST',
         body: formData  // Não definir Content-Type, o navegador faz automaticamente
       });
@@ -65,9 +98,15 @@ document.addEventListener("DOMContentLoaded", async () => {
       }
 
       // Adicionar à galeria
-      criarItemGaleria(resultado.data);
-      
-      alert("Foto enviada com sucesso!");
+      if (emLote) {
+        resultado.results.filter(r => r.success).forEach(r => criarItemGaleria(r));
+        alert(resultado.failed
+          ? `${resultado.uploaded} fotos enviadas, ${resultado.failed} falharam.`
+          : `${resultado.uploaded} fotos enviadas com sucesso!`);
+      } else {
+        criarItemGaleria(resultado.data);
+        alert("Foto enviada com sucesso!");
+      }
       
       //fechar o modal
       modalUpload.style.display = "none";
@@ -98,7 +137,11 @@ document.addEventListener("DOMContentLoaded", async () => {
     // Criar imagem usando a URL da API
     const img = document.createElement("img");
     const API_BASE_URL = `${window.location.protocol}//${window.location.hostname}:5000`;
-    img.src = `${API_BASE_URL}/api/photos/${foto._id}/file`;
+    // Miniatura em vez do original (640px para telas de alta densidade)
+    const fotoUrl = `${API_BASE_URL}/api/photos/${foto._id}/file`;
+    img.src = foto.thumb_url ? `${API_BASE_URL}${foto.thumb_url}` : fotoUrl;
+    img.srcset = `${fotoUrl}?w=320 1x, ${fotoUrl}?w=640 2x`;
+    img.loading = "lazy";
     img.alt = foto.description || foto.filename;
     img.style.width = "100%";
     img.style.height = "200px";
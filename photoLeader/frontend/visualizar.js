@@ -6,30 +6,47 @@
   const excluir = document.getElementById("excluir");
   const midiaContainer = document.querySelector(".midia-container");
 
-  // Carregar todas as fotos da API
-  let fotos = [];
-  let indiceAtual = 0;
+  const API_BASE_URL = `${window.location.protocol}//${window.location.hostname}:5000`;
+
+  // Foto atual e as vizinhas na listagem (uma consulta indexada, sem carregar a lista inteira)
+  let fotoAtual = null;
+  let anteriores = [];
+  let proximas = [];
+
+  // Maior miniatura pré-calculada; o original só no download
+  function urlImagem(foto) {
+    return `${API_BASE_URL}/api/photos/${foto._id}/file?w=1280`;
+  }
+
+  async function carregarFoto(fotoId) {
+    const vizinhas = await PhotoLeaderAPI.getPhotoNeighbors(fotoId, { n: 2 });
+    fotoAtual = vizinhas.photo;
+    anteriores = vizinhas.previous;
+    proximas = vizinhas.next;
+    mostrarFoto(fotoAtual);
+
+    // Pré-carregar as imagens vizinhas para a navegação ser imediata
+    [...anteriores, ...proximas].forEach(foto => {
+      new Image().src = urlImagem(foto);
+    });
+  }
 
   try {
-    fotos = await PhotoLeaderAPI.getPhotos();
-    
-    // Se uma foto específica foi selecionada, encontrar seu índice
-    const fotoSelecionadaId = localStorage.getItem("fotoSelecionadaId");
-    if (fotoSelecionadaId) {
-      const indice = fotos.findIndex(f => f._id === fotoSelecionadaId);
-      if (indice !== -1) {
-        indiceAtual = indice;
-      }
-      localStorage.removeItem("fotoSelecionadaId"); // Limpar após usar
+    // Foto selecionada na tela inicial ou, sem seleção, a mais recente
+    let fotoId = localStorage.getItem("fotoSelecionadaId");
+    localStorage.removeItem("fotoSelecionadaId"); // Limpar após usar
+    if (!fotoId) {
+      const [primeira] = await PhotoLeaderAPI.getPhotos({ limit: 1 });
+      fotoId = primeira ? primeira._id : null;
     }
 
-    if (fotos.length === 0) {
+    if (!fotoId) {
       alert("Nenhuma foto encontrada. Voltando à tela inicial.");
       window.location.href = "telaInicial.html";
       return;
     }
 
-    mostrarFoto(indiceAtual);
+    await carregarFoto(fotoId);
   } catch (error) {
     console.error("Erro ao carregar fotos:", error);
     alert("Erro ao carregar fotos. Verifique se a API está rodando.");
@@ -38,16 +55,14 @@
   }
 
   //mostrar foto atual
-  function mostrarFoto(indice) {
-    const foto = fotos[indice];
+  function mostrarFoto(foto) {
     if (!foto) return;
 
     midiaContainer.innerHTML = "";
 
     // Criar imagem usando a URL da API
     const img = document.createElement("img");
-    const API_BASE_URL = `${window.location.protocol}//${window.location.hostname}:5000`;
-    img.src = `${API_BASE_URL}/api/photos/${foto._id}/file`;
+    img.src = urlImagem(foto);
     img.alt = foto.description || foto.filename;
     img.style.maxWidth = "100%";
     img.style.maxHeight = "500px";
@@ -59,37 +74,36 @@
     dataMidia.textContent = dataUpload.toLocaleDateString('pt-BR');
   }
 
+  async function navegarPara(foto) {
+    if (!foto) return;
+    try {
+      await carregarFoto(foto._id);
+    } catch (error) {
+      console.error("Erro ao carregar foto:", error);
+    }
+  }
+
   //navegar para foto anterior
-  anterior.addEventListener("click", () => {
-    indiceAtual = (indiceAtual - 1 + fotos.length) % fotos.length;
-    mostrarFoto(indiceAtual);
-  });
+  anterior.addEventListener("click", () => navegarPara(anteriores[0]));
 
   //navegar para próxima foto
-  proximo.addEventListener("click", () => {
-    indiceAtual = (indiceAtual + 1) % fotos.length;
-    mostrarFoto(indiceAtual);
-  });
+  proximo.addEventListener("click", () => navegarPara(proximas[0]));
 
   //apagar foto usando a API
   excluir.addEventListener("click", async () => {
     if (confirm("Deseja realmente excluir esta foto?")) {
       try {
-        const fotoId = fotos[indiceAtual]._id;
-        await PhotoLeaderAPI.deletePhoto(fotoId);
-        
-        // Remover da lista local
-        fotos.splice(indiceAtual, 1);
+        await PhotoLeaderAPI.deletePhoto(fotoAtual._id);
 
-        if (fotos.length === 0) {
+        // Mostrar a próxima foto (ou a anterior, se era a última)
+        const seguinte = proximas[0] || anteriores[0];
+        if (!seguinte) {
           alert("Nenhuma foto restante. Voltando à tela inicial.");
           window.location.href = "telaInicial.html";
           return;
         }
 
-        // Ajustar índice e mostrar próxima foto
-        indiceAtual = Math.min(indiceAtual, fotos.length - 1);
-        mostrarFoto(indiceAtual);
+        await carregarFoto(seguinte._id);
         
         alert("Foto excluída com sucesso!");
       } catch (error) {
@@ -49,11 +49,11 @@ try {
     print('Collection uploadDB.files já existe');
   }
 
-  // criar índices úteis
-  appDB.files.createIndex({ upload_date: -1 });
-  appDB.files.createIndex({ user: 1 });
-  appDB.files.createIndex({ tags: 1 });
-  print('Índices criados em uploadDB.files (upload_date, user, tags)');
+  // criar índices úteis (a API também cria todos os índices dela no startup: backend/indexes.py)
+  appDB.files.createIndex({ upload_date: -1, _id: -1 });
+  appDB.files.createIndex({ user: 1, upload_date: -1, _id: -1 });
+  appDB.files.createIndex({ tags: 1, upload_date: -1, _id: -1 });
+  print('Índices criados em uploadDB.files (upload_date, user+upload_date, tags+upload_date)');
 } catch (e) {
   print('Erro ao criar DB/índices: ' + e);
 }